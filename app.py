@@ -1,47 +1,120 @@
+from __future__ import annotations # Annotations below name bgl types without importing bgl
+
 from flask import Flask, request, jsonify
 import uuid # For generating unique game IDs
+import importlib
+import importlib.util
+import hmac
 
-# Assuming boxing_game_logic.py is in the same directory
-import boxing_game_logic as bgl
+from boxing_state_delta import StateVersion, VersionTracker, VERSION_ITEM_KEY, snapshot_response, state_response
+from boxing_game_store import GameStoreError
+import boxing_metrics as metrics
 
 app = Flask(__name__)
+# JSON responses are a phase of their own in /metrics and Server-Timing (unwrapped unless GAME_METRICS=1)
+jsonify = metrics.timed("serialize_response")(jsonify)
 
 import os # For environment variables
-import boto3
-from botocore.exceptions import ClientError
-
-# Initialize DynamoDB resource.
-# This would typically be done once when the Lambda instance initializes (outside the handler).
-# For local testing, it will also initialize when app.py is run.
-DYNAMODB_TABLE_NAME = os.environ.get('DYNAMODB_TABLE_NAME', 'ARBoxingGameStates') # Get from env var, default for local
-try:
-    # If running on Lambda, region might be set by AWS_REGION env var automatically.
-    # For local testing with DynamoDB Local or a specific AWS region, you might need to specify endpoint_url and region_name.
-    # Example for DynamoDB Local:
-    # dynamodb = boto3.resource('dynamodb', endpoint_url='http://localhost:8000', region_name='us-east-1')
-    # For deployed Lambda, typically just boto3.resource('dynamodb') is enough if region is configured.
-    dynamodb = boto3.resource('dynamodb') # Adjust region if needed for local testing against AWS
-    table = dynamodb.Table(DYNAMODB_TABLE_NAME)
-    # Try a simple operation to check table existence or create it (for local dev)
-    # This is a simplification; table creation should be part of IaC (e.g. SAM template)
-    # table.load() # Check if table exists - this might throw error if it doesn't.
-except Exception as e:
-    app.logger.error(f"Failed to initialize DynamoDB table '{DYNAMODB_TABLE_NAME}': {e}")
-    # Fallback for local testing if DynamoDB isn't set up, to avoid crashing app.py on import.
-    # In a real Lambda, if this fails, the Lambda would likely error out.
-    table = None
-    app.logger.warn("DynamoDB table could not be initialized. Game state will not persist if table is None.")
+import threading
+
+
+# --- Cold start ---
+# Importing app.py only sets up Flask. The game engine, the store client (boto3/botocore alone
+# are ~0.3 s) and the cache are created by the first request that needs them and then reused by
+# every later (warm) invocation of this process. EAGER_INIT=1 does it all at import instead, for
+# provisioned concurrency, where the init phase runs before any traffic.
+
+class _LazyModule:
+    """Stands in for a module and imports it on first attribute access."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+# Assuming boxing_game_logic.py is in the same directory
+bgl = _LazyModule("boxing_game_logic")
+replay = _LazyModule("boxing_replay")
+
+# Initialize the game store (see boxing_game_store.py): GAME_STORE=dynamodb (default), sqlite or memory.
+# For local runs and load tests without AWS use GAME_STORE=sqlite (GAME_STORE_SQLITE_PATH) or memory.
+USE_IN_MEMORY_TABLE = os.environ.get('USE_IN_MEMORY_TABLE', '0') == '1' # Older switch for GAME_STORE=memory
+# On Lambda a frozen instance can't flush in the background and requests for one game may land
+# on different instances, so there the cache defaults to no caching and write-through.
+ON_LAMBDA = 'AWS_LAMBDA_FUNCTION_NAME' in os.environ
+# Stored item form: "snapshot" (one binary attribute, see boxing_snapshot_codec.py) or "dict" (the
+# serialized state as DynamoDB maps). Either form is read; existing dict items become snapshots
+# on their next write.
+GAME_STATE_STORAGE_FORMAT = os.environ.get('GAME_STATE_STORAGE_FORMAT', 'snapshot')
+EAGER_INIT = os.environ.get('EAGER_INIT', '0') == '1'
+LAMBDA_LOG_EVENTS = os.environ.get('LAMBDA_LOG_EVENTS', '1') == '1' # Full event per invocation; 0 skips it
+# Record each match's inputs (tick times, player actions, RNG seed) for /game/<id>/replay; see
+# boxing_replay.py. Stored next to the snapshot (older ticks in chunk items), so it needs
+# GAME_STATE_STORAGE_FORMAT=snapshot.
+MATCH_JOURNAL = os.environ.get('MATCH_JOURNAL', '1') == '1'
+
+game_store = None
+_state_cache = None
+_state_cache_lock = threading.Lock()
+
+def _create_state_cache():
+    global game_store
+    from boxing_game_store import GAME_STORE_BACKEND, create_game_store, create_journal_store
+    from boxing_state_cache import GameStateCache, DEFAULT_CACHE_CAPACITY, DEFAULT_DURABILITY_WINDOW
+    from boxing_snapshot_codec import SnapshotStorage, load_game_state
+    try:
+        # Table creation should be part of IaC (e.g. SAM template). For DynamoDB Local, set
+        # AWS_ENDPOINT_URL_DYNAMODB=http://localhost:8000.
+        game_store = create_game_store('memory' if USE_IN_MEMORY_TABLE else None)
+        game_store.warm()
+        journal_store = (create_journal_store('memory' if USE_IN_MEMORY_TABLE else None)
+                         if GAME_STATE_STORAGE_FORMAT == 'snapshot' else None)
+    except Exception as e:
+        app.logger.error(f"Failed to initialize game store '{GAME_STORE_BACKEND}': {e}")
+        # Routes answer 503 without a store; the next request tries again.
+        app.logger.warn("Game store could not be initialized. Game state will not persist.")
+        return None
+    # Write-behind cache of hydrated games in front of the store (see boxing_state_cache.py).
+    capacity = int(os.environ.get('GAME_STATE_CACHE_SIZE', 0 if ON_LAMBDA else DEFAULT_CACHE_CAPACITY))
+    durability_window = float(os.environ.get('GAME_STATE_DURABILITY_SECONDS',
+                                             0 if ON_LAMBDA else DEFAULT_DURABILITY_WINDOW))
+    # Snapshot items keep the journal's latest ticks; full chunks go to the journal store (own table, with a TTL).
+    storage = (SnapshotStorage(serialize_game_state_for_api, journal_store=journal_store)
+               if GAME_STATE_STORAGE_FORMAT == 'snapshot' else None)
+    return GameStateCache(game_store, deserialize=load_game_state, capacity=capacity,
+                          durability_window=durability_window, storage=storage)
+
+def get_state_cache():
+    """The GameStateCache over the configured store, created on first use. None if the store is unavailable."""
+    global _state_cache
+    if _state_cache is None:
+        with _state_cache_lock:
+            if _state_cache is None:
+                _state_cache = _create_state_cache()
+    return _state_cache
 
 
 # Lambda handler function using serverless-wsgi
-# This function will be the entry point for AWS Lambda.
-try:
-    from serverless_wsgi import handle_request as serverless_wsgi_handle_request
+# This function will be the entry point for AWS Lambda. serverless_wsgi is imported by the first
+# invocation; the handler only checks here that it is installed.
+if importlib.util.find_spec('serverless_wsgi') is not None:
+    _serverless_wsgi_handle_request = None
+
     def lambda_handler(event, context):
-        # Any Lambda-specific initialization or context processing can go here
-        app.logger.info(f"Lambda event: {event}") # Log the event for debugging
-        return serverless_wsgi_handle_request(app, event, context)
-except ImportError:
+        global _serverless_wsgi_handle_request
+        if _serverless_wsgi_handle_request is None:
+            from serverless_wsgi import handle_request as _serverless_wsgi_handle_request
+        if LAMBDA_LOG_EVENTS:
+            app.logger.info("Lambda event: %s", event) # Log the event for debugging; formatted only if INFO is on
+        return _serverless_wsgi_handle_request(app, event, context)
+else:
     app.logger.warn("serverless-wsgi not found. lambda_handler not defined. App will only run with dev server.")
     lambda_handler = None
 
@@ -54,6 +127,10 @@ except ImportError:
 # And ensure that any Decimal types from DynamoDB are converted to float/int before bgl logic uses them.
 # The bgl.create_gamestate_from_dict should handle the latter.
 
+def serialize_stats_for_api(stats) -> dict:
+    return {k.value if isinstance(k, bgl.ActionType) else k: v for k, v in stats.items()}
+
+
 def serialize_fighter_for_api(fighter: bgl.Fighter) -> dict:
     """Ensures fighter data is plain dicts/lists/primitives for JSON, converts enums."""
     if not fighter: return None
@@ -66,10 +143,13 @@ def serialize_fighter_for_api(fighter: bgl.Fighter) -> dict:
         "knockdowns_this_round": fighter.knockdowns_this_round,
         "total_knockdowns": fighter.total_knockdowns,
         "current_action": fighter.current_action.value,
-        "stats": {k.value if isinstance(k, bgl.ActionType) else k: v for k, v in fighter.stats.items()},
-        "round_scores": fighter.round_scores
+        "stats": serialize_stats_for_api(fighter.stats),
+        "round_scores": fighter.round_scores,
+        # Per-round breakdown for analytics: one stats dict per round, the last one still running
+        "round_stats": [serialize_stats_for_api(round_stats) for round_stats in fighter.stats.rounds()]
     }
 
+@metrics.timed("serialize_state")
 def serialize_game_state_for_api(game_state: bgl.GameState) -> dict:
     """Serializes GameState for API responses, ensuring all parts are JSON-friendly."""
     if not game_state: return None
@@ -89,145 +169,466 @@ def serialize_game_state_for_api(game_state: bgl.GameState) -> dict:
             "fighter_down": game_state.knockdown_info["fighter_down"].value if game_state.knockdown_info["fighter_down"] else None,
             "count": round(game_state.knockdown_info["count"], 1)
         },
-        "event_log": game_state.event_log[-10:]
+        "ai_profile": game_state.ai_profile,
+        "event_log": game_state.event_log.tail(10) # Formatted only here, on the way out
     }
 
 
+# --- Versioned state (see boxing_state_delta.py) ---
+# Stored items carry a "state_version" attribute; responses carry its "seq" so clients can ask
+# /game/<id>/state?since=<seq> for just what changed.
+
+def versioned_item(game_state: bgl.GameState, previous_item: dict = None, previous_event_total: int = 0):
+    """
+    Serializes game_state for storage with its StateVersion advanced past `previous_item`.
+    `previous_event_total` is game_state.event_log.total when previous_item was serialized.
+    """
+    item = serialize_game_state_for_api(game_state)
+    new_events = game_state.event_log.total - previous_event_total
+    version = StateVersion.from_item(previous_item.get(VERSION_ITEM_KEY) if previous_item else None)
+    version.advance(previous_item, item, min(new_events, len(item["event_log"])))
+    item[VERSION_ITEM_KEY] = version.to_item()
+    return item, version
+
+def item_to_api_response(item: dict) -> dict:
+    """A stored item as the full state response: the state plus its seq."""
+    response = {k: v for k, v in item.items() if k != VERSION_ITEM_KEY}
+    response["seq"] = item[VERSION_ITEM_KEY]["seq"]
+    return response
+
+# Live (scheduler-owned) matches are versioned in memory, lazily, whenever their state is read.
+live_state_versions = {} # game_id -> VersionTracker
+live_state_versions_lock = threading.Lock()
+
+def live_state_response(game_state: bgl.GameState, since: int = None) -> dict:
+    """State response for a live match: delta/snapshot when `since` is given, else full state + seq."""
+    state = serialize_game_state_for_api(game_state)
+    with live_state_versions_lock:
+        tracker = live_state_versions.setdefault(game_state.game_id, VersionTracker())
+        version = tracker.observe(state, game_state.event_log.total)
+        if since is not None:
+            return state_response(state, version, since)
+        return dict(state, seq=version.seq)
+
+
+# --- Server-side ticking (opt-in) ---
+# With GAME_TICK_SCHEDULER=1 live matches are ticked in memory at GAME_TICK_RATE_HZ instead of
+# once per action request, and subscribers get state diffs pushed over /game/<game_id>/ws.
+# Needs a long-running process (gunicorn/dev server, one worker); not for Lambda.
+TICK_SCHEDULER_ENABLED = os.environ.get('GAME_TICK_SCHEDULER', '0') == '1'
+tick_scheduler = None
+
+def save_live_game_state(game_state: bgl.GameState):
+    """Persists a match the scheduler has stopped ticking: it finished, or moved to another worker."""
+    with live_state_versions_lock:
+        tracker = live_state_versions.pop(game_state.game_id, None)
+    state_cache = get_state_cache()
+    if state_cache is None:
+        return
+    try:
+        item = serialize_game_state_for_api(game_state)
+        version = tracker.observe(dict(item), game_state.event_log.total) if tracker else StateVersion()
+        item[VERSION_ITEM_KEY] = version.to_item()
+        with state_cache.locked(game_state.game_id) as entry: # Loads the stored version if evicted
+            entry.game_state = game_state
+            state_cache.mark_dirty(entry, item)
+        state_cache.flush(game_state.game_id)
+    except Exception as e:
+        app.logger.error(f"Failed to save finished game {game_state.game_id}: {e}")
+
+if TICK_SCHEDULER_ENABLED:
+    from boxing_tick_scheduler import TickScheduler
+    tick_scheduler = TickScheduler(serialize=serialize_game_state_for_api, on_match_over=save_live_game_state)
+    tick_scheduler.start_in_background()
+
+sock = None
+if TICK_SCHEDULER_ENABLED: # Only the scheduler pushes over WebSockets; don't pay the import otherwise
+    try:
+        from flask_sock import Sock
+        sock = Sock(app)
+    except ImportError:
+        app.logger.warn("flask-sock not found. State push over WebSocket is disabled.")
+
+if sock and tick_scheduler is not None:
+    import json
+
+    @sock.route('/game/<game_id>/ws')
+    def game_state_stream(ws, game_id):
+        """Pushes {"type": "state"} once, then {"type": "diff"} after every tick that changed something."""
+        subscription = tick_scheduler.subscribe(game_id)
+        if subscription is None:
+            ws.send(json.dumps({"error": "Game not live on this server"}))
+            return
+        try:
+            while True:
+                message = subscription.get()
+                if message is None: # Match over (or we fell too far behind)
+                    break
+                ws.send(json.dumps(message))
+        finally:
+            tick_scheduler.unsubscribe(game_id, subscription)
+
+
+def parse_action_request():
+    """Returns (ActionType, None) for a valid action body, or (None, error response)."""
+    if not request.is_json:
+        return None, (jsonify({"error": "Expected a JSON body (Content-Type: application/json)"}), 415)
+    action_data = request.get_json(silent=True) # Malformed JSON is a 400 below, not an exception
+    if not isinstance(action_data, dict) or "action" not in action_data:
+        return None, (jsonify({"error": "Missing action in request body"}), 400)
+    action_str = action_data["action"]
+    if not isinstance(action_str, str):
+        return None, (jsonify({"error": f"Invalid action: {action_str!r}"}), 400)
+    try:
+        return bgl.ActionType[action_str.upper()], None
+    except KeyError:
+        return None, (jsonify({"error": f"Invalid action: {action_str}"}), 400)
+
+
 @app.route('/game/start', methods=['POST'])
 def start_game_api(): # Renamed to avoid conflict if old start_game exists
-    game_id = str(uuid.uuid4())
-    game_state = bgl.initialize_new_game()
+    game_id = router_assigned_game_id() or str(uuid.uuid4())
+    # Optional {"ai_profile": "<name>"} picks the opponent's behaviour (see bgl.AI_PROFILES)
+    ai_profile = (request.get_json(silent=True) or {}).get("ai_profile")
+    if ai_profile is not None and ai_profile not in bgl.AI_PROFILES:
+        return jsonify({"error": f"Unknown ai_profile. Valid profiles: {sorted(bgl.AI_PROFILES)}"}), 400
+    if MATCH_JOURNAL:
+        game_state = replay.start_recorded_match(ai_profile=ai_profile) # Also starts round 1
+    else:
+        game_state = bgl.initialize_new_game(ai_profile=ai_profile)
+        bgl.start_new_round(game_state)
     game_state.game_id = game_id # Assign game_id to the GameState object
 
-    bgl.start_new_round(game_state)
-
-    if table:
+    state_cache = get_state_cache()
+    if state_cache is not None:
         try:
             # Use the API serializer which handles enums correctly for storage
-            item_to_store = serialize_game_state_for_api(game_state)
-            # DynamoDB expects all top-level keys for the item, game_id is already in item_to_store
-            table.put_item(Item=item_to_store)
-            app.logger.info(f"Game started and saved to DynamoDB with ID: {game_id}")
-        except ClientError as e:
-            app.logger.error(f"DynamoDB ClientError saving game: {e.response['Error']['Message']}")
+            item_to_store, _ = versioned_item(game_state)
+            # Cached now; reaches the table within the durability window (immediately in write-through mode)
+            state_cache.insert(game_state, item_to_store)
+            app.logger.info(f"Game started with ID: {game_id}")
+        except GameStoreError as e:
+            app.logger.error(f"Game store error saving game: {e}")
             return jsonify({"error": "Failed to save initial game state"}), 500
         except Exception as e: # Catch any other unexpected errors
-            app.logger.error(f"Unexpected error saving game to DynamoDB: {str(e)}")
+            app.logger.error(f"Unexpected error saving game to store: {str(e)}")
             return jsonify({"error": "Unexpected server error during game start"}), 500
     else:
-        app.logger.error("DynamoDB table not configured. Cannot save game.")
+        app.logger.error("Game store not configured. Cannot save game.")
         return jsonify({"error": "Database service not available"}), 503
 
-    return jsonify(serialize_game_state_for_api(game_state)), 200
+    if tick_scheduler is not None:
+        tick_scheduler.add_game(game_state)
 
+    return jsonify(item_to_api_response(item_to_store)), 200
 
-@app.route('/game/<game_id>/action', methods=['POST'])
-def player_action_api(game_id): # Renamed
-    game_state_dict = None
-    if table:
-        try:
-            response = table.get_item(Key={'game_id': game_id})
-            if 'Item' not in response:
-                app.logger.warn(f"Game not found in DynamoDB: {game_id}")
-                return jsonify({"error": "Game not found"}), 404
-            game_state_dict = response['Item']
-        except ClientError as e:
-            app.logger.error(f"DynamoDB ClientError fetching game {game_id}: {e.response['Error']['Message']}")
-            return jsonify({"error": "Failed to retrieve game state"}), 500
-        except Exception as e:
-            app.logger.error(f"Unexpected error fetching game {game_id} from DynamoDB: {str(e)}")
-            return jsonify({"error": "Unexpected error retrieving game state"}), 500
 
-    else:
-        app.logger.error("DynamoDB table not configured. Cannot process action.")
-        return jsonify({"error": "Database service not available"}), 503
+def apply_player_action(state_cache, entry, action_type: bgl.ActionType) -> dict:
+    """Queues and ticks one action on a locked cache entry; also the entry's replay for that action."""
+    game_state = entry.game_state
+    if game_state is None or game_state.match_status == bgl.GameStatus.MATCH_OVER:
+        return entry.item # Replayed onto a match that ended meanwhile: nothing to apply
+    bgl.queue_player_action_for_tick(game_state, action_type)
+    bgl.game_tick(game_state) # This updates game_state in place
+    item, _ = versioned_item(game_state, entry.item, entry.event_total)
+    state_cache.mark_dirty(entry, item, replay=lambda entry: apply_player_action(state_cache, entry, action_type))
+    return item
 
-    # Deserialize the dictionary from DynamoDB back into our GameState object
-    # This now uses the new helper in bgl
-    game_state = bgl.create_gamestate_from_dict(game_state_dict)
-    if not game_state:
-        app.logger.error(f"Failed to deserialize game state for {game_id} from dict: {game_state_dict}")
-        return jsonify({"error": "Failed to process game state data"}), 500
 
-    # Ensure last_tick_time is set correctly after deserialization, as it's critical for game_tick
-    if not hasattr(game_state, 'last_tick_time') or game_state.last_tick_time == 0:
-        # If last_tick_time wasn't stored or was invalid, set it to now to avoid large delta_time issues.
-        # However, for consistency, it's better if it's always stored and retrieved.
-        # The create_gamestate_from_dict defaults it to time.time() if not found.
-        pass
+@app.route('/game/<game_id>/action', methods=['POST'])
+def player_action_api(game_id): # Renamed
+    # Validated before any game is loaded or locked, so a bad body is a 400/415 on every path
+    action_type, error_response = parse_action_request()
+    if error_response:
+        return error_response
+    action_str = action_type.value
+
+    live_game = tick_scheduler.get_game(game_id) if tick_scheduler is not None else None
+    if live_game is not None:
+        # The scheduler owns this match: queue the input for its next tick and answer right away.
+        if live_game.match_status == bgl.GameStatus.MATCH_OVER:
+            return jsonify({"error": "Match is over", "game_state": serialize_game_state_for_api(live_game)}), 400
+        tick_scheduler.submit_action(game_id, action_type)
+        return jsonify(live_state_response(live_game)), 202
+
+    from boxing_state_cache import WriteConflict, retry_on_conflict
+    state_cache = get_state_cache()
+    if state_cache is None:
+        app.logger.error("Game store not configured. Cannot process action.")
+        return jsonify({"error": "Database service not available"}), 503
 
+    def apply_action():
+        # The entry lock is held for the whole attempt: actions for one game apply one at a time
+        with state_cache.locked(game_id) as entry:
+            if entry.item is None:
+                app.logger.warn(f"Game not found in store: {game_id}")
+                return jsonify({"error": "Game not found"}), 404
 
-    if game_state.match_status == bgl.GameStatus.MATCH_OVER:
-        app.logger.info(f"Action request for game {game_id} which is already over.")
-        return jsonify({"error": "Match is over", "game_state": serialize_game_state_for_api(game_state)}), 400
+            # Hydrated once per cache miss (snapshot decode, or the dict for old items), then reused
+            game_state = entry.game_state
+            if not game_state:
+                app.logger.error(f"Failed to deserialize game state for {game_id} from dict: {entry.item}")
+                return jsonify({"error": "Failed to process game state data"}), 500
+
+            if game_state.match_status == bgl.GameStatus.MATCH_OVER:
+                app.logger.info(f"Action request for game {game_id} which is already over.")
+                return jsonify({"error": "Match is over", "game_state": serialize_game_state_for_api(game_state)}), 400
+
+            # Process the action
+            if game_state.is_round_active or game_state.knockdown_info["is_knockdown"] or game_state.match_status == bgl.GameStatus.BETWEEN_ROUNDS:
+                # Written back by the cache with a conditional write, within the durability window.
+                # If that write loses a race, the cache re-reads the game and replays this action on it.
+                response_item = apply_player_action(state_cache, entry, action_type)
+                app.logger.info(f"Action '{action_str}' processed for game {game_id}. Player HP: {game_state.player.hp}, Opponent HP: {game_state.opponent.hp}")
+            else:
+                app.logger.warn(f"Action '{action_str}' received for game {game_id} but game not in a state to process actions directly. Status: {game_state.match_status.value}")
+                # Return current (un-ticked) state if no tick was processed
+                response_item, _ = versioned_item(game_state, entry.item, entry.event_total)
 
-    action_data = request.json
-    if not action_data or "action" not in action_data:
-        return jsonify({"error": "Missing action in request body"}), 400
+        if game_state.match_status == bgl.GameStatus.MATCH_OVER:
+            state_cache.flush(game_id) # Final result goes to the table now, not within the window
+        return jsonify(item_to_api_response(response_item)), 200
 
-    action_str = action_data["action"]
     try:
-        action_type = bgl.ActionType[action_str.upper()]
-    except KeyError:
-        return jsonify({"error": f"Invalid action: {action_str}"}), 400
-
-    # Process the action
-    if game_state.is_round_active or game_state.knockdown_info["is_knockdown"] or game_state.match_status == bgl.GameStatus.BETWEEN_ROUNDS:
-        bgl.queue_player_action_for_tick(action_type)
-        bgl.game_tick(game_state) # This updates game_state in place
-
-        # Save the updated game_state back to DynamoDB
-        if table:
-            try:
-                updated_item_to_store = serialize_game_state_for_api(game_state)
-                table.put_item(Item=updated_item_to_store)
-                app.logger.info(f"Action '{action_str}' processed for game {game_id} and state saved. Player HP: {game_state.player.hp}, Opponent HP: {game_state.opponent.hp}")
-            except ClientError as e:
-                app.logger.error(f"DynamoDB ClientError saving updated game state {game_id}: {e.response['Error']['Message']}")
-                # Decide if you should return an error to client or the potentially stale state before save failed
-                return jsonify({"error": "Failed to save updated game state"}), 500
-            except Exception as e:
-                app.logger.error(f"Unexpected error saving updated game state {game_id} to DynamoDB: {str(e)}")
-                return jsonify({"error": "Unexpected server error saving game state"}), 500
-        else:
-            # This case should ideally not be reached if initial checks for table are done.
-            app.logger.error("DynamoDB table not configured. Cannot save updated game state.")
-            return jsonify({"error": "Database service not available during action processing"}), 503
-    else:
-        app.logger.warn(f"Action '{action_str}' received for game {game_id} but game not in a state to process actions directly. Status: {game_state.match_status.value}")
-        # Return current (un-ticked) state if no tick was processed
-
-    return jsonify(serialize_game_state_for_api(game_state)), 200
+        # A conditional write that lost a race re-reads the game and re-applies the action
+        return retry_on_conflict(apply_action, state_cache.metrics)
+    except WriteConflict:
+        app.logger.error(f"Gave up on game {game_id} after repeated write conflicts")
+        return jsonify({"error": "Game is busy, please retry"}), 409
+    except GameStoreError as e:
+        app.logger.error(f"Game store error on game {game_id}: {e}")
+        return jsonify({"error": "Failed to retrieve or save game state"}), 500
+    except Exception as e:
+        app.logger.error(f"Unexpected error processing action for game {game_id}: {str(e)}")
+        return jsonify({"error": "Unexpected server error processing action"}), 500
+
+
+@app.route('/metrics/storage', methods=['GET'])
+def storage_metrics_api():
+    """Optimistic-concurrency counters for this process: writes, conflicts, retries, conflict_rate."""
+    state_cache = get_state_cache()
+    if state_cache is None:
+        return jsonify({"error": "Database service not available"}), 503
+    return jsonify(dict(state_cache.metrics.snapshot(), cache_hits=state_cache.hits,
+                        cache_misses=state_cache.misses, cached_games=len(state_cache))), 200
+
+
+# --- Metrics (see boxing_metrics.py) ---
+# /metrics is Prometheus text: per-phase latency histograms (engine, serializers, store calls) and
+# request latency by route when GAME_METRICS=1, plus the cache and write counters always.
+# GAME_SERVER_TIMING=1 also returns each /game/... request's phases in a Server-Timing header.
+
+if metrics.METRICS_ENABLED:
+    @app.before_request
+    def begin_request_metrics():
+        metrics.begin_request()
+
+    @app.after_request
+    def end_request_metrics(response):
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        timing = metrics.end_request(route, request.method, response.status_code)
+        if timing is not None and request.path.startswith('/game/'):
+            response.headers['Server-Timing'] = timing
+        return response
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics_api():
+    extra = {}
+    state_cache = _state_cache # Scrapes don't create the store
+    if state_cache is not None:
+        extra.update({"cache_hits_total": ("counter", state_cache.hits),
+                      "cache_misses_total": ("counter", state_cache.misses),
+                      "cached_games": ("gauge", len(state_cache))})
+        for field, value in state_cache.metrics.snapshot().items():
+            if field != "conflict_rate":
+                extra[f"store_{field}_total"] = ("counter", value)
+    if tick_scheduler is not None:
+        extra["live_games"] = ("gauge", len(tick_scheduler))
+    return app.response_class(metrics.registry.render(extra), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/game/<game_id>/state', methods=['GET'])
 def get_game_state_api(game_id): # Renamed
     # game_state = active_games.get(game_id) # Old in-memory
-    if table:
+    # ?since=<seq>: only fields and log lines changed after seq ({"full": false, "changes", "events"}),
+    # or {"full": true, "state"} when the delta can't be served exactly.
+    since = request.args.get('since', type=int)
+    live_game = tick_scheduler.get_game(game_id) if tick_scheduler is not None else None
+    if live_game is not None:
+        return jsonify(live_state_response(live_game, since)), 200
+    state_cache = get_state_cache()
+    if state_cache is not None:
         try:
-            response = table.get_item(Key={'game_id': game_id})
-            if 'Item' in response:
-                game_state_dict = response['Item']
-                game_state = bgl.create_gamestate_from_dict(game_state_dict) # Deserialize
+            with state_cache.locked(game_id) as entry:
+                game_state_dict = entry.item
+                if game_state_dict is None:
+                    app.logger.warn(f"Game not found in store on GET request: {game_id}")
+                    return jsonify({"error": "Game not found"}), 404
+                version = StateVersion.from_item(game_state_dict.get(VERSION_ITEM_KEY))
+                if since is not None and version.can_delta(since):
+                    # Cut straight from the cached item; no GameState round trip
+                    return jsonify(version.delta(game_state_dict, since)), 200
+                game_state = entry.game_state # Deserialized on first use
                 if not game_state:
                      app.logger.error(f"Failed to deserialize game state for GET {game_id}")
                      return jsonify({"error": "Failed to process game state data"}), 500
-                app.logger.info(f"State requested and retrieved from DynamoDB for game {game_id}")
-                return jsonify(serialize_game_state_for_api(game_state)), 200
-            else:
-                app.logger.warn(f"Game not found in DynamoDB on GET request: {game_id}")
-                return jsonify({"error": "Game not found"}), 404
-        except ClientError as e:
-            app.logger.error(f"DynamoDB ClientError fetching game state {game_id} on GET: {e.response['Error']['Message']}")
+                state = serialize_game_state_for_api(game_state)
+            app.logger.info(f"State requested for game {game_id}")
+            if since is not None:
+                return jsonify(snapshot_response(state, version)), 200
+            return jsonify(dict(state, seq=version.seq)), 200
+        except GameStoreError as e:
+            app.logger.error(f"Game store error fetching game state {game_id} on GET: {e}")
             return jsonify({"error": "Failed to retrieve game state"}), 500
         except Exception as e:
-            app.logger.error(f"Unexpected error fetching game state {game_id} on GET from DynamoDB: {str(e)}")
+            app.logger.error(f"Unexpected error fetching game state {game_id} on GET from store: {str(e)}")
             return jsonify({"error": "Unexpected error retrieving game state"}), 500
     else:
-        app.logger.error("DynamoDB table not configured. Cannot get game state.")
+        app.logger.error("Game store not configured. Cannot get game state.")
         return jsonify({"error": "Database service not available"}), 503
 
 
+# --- Session ownership (see boxing_session_router.py) ---
+# Behind the session router every worker process owns the matches the router's hash ring assigns
+# it and keeps them hot: cached, and ticked here with GAME_TICK_SCHEDULER=1. The router moves
+# matches between workers with /internal/sessions/release (persist, stop ticking, drop from
+# memory) and /internal/sessions/adopt (load, start ticking). The internal routes, and the
+# router-assigned game_id on /game/start, need the shared SESSION_ROUTER_TOKEN.
+WORKER_ID = os.environ.get('WORKER_ID')
+SESSION_ROUTER_TOKEN = os.environ.get('SESSION_ROUTER_TOKEN')
+ROUTER_TOKEN_HEADER = 'X-Session-Router-Token'
+ROUTER_GAME_ID_HEADER = 'X-Game-Id'
+WORKER_ID_HEADER = 'X-Game-Worker'
+
+def from_session_router() -> bool:
+    token = request.headers.get(ROUTER_TOKEN_HEADER)
+    return bool(SESSION_ROUTER_TOKEN) and token is not None and hmac.compare_digest(token, SESSION_ROUTER_TOKEN)
+
+def router_assigned_game_id():
+    """The game_id the router hashed to pick this worker, if the request came through it."""
+    game_id = request.headers.get(ROUTER_GAME_ID_HEADER)
+    if not game_id or not from_session_router():
+        return None
+    try:
+        return str(uuid.UUID(game_id))
+    except ValueError:
+        return None
+
+if WORKER_ID:
+    @app.after_request
+    def add_worker_header(response):
+        response.headers[WORKER_ID_HEADER] = WORKER_ID # Lets the router (and tests) see who answered
+        return response
+
+def hot_game_ids() -> list:
+    """Matches this process holds in memory: cached, or live in the tick scheduler."""
+    state_cache = get_state_cache()
+    game_ids = set(state_cache.game_ids()) if state_cache is not None else set()
+    if tick_scheduler is not None:
+        game_ids.update(tick_scheduler.game_ids())
+    return sorted(game_ids)
+
+if SESSION_ROUTER_TOKEN:
+    @app.route('/internal/sessions', methods=['GET'])
+    def sessions_api():
+        if not from_session_router():
+            return jsonify({"error": "Forbidden"}), 403
+        return jsonify({"worker": WORKER_ID, "game_ids": hot_game_ids()}), 200
+
+    @app.route('/internal/sessions/release', methods=['POST'])
+    def release_sessions_api():
+        """{"game_ids": [...]}: persist each match and let go of it; another worker adopts it next."""
+        if not from_session_router():
+            return jsonify({"error": "Forbidden"}), 403
+        state_cache = get_state_cache()
+        if state_cache is None:
+            return jsonify({"error": "Database service not available"}), 503
+        released, failed = [], []
+        for game_id in (request.get_json(silent=True) or {}).get("game_ids", []):
+            live_game = tick_scheduler.remove_game(game_id) if tick_scheduler is not None else None
+            if live_game is not None:
+                save_live_game_state(live_game) # Mid-match state only lived in the scheduler
+            try:
+                if state_cache.release(game_id) or live_game is not None:
+                    released.append(game_id)
+                elif game_id in state_cache.game_ids():
+                    failed.append(game_id) # In use, or its write failed: still dirty here
+            except GameStoreError as e:
+                app.logger.error(f"Game store error releasing game {game_id}: {e}")
+                failed.append(game_id)
+        return jsonify({"released": released, "failed": failed}), 200
+
+    @app.route('/internal/sessions/adopt', methods=['POST'])
+    def adopt_sessions_api():
+        """{"game_ids": [...]}: load released matches now (and tick them here) instead of on first request."""
+        if not from_session_router():
+            return jsonify({"error": "Forbidden"}), 403
+        state_cache = get_state_cache()
+        if state_cache is None:
+            return jsonify({"error": "Database service not available"}), 503
+        adopted = []
+        for game_id in (request.get_json(silent=True) or {}).get("game_ids", []):
+            try:
+                with state_cache.locked(game_id) as entry:
+                    game_state = entry.game_state if entry.item is not None else None
+                    if game_state is None:
+                        continue
+                    if tick_scheduler is not None and game_state.match_status != bgl.GameStatus.MATCH_OVER:
+                        # Live versions continue from the stored seq, so clients' ?since= still works
+                        tracker = VersionTracker()
+                        tracker.version = StateVersion.from_item(entry.item.get(VERSION_ITEM_KEY))
+                        tracker.last_state = {k: v for k, v in entry.item.items() if k != VERSION_ITEM_KEY}
+                        tracker.last_event_total = entry.event_total
+                        with live_state_versions_lock:
+                            live_state_versions[game_id] = tracker
+                        tick_scheduler.add_game(game_state)
+                adopted.append(game_id)
+            except GameStoreError as e:
+                app.logger.error(f"Game store error adopting game {game_id}: {e}")
+        return jsonify({"adopted": adopted}), 200
+
+
+@app.route('/game/<game_id>/replay', methods=['GET'])
+def replay_game_api(game_id):
+    """
+    The match rebuilt from its input journal, fast-forwarded to ?tick=<n> (default: the latest
+    recorded tick). For disputes: the result must equal what the match actually did.
+    """
+    from boxing_snapshot_codec import load_full_journal
+    tick = request.args.get('tick', type=int)
+    state_cache = get_state_cache()
+    if state_cache is None:
+        return jsonify({"error": "Database service not available"}), 503
+    try:
+        with state_cache.locked(game_id) as entry:
+            if entry.item is None:
+                return jsonify({"error": "Game not found"}), 404
+            game_state = entry.game_state
+            journal = game_state.journal if game_state is not None else None
+            if journal is None:
+                return jsonify({"error": "No input journal recorded for this game"}), 404
+            journal = journal.copy() # The live one keeps growing
+        # Sealed chunks don't change: read them unlocked
+        journal = load_full_journal(getattr(state_cache.storage, 'journal_store', None), journal)
+    except LookupError as e:
+        app.logger.error(f"Incomplete journal for game {game_id}: {e}")
+        return jsonify({"error": "Input journal is incomplete"}), 500
+    except GameStoreError as e:
+        app.logger.error(f"Game store error fetching game {game_id} for replay: {e}")
+        return jsonify({"error": "Failed to retrieve game state"}), 500
+    if tick is not None and not 0 <= tick <= len(journal):
+        return jsonify({"error": f"tick must be between 0 and {len(journal)}"}), 400
+    replayed = replay.replay_match(journal, ticks=tick)
+    replayed.game_id = game_id
+    state = serialize_game_state_for_api(replayed)
+    return jsonify(dict(state, tick=len(replayed.journal), ticks=len(journal))), 200
+
+
+if EAGER_INIT:
+    get_state_cache() # Engine, store client and cache now, in the init phase
+
+
 if __name__ == '__main__':
     # The following app.run() is for local development only.
     # When deploying to production using Gunicorn, Gunicorn will serve the 'app' object
@@ -258,18 +659,4 @@ if __name__ == '__main__':
     if __name__ == '__main__':
         logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
         app.logger.info("Flask app starting in development mode via app.run()...")
-        bgl.PLAYER_ACTION_QUEUE.clear() # Clear any test queue items
         app.run(host='0.0.0.0', port=5001, debug=True)
-```
-
-**Self-correction/Notes for `app.py`:**
-1.  **Serialization:** Added a `serialize_game_state` function to convert `GameState` and nested `Fighter` objects (including enums) into JSON-friendly dictionaries. This is crucial for `jsonify`.
-2.  **Game ID:** Game states are stored in `active_games` dictionary keyed by a `uuid`. The `game_id` is also added as an attribute to the `game_state` object itself for convenience in `serialize_game_state`.
-3.  **Starting the Game:** The `/game/start` endpoint now also calls `bgl.start_new_round(game_state)` because a game usually starts directly into round 1.
-4.  **`game_tick` in Action Endpoint:** It's important that after a player action is received and queued, `bgl.game_tick(game_state)` is called. This processes the queued player action, allows the AI to take a turn, updates timers, stamina, etc. Without this, the game state wouldn't change immediately after a player's action.
-5.  **`game_tick` in State Endpoint (Commented Out):** Considered adding `game_tick` to `GET /state` for auto-updating state, but decided against it for now to keep GET requests simpler and without side-effects. The primary driver of state change will be player actions. A polling front-end might eventually need this or a WebSocket connection.
-6.  **Logging:** Added basic Flask app logging (`app.logger.info`).
-7.  **Port:** Changed default port to `5001` to avoid common conflicts.
-8.  **PLAYER_ACTION_QUEUE:** Added a clear for `bgl.PLAYER_ACTION_QUEUE` in `if __name__ == '__main__':` just in case of interactive re-runs where the global list might persist.
-
-This `app.py` provides the basic API endpoints. Next, we'll create the HTML, CSS, and JS to interact with it.
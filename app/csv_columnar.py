@@ -0,0 +1,330 @@
+"""
+Columnar CSV parsing for affiliate and ad campaign reports.
+
+The row parsers in csv_import build a dict per row (csv.DictReader), call datetime.strptime per
+row and int()/float() per cell, which tops out at a few tens of thousands of rows per second.
+This path reads a batch of rows with csv.reader, transposes it into one column per field and
+converts whole columns at once:
+
+    dates     dictionary-encoded: a report has a few hundred distinct dates however many rows it
+              has, so each distinct string is parsed once (with strptime, per file) and rows are
+              mapped to it
+    numbers   plain digit strings ("1234", "56.78") are parsed as a character matrix with NumPy;
+              floats only when they have at most 15 digits, where mantissa / 10**k is exactly
+              what float() returns
+    names     stripped with one str.strip map over the column
+
+A row any of that doesn't cover (a bad or missing date, a missing name, "1,234", "-5", "1e3",
+blank-but-not-empty cells, ...) is handed to the row parser from csv_import, so records and error
+messages are exactly the ones parse_affiliate_csv / parse_ad_campaign_csv produce, in the same
+order. Reports are mostly clean, so that is a handful of rows per batch.
+
+Batches come out as records (for the stores, drop-in for ingest_csv) or as ReportColumns, typed
+NumPy arrays for analytics that never need the dataclasses.
+
+Requires numpy (optional for the rest of the site; the upload routes use csv_import).
+
+Usage:
+    records, errors = parse_ad_campaign_csv_columnar(io.StringIO(text))
+    columns, errors = parse_ad_campaign_csv_columnar(io.StringIO(text), as_columns=True)
+    columns.columns['cost'][~columns.nulls['cost']].sum()
+    result = ingest_csv(file.stream, iter_ad_campaign_csv_columnar, store.extend)
+"""
+import csv
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import compress, islice
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .csv_import import (AFFILIATE_HEADERS, AD_CAMPAIGN_HEADERS, _check_headers,
+                         _parse_affiliate_row, _parse_ad_campaign_row)
+from .models import AffiliatePerformanceData, AdCampaignPerformanceData
+
+COLUMNAR_CHUNK_ROWS = 2000 # Rows per batch: enough to amortize the per-column NumPy calls, small enough to stay in cache (larger measured slower)
+DATE_CACHE_LIMIT = 100000 # Distinct date strings remembered per file before the cache starts over
+
+# Field kinds
+DATE, NAME, TEXT, INT, FLOAT = "date", "name", "text", "int", "float"
+
+NAT = int(np.datetime64('NaT', 'D').astype(np.int64)) # Day number standing for "no date"
+INT_MAX_DIGITS = 18
+FLOAT_MAX_DIGITS = 15 # Below 2**53: mantissa / 10**k is then correctly rounded, i.e. float()'s answer
+POW10 = 10.0 ** np.arange(FLOAT_MAX_DIGITS + 1) # Exact as doubles
+
+
+@dataclass(frozen=True)
+class ReportSchema:
+    record_class: type
+    headers: Tuple[List[str], List[str]] # (required, optional), as csv_import checks them
+    fields: Tuple[Tuple[str, str], ...] # (field, kind) in record constructor order
+    parse_row: Callable # csv_import's row parser, for the rows the column path doesn't cover
+
+
+AFFILIATE_SCHEMA = ReportSchema(
+    AffiliatePerformanceData, AFFILIATE_HEADERS,
+    (('report_date', DATE), ('affiliate_name', NAME), ('impressions', INT), ('clicks', INT),
+     ('conversions', INT), ('commission_amount', FLOAT)),
+    _parse_affiliate_row)
+
+AD_CAMPAIGN_SCHEMA = ReportSchema(
+    AdCampaignPerformanceData, AD_CAMPAIGN_HEADERS,
+    (('report_date', DATE), ('campaign_name', NAME), ('platform', TEXT), ('impressions', INT),
+     ('clicks', INT), ('cost', FLOAT), ('conversions', INT)),
+    _parse_ad_campaign_row)
+
+
+@dataclass
+class ReportColumns:
+    """
+    The rows of a batch that became records, as aligned columns: report_date is datetime64[D],
+    names and platform are object arrays of str (platform may hold None), integer fields int64
+    and float fields float64. nulls[field] marks the empty cells of the numeric fields (held as
+    0 / NaN in the arrays). row_number is the CSV row each entry came from, as in error messages.
+    """
+    columns: Dict[str, np.ndarray]
+    nulls: Dict[str, np.ndarray]
+    row_number: np.ndarray
+
+    def __len__(self):
+        return len(self.row_number)
+
+    @classmethod
+    def empty(cls, schema: ReportSchema) -> 'ReportColumns':
+        return cls.concat(schema, [])
+
+    @classmethod
+    def concat(cls, schema: ReportSchema, batches: List['ReportColumns']) -> 'ReportColumns':
+        if not batches:
+            dtypes = {DATE: 'datetime64[D]', NAME: object, TEXT: object, INT: np.int64, FLOAT: np.float64}
+            return cls({name: np.empty(0, dtypes[kind]) for name, kind in schema.fields},
+                       {name: np.empty(0, bool) for name, kind in schema.fields if kind in (INT, FLOAT)},
+                       np.empty(0, np.int64))
+        return cls({name: np.concatenate([b.columns[name] for b in batches]) for name in batches[0].columns},
+                   {name: np.concatenate([b.nulls[name] for b in batches]) for name in batches[0].nulls},
+                   np.concatenate([b.row_number for b in batches]))
+
+
+# --- Column converters: (values for the records, array, nulls, ok); rows not `ok` go to the row parser ---
+
+def _digit_matrix(cells, max_width: int):
+    """Cells as a (rows, width) matrix of code points, 0-padded, plus their lengths; width is capped at max_width."""
+    lengths = np.fromiter(map(len, cells), np.int64, len(cells))
+    width = max(1, min(int(lengths.max()), max_width)) # Batches are never empty
+    # Longer cells are truncated here; their lengths keep them off the fast path
+    matrix = np.array(cells, dtype=f'<U{width}').view(np.uint32).reshape(len(cells), width)
+    return matrix, lengths
+
+def _int_column(cells):
+    matrix, lengths = _digit_matrix(cells, INT_MAX_DIGITS)
+    inside = np.arange(matrix.shape[1]) < lengths[:, None]
+    digits = matrix - 48 # uint32: anything below '0' wraps to a large value
+    ok = (lengths <= INT_MAX_DIGITS) & ((digits < 10) | ~inside).all(axis=1) # Empty cells too: they are None
+    array = np.zeros(len(cells), np.int64)
+    for j in range(matrix.shape[1]): # Horner, one character position at a time for the whole column
+        array = np.where(inside[:, j], array * 10 + digits[:, j], array)
+    nulls = lengths == 0
+    return _with_nones(array.tolist(), nulls), array, nulls, ok
+
+def _float_column(cells):
+    matrix, lengths = _digit_matrix(cells, FLOAT_MAX_DIGITS + 1)
+    inside = np.arange(matrix.shape[1]) < lengths[:, None]
+    digits = matrix - 48
+    is_digit = (digits < 10) & inside
+    is_point = matrix == 46 # '.'
+    digit_count = is_digit.sum(axis=1)
+    ok = ((lengths <= FLOAT_MAX_DIGITS + 1) & (is_digit | is_point | ~inside).all(axis=1)
+          & (is_point.sum(axis=1) <= 1) & (digit_count <= FLOAT_MAX_DIGITS))
+    ok &= (digit_count > 0) | (lengths == 0) # "." alone is not a number
+    mantissa = np.zeros(len(cells), np.int64)
+    decimals = np.zeros(len(cells), np.int64)
+    after_point = np.zeros(len(cells), bool)
+    for j in range(matrix.shape[1]):
+        mantissa = np.where(is_digit[:, j], mantissa * 10 + digits[:, j], mantissa)
+        decimals += is_digit[:, j] & after_point
+        after_point |= is_point[:, j]
+    nulls = lengths == 0
+    array = mantissa / POW10[np.minimum(decimals, FLOAT_MAX_DIGITS)]
+    array[nulls] = np.nan
+    return _with_nones(array.tolist(), nulls), array, nulls, ok
+
+def _with_nones(values: list, nulls: np.ndarray) -> list:
+    for i in np.flatnonzero(nulls).tolist():
+        values[i] = None
+    return values
+
+def _strip_column(cells, required: bool):
+    """NAME: stripped, missing (None or '') is not ok. TEXT: stripped, None stays None."""
+    if None in cells:
+        values = [cell.strip() if cell is not None else None for cell in cells]
+    else:
+        values = list(map(str.strip, cells))
+    if required and ('' in cells or None in cells):
+        ok = np.fromiter(map(bool, cells), bool, len(cells))
+    else:
+        ok = np.ones(len(cells), bool)
+    return values, None, None, ok
+
+def _date_column(cells, date_cache: dict, day_cache: dict):
+    for cell in dict.fromkeys(cells).keys() - date_cache.keys():
+        try:
+            parsed = datetime.strptime(cell, '%Y-%m-%d').date()
+        except (TypeError, ValueError): # None, bad dates: the row parser reports them
+            parsed = None
+        date_cache[cell] = parsed
+        day_cache[cell] = NAT if parsed is None else int(np.datetime64(parsed, 'D').astype(np.int64))
+    days = np.fromiter(map(day_cache.__getitem__, cells), np.int64, len(cells))
+    return list(map(date_cache.__getitem__, cells)), days.view('datetime64[D]'), None, days != NAT
+
+
+def _parse_batch(rows: List[list], first_row_num: int, fieldnames: List[str], schema: ReportSchema,
+                 date_cache: dict, day_cache: dict, errors: List[str], want_records: bool, want_columns: bool):
+    n = len(rows)
+    # DictReader semantics: the last column of a repeated header wins, cells past a short row's end are None
+    index = {name: i for i, name in enumerate(fieldnames)}
+    width = len(fieldnames)
+    if set(map(len, rows)) != {width}:
+        rows = [row[:width] if len(row) >= width else row + [None] * (width - len(row)) for row in rows]
+    cells = list(zip(*rows))
+
+    values, arrays, nulls = {}, {}, {}
+    ok = np.ones(n, bool)
+    for name, kind in schema.fields:
+        column = cells[index[name]] if name in index else (None,) * n
+        if kind in (INT, FLOAT) and None in column:
+            column = ['' if cell is None else cell for cell in column] # Both are an empty value
+        if kind == DATE:
+            converted = _date_column(column, date_cache, day_cache)
+        elif kind == INT:
+            converted = _int_column(column)
+        elif kind == FLOAT:
+            converted = _float_column(column)
+        else:
+            converted = _strip_column(column, required=kind == NAME)
+        values[name], arrays[name], field_nulls, field_ok = converted
+        if field_nulls is not None:
+            nulls[name] = field_nulls
+        ok &= field_ok
+
+    keep = ok.copy()
+    for i in np.flatnonzero(~ok).tolist():
+        # The row parser decides: same record (or none) and same messages as the row path
+        record = schema.parse_row(dict(zip(fieldnames, rows[i])), first_row_num + i, errors)
+        if record is None:
+            keep[i] = False
+            continue
+        keep[i] = True
+        for name, kind in schema.fields:
+            value = getattr(record, name)
+            values[name][i] = value
+            if not want_columns:
+                continue
+            if kind == DATE:
+                arrays[name][i] = np.datetime64(value, 'D')
+            elif kind in (INT, FLOAT):
+                nulls[name][i] = value is None
+                arrays[name][i] = (0 if kind == INT else np.nan) if value is None else value
+
+    all_kept = bool(keep.all())
+    records = None
+    if want_records:
+        field_values = [values[name] for name, _ in schema.fields]
+        if not all_kept:
+            selectors = keep.tolist()
+            field_values = [list(compress(column, selectors)) for column in field_values]
+        records = list(map(schema.record_class, *field_values))
+    columns = None
+    if want_columns:
+        typed = {}
+        for name, kind in schema.fields:
+            if kind in (NAME, TEXT):
+                typed[name] = np.empty(n, object)
+                typed[name][:] = values[name]
+            else:
+                typed[name] = arrays[name]
+        row_number = np.arange(first_row_num, first_row_num + n)
+        if not all_kept:
+            typed = {name: column[keep] for name, column in typed.items()}
+            nulls = {name: mask[keep] for name, mask in nulls.items()}
+            row_number = row_number[keep]
+        columns = ReportColumns(typed, nulls, row_number)
+    return records, columns
+
+
+def _iter_report_batches(file_stream, schema: ReportSchema, chunk_rows: int, want_records: bool, want_columns: bool,
+                         fieldnames: Optional[List[str]] = None) -> Iterator[Tuple[Optional[list], Optional[ReportColumns], List[str]]]:
+    """
+    Yields (records, columns, errors) per batch of up to `chunk_rows` data rows; header problems
+    end it after one yield. `fieldnames` and the return value (data rows read) as in
+    csv_import's iterators.
+    """
+    reader = csv.reader(file_stream)
+    if fieldnames is None:
+        fieldnames = next(reader, None)
+        header_error = _check_headers(fieldnames, *schema.headers)
+        if header_error:
+            yield ([] if want_records else None), (ReportColumns.empty(schema) if want_columns else None), [header_error]
+            return 0
+    date_cache, day_cache = {}, {}
+    row_num = 2
+    while True:
+        batch = list(islice(reader, chunk_rows))
+        if not batch:
+            return row_num - 2
+        rows = batch if all(batch) else list(filter(None, batch)) # DictReader skips blank lines without counting them
+        if not rows:
+            continue
+        if len(date_cache) > DATE_CACHE_LIMIT:
+            date_cache.clear()
+            day_cache.clear()
+        errors = []
+        records, columns = _parse_batch(rows, row_num, fieldnames, schema, date_cache, day_cache,
+                                        errors, want_records, want_columns)
+        row_num += len(rows)
+        yield records, columns, errors
+
+def _pick(batches, part: int):
+    """(batch[part], errors) from _iter_report_batches, passing its return value on."""
+    while True:
+        try:
+            batch = next(batches)
+        except StopIteration as stop:
+            return stop.value
+        yield batch[part], batch[2]
+
+
+def iter_affiliate_csv_columnar(file_stream, chunk_rows: int = COLUMNAR_CHUNK_ROWS,
+                                fieldnames: Optional[List[str]] = None) -> Iterator[Tuple[List[AffiliatePerformanceData], List[str]]]:
+    """Same (records, errors) chunks as csv_import.iter_affiliate_csv, so ingest_csv can use it."""
+    return _pick(_iter_report_batches(file_stream, AFFILIATE_SCHEMA, chunk_rows, True, False, fieldnames), 0)
+
+def iter_ad_campaign_csv_columnar(file_stream, chunk_rows: int = COLUMNAR_CHUNK_ROWS,
+                                  fieldnames: Optional[List[str]] = None) -> Iterator[Tuple[List[AdCampaignPerformanceData], List[str]]]:
+    """Same (records, errors) chunks as csv_import.iter_ad_campaign_csv, so ingest_csv can use it."""
+    return _pick(_iter_report_batches(file_stream, AD_CAMPAIGN_SCHEMA, chunk_rows, True, False, fieldnames), 0)
+
+def iter_affiliate_columns(file_stream, chunk_rows: int = COLUMNAR_CHUNK_ROWS,
+                           fieldnames: Optional[List[str]] = None) -> Iterator[Tuple[ReportColumns, List[str]]]:
+    return _pick(_iter_report_batches(file_stream, AFFILIATE_SCHEMA, chunk_rows, False, True, fieldnames), 1)
+
+def iter_ad_campaign_columns(file_stream, chunk_rows: int = COLUMNAR_CHUNK_ROWS,
+                             fieldnames: Optional[List[str]] = None) -> Iterator[Tuple[ReportColumns, List[str]]]:
+    return _pick(_iter_report_batches(file_stream, AD_CAMPAIGN_SCHEMA, chunk_rows, False, True, fieldnames), 1)
+
+
+def _parse_whole(file_stream, schema: ReportSchema, as_columns: bool):
+    data, errors = [], []
+    for records, columns, batch_errors in _iter_report_batches(file_stream, schema, COLUMNAR_CHUNK_ROWS,
+                                                               not as_columns, as_columns):
+        data.append(columns) if as_columns else data.extend(records)
+        errors.extend(batch_errors)
+    return (ReportColumns.concat(schema, data) if as_columns else data), errors
+
+def parse_affiliate_csv_columnar(file_stream, as_columns: bool = False):
+    """parse_affiliate_csv's (records, errors), or (ReportColumns, errors) with as_columns=True."""
+    return _parse_whole(file_stream, AFFILIATE_SCHEMA, as_columns)
+
+def parse_ad_campaign_csv_columnar(file_stream, as_columns: bool = False):
+    """parse_ad_campaign_csv's (records, errors), or (ReportColumns, errors) with as_columns=True."""
+    return _parse_whole(file_stream, AD_CAMPAIGN_SCHEMA, as_columns)
@@ -0,0 +1,236 @@
+"""
+CSV import for affiliate and ad campaign reports.
+
+The upload routes used to read the whole upload, decode it, copy the text into an io.StringIO and
+parse that into one list of records, so peak memory was several times the file size and the
+multi-hundred-MB network exports took workers down. ingest_csv streams instead:
+
+    upload (werkzeug spools it to a temp file) -> TextIOWrapper (incremental UTF-8 decode)
+        -> csv.DictReader, one row at a time -> validated records, CSV_CHUNK_ROWS at a time
+        -> sink (e.g. the store's extend)
+
+Only one chunk of records is alive at a time, so memory is bounded by the chunk size rather than
+the file. Errors are counted; the first ERROR_SAMPLE_LIMIT messages are kept for the user.
+
+parse_affiliate_csv / parse_ad_campaign_csv (whole stream -> (records, errors)) run on the same
+row parsers and return what they always did, messages included, except that a row with an integer
+beyond 64 bits (int() takes any number of digits; the store and the int64 columns don't) is now
+skipped with a row error.
+
+Kept apart from services.py, which imports the ads SDKs, so parsing can be imported on its own.
+
+Usage:
+    result = ingest_csv(file.stream, iter_affiliate_csv, report_store(current_app).affiliate.extend)
+    records, errors = parse_affiliate_csv(io.StringIO(text))
+"""
+import csv
+import io
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from .models import AffiliatePerformanceData, AdCampaignPerformanceData
+
+CSV_CHUNK_ROWS = 5000 # Rows parsed between hand-offs to the sink
+ERROR_SAMPLE_LIMIT = 20 # Error messages kept per import (they end up in the session cookie); the rest are counted
+INTEGER_MIN, INTEGER_MAX = -2 ** 63, 2 ** 63 - 1 # What the report store (SQLite INTEGER) and int64 columns hold
+INTEGER_FIELDS = ('impressions', 'clicks', 'conversions') # The int fields of both record types
+
+logger = logging.getLogger(__name__) # Child of the Flask app's logger ("app")
+
+
+# --- Row parsers (shared by the streaming and whole-file paths) ---
+
+def _safe_to_int(value_str: str, field_name: str, row_num: int, errors: List[str]) -> Optional[int]:
+    if value_str is None or value_str.strip() == '': return None
+    try: return int(value_str)
+    except ValueError: errors.append(f"Row {row_num}: Invalid integer value '{value_str}' for '{field_name}'."); return None
+
+def _safe_to_float(value_str: str, field_name: str, row_num: int, errors: List[str]) -> Optional[float]:
+    if value_str is None or value_str.strip() == '': return None
+    try: return float(value_str)
+    except ValueError: errors.append(f"Row {row_num}: Invalid float value '{value_str}' for '{field_name}'."); return None
+
+def _integers_in_range(record, row_num: int, errors: List[str]):
+    """`record`, or None with a row error when an integer is too wide to store (int() takes any number of digits)."""
+    for name in INTEGER_FIELDS:
+        value = getattr(record, name)
+        if value is not None and not INTEGER_MIN <= value <= INTEGER_MAX:
+            errors.append(f"Row {row_num}: Integer value {value} for '{name}' is out of range. Skipping row.")
+            return None
+    return record
+
+def _parse_affiliate_row(row: dict, row_num: int, errors: List[str]) -> Optional[AffiliatePerformanceData]:
+    try:
+        report_date_str = row.get('report_date')
+        if not report_date_str:
+            errors.append(f"Row {row_num}: Missing 'report_date'. Skipping row.")
+            return None
+        report_date = datetime.strptime(report_date_str, '%Y-%m-%d').date()
+        affiliate_name = row.get('affiliate_name')
+        if not affiliate_name:
+            errors.append(f"Row {row_num}: Missing 'affiliate_name'. Skipping row.")
+            return None
+        return _integers_in_range(AffiliatePerformanceData(
+            report_date=report_date, affiliate_name=affiliate_name.strip(),
+            impressions=_safe_to_int(row.get('impressions'), 'impressions', row_num, errors),
+            clicks=_safe_to_int(row.get('clicks'), 'clicks', row_num, errors),
+            conversions=_safe_to_int(row.get('conversions'), 'conversions', row_num, errors),
+            commission_amount=_safe_to_float(row.get('commission_amount'), 'commission_amount', row_num, errors)
+        ), row_num, errors)
+    except ValueError as e: errors.append(f"Row {row_num}: Error parsing data. Invalid date format for '{report_date_str}'? Expected YYYY-MM-DD. Details: {e}. Skipping row.")
+    except Exception as e: errors.append(f"Row {row_num}: An unexpected error occurred processing this row: {e}. Skipping row.")
+    return None
+
+def _parse_ad_campaign_row(row: dict, row_num: int, errors: List[str]) -> Optional[AdCampaignPerformanceData]:
+    try:
+        report_date_str = row.get('report_date')
+        if not report_date_str: errors.append(f"Row {row_num}: Missing 'report_date'. Skipping row."); return None
+        report_date = datetime.strptime(report_date_str, '%Y-%m-%d').date()
+        campaign_name = row.get('campaign_name')
+        if not campaign_name: errors.append(f"Row {row_num}: Missing 'campaign_name'. Skipping row."); return None
+        platform = row.get('platform', None); platform = platform.strip() if platform is not None else None
+        return _integers_in_range(AdCampaignPerformanceData(
+            report_date=report_date, campaign_name=campaign_name.strip(), platform=platform,
+            impressions=_safe_to_int(row.get('impressions'), 'impressions', row_num, errors),
+            clicks=_safe_to_int(row.get('clicks'), 'clicks', row_num, errors),
+            cost=_safe_to_float(row.get('cost'), 'cost', row_num, errors),
+            conversions=_safe_to_int(row.get('conversions'), 'conversions', row_num, errors)
+        ), row_num, errors)
+    except ValueError as e: errors.append(f"Row {row_num}: Error parsing data. Invalid date format for '{report_date_str}'? Expected YYYY-MM-DD. Details: {e}. Skipping row.")
+    except Exception as e: errors.append(f"Row {row_num}: An unexpected error occurred: {e}. Skipping row.")
+    return None
+
+
+AFFILIATE_HEADERS = (['report_date', 'affiliate_name'], ['impressions', 'clicks', 'conversions', 'commission_amount']) # (required, optional)
+AD_CAMPAIGN_HEADERS = (['report_date', 'campaign_name'], ['platform', 'impressions', 'clicks', 'cost', 'conversions'])
+
+def _check_headers(fieldnames: Optional[List[str]], required_headers: List[str], optional_headers: List[str]) -> Optional[str]:
+    """The error that stops an import before its first row, if any; unexpected headers are only logged."""
+    all_expected_headers = required_headers + optional_headers
+    if not fieldnames:
+        return "CSV file is empty or has no headers."
+    missing_required_headers = [h for h in required_headers if h not in fieldnames]
+    if missing_required_headers:
+        return f"Missing required CSV headers: {', '.join(missing_required_headers)}"
+    unexpected_headers = [h for h in fieldnames if h not in all_expected_headers]
+    if unexpected_headers:
+        logger.warning(f"CSV contains unexpected headers (will be ignored): {', '.join(unexpected_headers)}")
+    return None
+
+def _iter_report_csv(file_stream, headers: Tuple[List[str], List[str]], parse_row: Callable,
+                     chunk_rows: int, fieldnames: Optional[List[str]] = None) -> Iterator[Tuple[list, List[str]]]:
+    """
+    Yields (records, errors) for every `chunk_rows` data rows; header problems end it after one
+    yield. With `fieldnames` the stream has no header line (its caller read and checked it, e.g.
+    a slice of a bigger file) and rows are numbered from 2 as if it were a file of its own.
+    Returns (as the generator's return value) the number of data rows read.
+    """
+    reader = csv.DictReader(file_stream, fieldnames=fieldnames)
+    if fieldnames is None:
+        header_error = _check_headers(reader.fieldnames, *headers)
+        if header_error:
+            yield [], [header_error]
+            return 0
+    records, errors = [], []
+    row_num = 1
+    for row_num, row in enumerate(reader, start=2):
+        record = parse_row(row, row_num, errors)
+        if record is not None:
+            records.append(record)
+        if (row_num - 1) % chunk_rows == 0:
+            yield records, errors
+            records, errors = [], []
+    if records or errors:
+        yield records, errors
+    return row_num - 1
+
+def iter_affiliate_csv(file_stream, chunk_rows: int = CSV_CHUNK_ROWS,
+                       fieldnames: Optional[List[str]] = None) -> Iterator[Tuple[List[AffiliatePerformanceData], List[str]]]:
+    """Affiliate report rows from a text stream, as (records, errors) chunks."""
+    return _iter_report_csv(file_stream, AFFILIATE_HEADERS, _parse_affiliate_row, chunk_rows, fieldnames)
+
+def iter_ad_campaign_csv(file_stream, chunk_rows: int = CSV_CHUNK_ROWS,
+                         fieldnames: Optional[List[str]] = None) -> Iterator[Tuple[List[AdCampaignPerformanceData], List[str]]]:
+    """Ad campaign report rows from a text stream, as (records, errors) chunks."""
+    return _iter_report_csv(file_stream, AD_CAMPAIGN_HEADERS, _parse_ad_campaign_row, chunk_rows, fieldnames)
+
+
+def _collect(chunks) -> Tuple[list, List[str]]:
+    data_records, errors = [], []
+    for records, chunk_errors in chunks:
+        data_records.extend(records)
+        errors.extend(chunk_errors)
+    return data_records, errors
+
+def parse_affiliate_csv(file_stream: io.StringIO) -> Tuple[List[AffiliatePerformanceData], List[str]]:
+    return _collect(iter_affiliate_csv(file_stream))
+
+def parse_ad_campaign_csv(file_stream: io.StringIO) -> Tuple[List[AdCampaignPerformanceData], List[str]]:
+    return _collect(iter_ad_campaign_csv(file_stream))
+
+
+# --- Streaming ingestion ---
+
+@dataclass
+class IngestResult:
+    """What one import stored and what went wrong (messages capped at ERROR_SAMPLE_LIMIT)."""
+    records: int = 0
+    error_count: int = 0
+    error_samples: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def add_errors(self, errors: List[str]):
+        self.error_count += len(errors)
+        room = ERROR_SAMPLE_LIMIT - len(self.error_samples)
+        if room > 0:
+            self.error_samples.extend(errors[:room])
+
+    @property
+    def errors_not_shown(self) -> int:
+        return self.error_count - len(self.error_samples)
+
+
+class _RawReader(io.RawIOBase):
+    """Raw-IO view of a stream that only has read(): SpooledTemporaryFile (werkzeug's upload spool) isn't an IOBase before 3.11."""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def ingest_csv(binary_stream, iter_records: Callable, sink: Callable[[list], None],
+               chunk_rows: int = CSV_CHUNK_ROWS, encoding: str = 'utf-8') -> IngestResult:
+    """
+    Streams a binary CSV upload (e.g. werkzeug's FileStorage.stream) through `iter_records`
+    (iter_affiliate_csv / iter_ad_campaign_csv) and hands each chunk of valid records to `sink`.
+    Chunks already handed over stay stored if a later part of the file turns out not to be
+    valid `encoding`; that is reported as an error.
+    """
+    started = time.perf_counter()
+    result = IngestResult()
+    if not isinstance(binary_stream, io.IOBase):
+        binary_stream = io.BufferedReader(_RawReader(binary_stream))
+    text_stream = io.TextIOWrapper(binary_stream, encoding=encoding, newline='') # newline='' as csv expects
+    try:
+        for records, errors in iter_records(text_stream, chunk_rows):
+            if records:
+                sink(records)
+                result.records += len(records)
+            if errors:
+                result.add_errors(errors)
+    except UnicodeDecodeError as e:
+        result.add_errors([f"File is not valid {encoding} after {result.records} stored records: {e}. Import stopped."])
+    finally:
+        text_stream.detach() # Leave the upload's stream open for its owner
+    result.seconds = time.perf_counter() - started
+    return result
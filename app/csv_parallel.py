@@ -0,0 +1,344 @@
+"""
+Bulk CSV import: many report files, or one huge one, parsed on a process pool.
+
+At month-end dozens of per-network exports come in, and the upload routes parse each one in the
+request thread on one core. import_csv_files spreads the parsing over all cores and puts the
+results back together in order:
+
+    each file -> header, read and checked once in this process
+        -> spans of about SPAN_BYTES, each ending at a newline outside quoted fields
+        -> pool workers: decode a span, parse it (the columnar parser when numpy is installed,
+           else csv_import's row parser; the records are the same), pack it as columns for the
+           trip back
+        -> this process, in file and span order: records to the sink, errors to the file's
+           IngestResult, renumbered to the file's row numbers
+
+A worker numbers its rows from 2 as if its span were a file of its own. The parent adds the rows
+of the spans before it, so records, messages and their order are exactly those of importing the
+files one by one with ingest_csv. The parent's share of the work (rebuilding the records, about
+1.7us each) is serial: benchmarks/bench_csv_parallel.py measures it at about a fifth of the CPU
+the import takes, so the pool tops out near 5x one process, reached with 5-6 workers; more
+cores don't help.
+
+A span boundary is a newline with an even number of '"' since the start of the span, so quoted
+cells holding newlines stay in one span. That holds for any file a CSV writer produced.
+Invalid text stops a file's import at the span it occurs in (whole lines before it are kept),
+as ingest_csv stops at the block it occurs in.
+
+Usage:
+    results = import_csv_files(paths, "affiliate", report_store(current_app).affiliate.extend,
+                               progress=lambda done, total, rows: ...)
+    python app/csv_parallel.py ad_campaign exports/*.csv --processes 8   # from the repo root
+    python app/csv_parallel.py ad_campaign exports/*.csv --db reports.sqlite3   # and store them
+"""
+if not __package__:
+    # Run as a script. At the repo root app.py (the game API) owns the name `app`, so this
+    # directory is mounted as package "reports_app" for the relative imports below.
+    import importlib.machinery
+    import importlib.util
+    import os
+    import sys
+    _spec = importlib.machinery.ModuleSpec("reports_app", None, is_package=True)
+    _spec.submodule_search_locations = [os.path.dirname(os.path.abspath(__file__))]
+    sys.modules.setdefault("reports_app", importlib.util.module_from_spec(_spec))
+    __package__ = "reports_app"
+
+import csv
+import io
+import logging
+import mmap
+import multiprocessing
+import os
+import time
+from array import array
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import fields
+from operator import attrgetter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .csv_import import (AFFILIATE_HEADERS, AD_CAMPAIGN_HEADERS, IngestResult, _check_headers,
+                         iter_affiliate_csv, iter_ad_campaign_csv)
+from .models import AffiliatePerformanceData, AdCampaignPerformanceData
+
+try:
+    import numpy as np
+    from .csv_columnar import (AFFILIATE_SCHEMA, AD_CAMPAIGN_SCHEMA, ReportColumns,
+                               iter_affiliate_columns, iter_ad_campaign_columns,
+                               iter_affiliate_csv_columnar, iter_ad_campaign_csv_columnar)
+except ImportError: # numpy is optional: the row parsers give the same records, only slower
+    np = AFFILIATE_SCHEMA = AD_CAMPAIGN_SCHEMA = iter_affiliate_columns = iter_ad_campaign_columns = None
+    iter_affiliate_csv_columnar, iter_ad_campaign_csv_columnar = iter_affiliate_csv, iter_ad_campaign_csv
+
+SPAN_BYTES = 8 * 2**20 # Bytes of a file per pool task
+IN_FLIGHT_PER_WORKER = 2 # Spans parsed ahead of the merge, per worker (bounds memory when one span is slow)
+# Pool workers start from a fork server, or spawn where there is none, never as forks of this
+# process: imports run on job threads, and a fork copies the locks other threads hold (logging,
+# the report store's connections) into the child, where nothing will release them.
+POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# kind -> (record class, required/optional headers, records parser, columns parser and schema or None without numpy)
+REPORT_KINDS: Dict[str, tuple] = {
+    "affiliate": (AffiliatePerformanceData, AFFILIATE_HEADERS, iter_affiliate_csv_columnar,
+                  iter_affiliate_columns, AFFILIATE_SCHEMA),
+    "ad_campaign": (AdCampaignPerformanceData, AD_CAMPAIGN_HEADERS, iter_ad_campaign_csv_columnar,
+                    iter_ad_campaign_columns, AD_CAMPAIGN_SCHEMA),
+}
+
+logger = logging.getLogger(__name__)
+
+
+# --- Splitting ---
+
+def _read_header(path: str, encoding: str) -> Tuple[Optional[List[str]], int, Optional[str]]:
+    """(header fields, byte offset of the first data row, error); a quoted header cell may span lines."""
+    with open(path, "rb") as f:
+        raw = f.readline()
+        while raw.count(b'"') % 2:
+            line = f.readline()
+            if not line:
+                break
+            raw += line
+        data_start = f.tell()
+    try:
+        text = raw.decode(encoding)
+    except UnicodeDecodeError as e:
+        return None, data_start, f"File is not valid {encoding} after 0 stored records: {e}. Import stopped."
+    return next(csv.reader(io.StringIO(text, newline="")), None), data_start, None
+
+def _split_spans(path: str, start: int, span_bytes: int) -> List[Tuple[int, int]]:
+    """[start, end) byte ranges covering the file from `start`, each ending just after a newline outside quotes."""
+    size = os.path.getsize(path)
+    if start >= size:
+        return []
+    spans = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        while start < size:
+            end = data.find(b"\n", min(start + span_bytes, size) - 1)
+            quotes = data[start:end].count(b'"') if end != -1 else 0
+            while end != -1 and quotes % 2: # Inside a quoted cell: the row goes on past this newline
+                next_end = data.find(b"\n", end + 1)
+                quotes += data[end:next_end].count(b'"') if next_end != -1 else 0
+                end = next_end
+            end = size if end == -1 else end + 1
+            spans.append((start, end))
+            start = end
+    return spans
+
+
+# --- Pool side ---
+#
+# Spans travel back as columns: text and date fields dictionary-encoded (a report repeats a few
+# hundred dates and names), numbers as arrays or lists. Per field one of
+#     ("dictionary", distinct values, codes)   ("numbers", int64/float64 array, null mask)   ("list", values)
+# That is a third of the bytes of pickling the records and several times faster to rebuild,
+# and rebuilding is the part of the work the merging process can't hand off.
+
+_NUMERIC_FIELDS = {cls: {f.name for f in fields(cls) if f.type in (Optional[int], Optional[float])}
+                   for cls in (AffiliatePerformanceData, AdCampaignPerformanceData)}
+
+def _dictionary(values) -> tuple:
+    index = {}
+    codes = array("I", [index.setdefault(value, len(index)) for value in values])
+    return "dictionary", list(index), codes
+
+def _pack_records(records: list, record_class: type) -> list:
+    if not records:
+        return []
+    names = [f.name for f in fields(record_class)]
+    return [("list", list(column)) if name in _NUMERIC_FIELDS[record_class] else _dictionary(column)
+            for name, column in zip(names, zip(*map(attrgetter(*names), records)))]
+
+def _pack_columns(columns: 'ReportColumns', record_class: type) -> list:
+    if not len(columns):
+        return []
+    packed = []
+    for f in fields(record_class):
+        column = columns.columns[f.name]
+        if f.name in columns.nulls:
+            packed.append(("numbers", column, columns.nulls[f.name]))
+        elif column.dtype.kind == "M": # datetime64: distinct days come back as datetime.date
+            days, codes = np.unique(column, return_inverse=True)
+            packed.append(("dictionary", days.tolist(), codes.astype(np.uint32)))
+        else:
+            packed.append(_dictionary(column.tolist()))
+    return packed
+
+def _unpack(packed: list, record_class: type) -> list:
+    if not packed:
+        return []
+    columns = []
+    for encoding, values, *rest in packed:
+        if encoding == "dictionary":
+            columns.append(list(map(values.__getitem__, rest[0].tolist())))
+        elif encoding == "numbers":
+            column = values.tolist()
+            for i in np.flatnonzero(rest[0]).tolist():
+                column[i] = None
+            columns.append(column)
+        else:
+            columns.append(values)
+    return list(map(record_class, *columns))
+
+
+def _drain(chunks) -> Tuple[list, List[str], int]:
+    """Everything an iter_* parser yields, plus its return value (the data rows read)."""
+    items, errors = [], []
+    while True:
+        try:
+            chunk, chunk_errors = next(chunks)
+        except StopIteration as stop:
+            return items, errors, stop.value
+        items.append(chunk)
+        errors.extend(chunk_errors)
+
+def _parse_span(path: str, start: int, end: int, kind: str, fieldnames: List[str], encoding: str,
+                packed: bool = True) -> Tuple[list, List[str], int, Optional[str]]:
+    """
+    Pool worker: (records, errors numbered from row 2, data rows, decode problem) for bytes
+    [start, end) of `path`. Records come packed for the trip back unless `packed` is False.
+    """
+    record_class, _, iter_records, iter_columns, schema = REPORT_KINDS[kind]
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    decode_error = None
+    try:
+        text = data.decode(encoding)
+    except UnicodeDecodeError as e:
+        decode_error = f"{e.reason} at byte {start + e.start} ({data[e.start:e.start + 1]!r})"
+        text = data[:data.rfind(b"\n", 0, e.start) + 1].decode(encoding) # The whole lines before it
+    stream = io.StringIO(text, newline="")
+    if packed and iter_columns is not None: # Straight from the typed columns, no records built here
+        batches, errors, rows = _drain(iter_columns(stream, fieldnames=fieldnames))
+        return _pack_columns(ReportColumns.concat(schema, batches), record_class), errors, rows, decode_error
+    chunks, errors, rows = _drain(iter_records(stream, fieldnames=fieldnames))
+    records = [record for chunk in chunks for record in chunk]
+    return (_pack_records(records, record_class) if packed else records), errors, rows, decode_error
+
+def process_pool(processes: Optional[int] = None) -> ProcessPoolExecutor:
+    """A pool for import_csv_files, `processes` workers (default: all cores) started with POOL_START_METHOD."""
+    return ProcessPoolExecutor(max_workers=processes or os.cpu_count(),
+                               mp_context=multiprocessing.get_context(POOL_START_METHOD))
+
+def _parsed_spans(spans: list, kind: str, encoding: str, processes: Optional[int], pool: Optional[Executor]):
+    """_parse_span's results in span order; `processes=1` parses inline, else on `pool` or a pool of its own."""
+    if processes == 1 or len(spans) <= 1:
+        for path, start, end, fieldnames in spans:
+            yield _parse_span(path, start, end, kind, fieldnames, encoding, packed=False)
+        return
+    workers = min(processes or os.cpu_count(), len(spans))
+    if pool is None:
+        with process_pool(workers) as pool:
+            yield from _parsed_spans(spans, kind, encoding, workers, pool)
+        return
+    in_flight = deque()
+    for path, start, end, fieldnames in spans:
+        in_flight.append(pool.submit(_parse_span, path, start, end, kind, fieldnames, encoding))
+        if len(in_flight) >= workers * IN_FLIGHT_PER_WORKER:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
+
+
+# --- Merging ---
+
+def _renumber(errors: List[str], offset: int) -> List[str]:
+    """Row errors from a span ("Row <n>: ...", n counted from the span's start) in file row numbers."""
+    if not offset:
+        return errors
+    renumbered = []
+    for error in errors:
+        head, separator, rest = error.partition(": ")
+        renumbered.append(f"Row {int(head[4:]) + offset}{separator}{rest}" if head.startswith("Row ") else error)
+    return renumbered
+
+
+def import_csv_files(paths: List[str], kind: str, sink: Callable[[list], None], processes: Optional[int] = None,
+                     span_bytes: int = SPAN_BYTES, encoding: str = "utf-8",
+                     progress: Optional[Callable[[int, int, int], None]] = None,
+                     results: Optional[Dict[str, IngestResult]] = None,
+                     pool: Optional[Executor] = None) -> Dict[str, IngestResult]:
+    """
+    Imports report files of one `kind` ("affiliate" or "ad_campaign") on a process pool
+    (default: all cores; `processes=1` parses inline). The pool is `pool` when given (see
+    process_pool; it stays open for the next caller), else one started and shut down for this
+    call; `processes` then caps the workers it keeps busy. Valid records reach `sink` in file order
+    and, within a file, row order. Returns an IngestResult per path, in the order given; they
+    are filled in as spans merge, into `results` when given (to watch them from another thread).
+    `progress(bytes_done, bytes_total, rows_done)` is called after each merged span.
+    """
+    record_class, headers = REPORT_KINDS[kind][:2]
+    started = time.perf_counter()
+    results = {} if results is None else results
+    results.update((path, IngestResult()) for path in paths)
+    spans = []
+    for path in paths:
+        fieldnames, data_start, error = _read_header(path, encoding)
+        error = error or _check_headers(fieldnames, *headers)
+        if error:
+            results[path].add_errors([error])
+            continue
+        spans.extend((path, start, end, fieldnames) for start, end in _split_spans(path, data_start, span_bytes))
+
+    bytes_total = sum(end - start for _, start, end, _ in spans)
+    bytes_done = rows_done = 0
+    rows_before = dict.fromkeys(paths, 0)
+    stopped = set()
+    inline = processes == 1 or len(spans) <= 1
+    for (path, start, end, _), (records, errors, rows, decode_error) in zip(spans, _parsed_spans(spans, kind, encoding, processes, pool)):
+        bytes_done += end - start
+        if path in stopped:
+            continue
+        result = results[path]
+        if not inline:
+            records = _unpack(records, record_class)
+        if records:
+            sink(records)
+            result.records += len(records)
+        if errors:
+            result.add_errors(_renumber(errors, rows_before[path]))
+        rows_before[path] += rows
+        rows_done += rows
+        if decode_error:
+            result.add_errors([f"File is not valid {encoding} after {result.records} stored records: {decode_error}. Import stopped."])
+            stopped.add(path)
+        result.seconds = time.perf_counter() - started
+        if progress:
+            progress(bytes_done, bytes_total, rows_done)
+    logger.info(f"Imported {len(paths)} {kind} file(s), {rows_done} rows in {time.perf_counter() - started:.1f}s")
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Parse report CSVs on a process pool and report records and errors.")
+    parser.add_argument("kind", choices=sorted(REPORT_KINDS))
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--processes", type=int, default=None, help="Pool size (default: all cores; 1: inline)")
+    parser.add_argument("--span-mb", type=float, default=SPAN_BYTES / 2**20, help="Size of the pieces files are split into")
+    parser.add_argument("--db", help="Store the records in this report database (default: parse only)")
+    args = parser.parse_args()
+    sink = lambda records: None
+    if args.db:
+        from .report_store import ReportStore
+        sink = ReportStore(args.db).table(args.kind).extend
+
+    def show_progress(done, total, rows):
+        print(f"\r{done / max(total, 1):6.1%}  {rows} rows", end="", file=sys.stderr, flush=True)
+
+    started = time.perf_counter()
+    results = import_csv_files(args.files, args.kind, sink, args.processes,
+                               int(args.span_mb * 2**20), progress=show_progress)
+    elapsed = time.perf_counter() - started
+    print(file=sys.stderr)
+    for path, result in results.items():
+        print(f"{path}: {result.records} records, {result.error_count} errors")
+        for error in result.error_samples:
+            print(f"    {error}")
+        if result.errors_not_shown:
+            print(f"    ... and {result.errors_not_shown} more errors.")
+    rows = sum(result.records for result in results.values())
+    print(f"{rows} records from {len(results)} file(s) in {elapsed:.2f}s ({rows / elapsed:.0f} records/s)")
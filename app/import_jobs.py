@@ -0,0 +1,217 @@
+"""
+Background CSV import jobs.
+
+The upload routes used to parse the file inside the request: a big export held a gunicorn thread
+for the whole parse, and every error became a flash message in the session cookie. Now a route
+saves the upload to a temp directory, submits an ImportJob and returns right away:
+
+    upload -> temp dir -> ImportJobQueue (IMPORT_JOB_THREADS threads)
+        -> csv_parallel.import_csv_files (on the queue's one process pool) -> the report store
+    GET /imports/<job_id> -> the job's ImportJob.to_dict() from the report store: status, bytes and
+        rows done, rows/s, capped error samples
+
+A job's IngestResults are filled in as its spans merge, and the job saves its status document to
+the shared SQLite report store (report_store.ImportJobTable) when it starts, after each merged
+span and when it ends. Any worker answers the status endpoint, and finished jobs
+(FINISHED_JOBS_KEPT, newest first) are still there after a restart. A job whose process died
+while it ran stays "running"; its "updated" time stops moving.
+
+Usage:
+    jobs = job_queue(current_app)
+    job = jobs.submit("affiliate", {saved_path: file.filename}, directory, report_store(current_app).affiliate.extend)
+    jobs.status(job.job_id)
+"""
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+
+from .csv_import import ERROR_SAMPLE_LIMIT, IngestResult
+from .csv_parallel import import_csv_files, process_pool
+from .report_store import ImportJobTable, ReportStoreError, report_store
+
+IMPORT_JOB_THREADS = 2 # Jobs running at once per process; they share the queue's process pool
+FINISHED_JOBS_KEPT = 200 # Finished jobs still answering /imports/<job_id>, newest first
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ImportJob:
+    job_id: str
+    kind: str
+    filenames: Dict[str, str] # Saved path -> name it was uploaded as
+    status: str = QUEUED
+    submitted: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    bytes_total: int = 0
+    bytes_done: int = 0
+    rows_done: int = 0
+    results: Dict[str, IngestResult] = field(default_factory=dict) # Per saved path, filled in by the import
+    failure: Optional[str] = None
+
+    def _progress(self, bytes_done: int, bytes_total: int, rows_done: int):
+        self.bytes_done, self.bytes_total, self.rows_done = bytes_done, bytes_total, rows_done
+
+    @property
+    def seconds(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_done / self.seconds if self.seconds else 0.0
+
+    def to_dict(self) -> dict:
+        """The status document: safe to call from any thread while the job runs."""
+        results = list(self.results.items())
+        samples = []
+        for path, result in results: # Capped across all files, prefixed with the file when there are several
+            for error in result.error_samples[:ERROR_SAMPLE_LIMIT - len(samples)]:
+                samples.append(f"{self.filenames[path]}: {error}" if len(self.filenames) > 1 else error)
+        error_count = sum(result.error_count for _, result in results)
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "updated": round(time.time(), 3),
+            "files": [{"name": self.filenames[path], "records": result.records, "errors": result.error_count}
+                      for path, result in results] or [{"name": name} for name in self.filenames.values()],
+            "bytes_done": self.bytes_total if self.status == DONE else self.bytes_done,
+            "bytes_total": self.bytes_total,
+            "rows_done": self.rows_done,
+            "progress": 1.0 if self.status == DONE else (round(self.bytes_done / self.bytes_total, 4) if self.bytes_total else 0.0),
+            "rows_per_second": round(self.rows_per_second),
+            "seconds": round(self.seconds, 2),
+            "records": sum(result.records for _, result in results),
+            "error_count": error_count,
+            "error_samples": samples,
+            "errors_not_shown": error_count - len(samples),
+            "failure": self.failure,
+        }
+
+
+class ImportJobQueue:
+    """
+    Runs ImportJobs on a thread pool and keeps them by id; with `statuses`, their status
+    documents are saved there for every process to read. The jobs parse on one process pool of
+    `processes` workers (None: all cores; 1: no pool, parse on the job thread), so jobs running
+    at once split the cores between them rather than each starting a pool as big as the machine.
+    """
+
+    def __init__(self, threads: int = IMPORT_JOB_THREADS, processes: Optional[int] = None,
+                 keep: int = FINISHED_JOBS_KEPT, statuses: Optional[ImportJobTable] = None):
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="import-job")
+        self._processes = processes
+        self._pool = process_pool(processes) if processes != 1 else None # Workers start on first use
+        self._keep = keep
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, ImportJob] = {}
+        self._statuses = statuses
+
+    def submit(self, kind: str, filenames: Dict[str, str], directory: Optional[str],
+               sink: Callable[[list], None]) -> ImportJob:
+        """
+        Queues the import of the saved files (path -> uploaded name) into `sink`. `directory`
+        (holding the saved files) is removed when the job ends.
+        """
+        job = ImportJob(uuid.uuid4().hex, kind, dict(filenames),
+                        bytes_total=sum(os.path.getsize(path) for path in filenames))
+        with self._lock:
+            self._jobs[job.job_id] = job
+            finished = [job_id for job_id, j in self._jobs.items() if j.status in (DONE, FAILED)]
+            for job_id in finished[:max(len(finished) - self._keep, 0)]: # Oldest first
+                del self._jobs[job_id]
+        self._save(job)
+        if self._statuses is not None:
+            try:
+                self._statuses.prune(self._keep)
+            except ReportStoreError as e:
+                logger.warning(f"Could not prune finished import jobs: {e}")
+        self._executor.submit(self._run, job, directory, sink)
+        return job
+
+    def get(self, job_id: str) -> Optional[ImportJob]:
+        """A job submitted to this queue (still kept in memory)."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """The job's status document, whichever process runs it (ReportStoreError if the store fails)."""
+        if self._statuses is not None:
+            return self._statuses.get(job_id)
+        job = self.get(job_id)
+        return job.to_dict() if job is not None else None
+
+    def _save(self, job: ImportJob):
+        """Saves the job's status document; a failure only delays what pollers see."""
+        if self._statuses is None:
+            return
+        try:
+            self._statuses.save(job.job_id, job.submitted, job.status in (DONE, FAILED), job.to_dict())
+        except ReportStoreError as e:
+            logger.warning(f"Could not save the status of import job {job.job_id}: {e}")
+
+    def _progress(self, job: ImportJob):
+        def progress(bytes_done: int, bytes_total: int, rows_done: int):
+            job._progress(bytes_done, bytes_total, rows_done)
+            self._save(job)
+        return progress
+
+    def _run(self, job: ImportJob, directory: Optional[str], sink: Callable[[list], None]):
+        job.status, job.started = RUNNING, time.time()
+        self._save(job)
+        with self._lock:
+            pool = self._pool
+        try:
+            import_csv_files(list(job.filenames), job.kind, sink, self._processes,
+                             progress=self._progress(job), results=job.results, pool=pool)
+            job.status = DONE
+        except Exception as e:
+            logger.exception(f"Import job {job.job_id} ({job.kind}) failed")
+            job.failure, job.status = str(e), FAILED
+            if isinstance(e, BrokenProcessPool): # A worker died (killed, out of memory): later jobs get a new pool
+                self._replace_pool(pool)
+        finally:
+            job.finished = time.time()
+            if directory:
+                shutil.rmtree(directory, ignore_errors=True)
+            self._save(job)
+        logger.info(f"Import job {job.job_id}: {job.status}, {job.rows_done} rows in {job.seconds:.1f}s")
+
+    def _replace_pool(self, broken):
+        with self._lock:
+            if self._pool is broken: # Not yet replaced by another job that hit it
+                broken.shutdown(wait=False)
+                self._pool = process_pool(self._processes)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+
+
+_queue_lock = threading.Lock()
+
+def job_queue(app) -> ImportJobQueue:
+    """
+    The app's ImportJobQueue, created on first use (CSV_IMPORT_PROCESSES sizes the process pool its
+    jobs share). Job statuses go to the app's report store.
+    """
+    statuses = report_store(app).import_jobs
+    with _queue_lock:
+        queue = getattr(app, "import_jobs", None)
+        if queue is None:
+            queue = app.import_jobs = ImportJobQueue(processes=app.config.get("CSV_IMPORT_PROCESSES"),
+                                                     statuses=statuses)
+        return queue
@@ -1,26 +1,13 @@
 # This file will contain data models.
-# For Phase 1, we are using simple Python classes and in-memory storage.
-# In later phases, these could be SQLAlchemy models or similar for database persistence.
+# Simple Python classes; report_store.py persists them in SQLite.
 
 from dataclasses import dataclass, field
 from datetime import date
 from typing import Optional, List
 
-# In-memory storage for Phase 1
-# These will be lists of dataclass instances.
-# This is a simple approach; for a real application, especially with multiple users
-# or persistent data needs, a database would be essential.
-# We'll manage these lists within the app context or a dedicated service module later.
-# For now, defining the structures.
-
-# Global lists to store data for Phase 1 - this is a simplification.
-# A better approach would be to manage this within the Flask app context
-# or a dedicated data service to avoid global state issues,
-# especially with web server Gunicorn workers.
-# However, for the simplicity of Phase 1, we'll start here and refine if needed.
-# These will be populated by the CSV upload functions.
-# It's better to initialize these in app.py or a service layer.
-# For now, just defining the models.
+# Storage: the records are kept in SQLite by report_store.py (ReportStore), one table per
+# dataclass below, shared by the app's workers. The dataclasses stay plain: rows are
+# converted to and from them there.
 
 @dataclass
 class AffiliatePerformanceData:
@@ -80,9 +67,3 @@ class AdCampaignPerformanceData:
     #     if self.cost and self.cost > 0 and self.revenue is not None:
     #         return round(self.revenue / self.cost, 2)
     #     return None
-
-# For Phase 1, we'll manage lists of these objects globally or within app context.
-# Example:
-# affiliate_data_store: List[AffiliatePerformanceData] = []
-# ad_campaign_data_store: List[AdCampaignPerformanceData] = []
-# These actual store initializations will be handled in the main app or service layer.
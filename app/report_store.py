@@ -0,0 +1,360 @@
+"""
+SQLite storage for uploaded affiliate and ad campaign records.
+
+The records used to live in two lists on the app (affiliate_data_store, ad_campaign_data_store):
+lost on restart, a different copy in every gunicorn worker, and the dashboards summed, sorted
+and rendered all of them on every page view. ReportStore keeps them in one SQLite file in WAL
+mode, shared by the workers and the import jobs:
+
+    import job -> ReportTable.extend(records): executemany in one transaction per chunk
+    dashboard  -> ReportTable.totals / top / records: SUMs and LIMITed pages, filtered by date
+                  range, affiliate or campaign name and platform through their indexes
+
+ReportTable.extend takes a list of records like the list it replaces, so it is the sink for
+ingest_csv and import_csv_files. Dates are stored as ISO text ('YYYY-MM-DD'), which sorts and
+compares like the dates; records come back as the models' dataclasses.
+
+The import jobs' status documents are kept in the same file (ImportJobTable), so any worker
+answers /imports/<job_id> and they survive a restart.
+
+Failures of the database (locked past the timeout, disk I/O, ...) raise ReportStoreError.
+
+Usage:
+    store = report_store(current_app) # REPORT_DB_PATH, or reports.sqlite3
+    store.affiliate.extend(records)
+    store.ad_campaign.totals(start=date(2024, 1, 1), platform="Google Ads")
+    store.ad_campaign.records(name="Campaign 0042", limit=100)
+    python app/report_store.py          # insert/query timings on a temp database
+"""
+if not __package__:
+    # Run as a script: mount this directory as "reports_app" (see csv_parallel.py).
+    import importlib.machinery
+    import importlib.util
+    import os
+    import sys
+    _spec = importlib.machinery.ModuleSpec("reports_app", None, is_package=True)
+    _spec.submodule_search_locations = [os.path.dirname(os.path.abspath(__file__))]
+    sys.modules.setdefault("reports_app", importlib.util.module_from_spec(_spec))
+    __package__ = "reports_app"
+
+import contextlib
+import functools
+import json
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import date
+from operator import attrgetter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .models import AffiliatePerformanceData, AdCampaignPerformanceData
+
+REPORT_DB_PATH = os.environ.get('REPORT_DB_PATH', 'reports.sqlite3')
+REPORT_DB_CACHE_MB = 64 # Page cache per connection: the three indexes of a big import stay in memory
+REPORT_DB_POOL_SIZE = 4 # Idle connections kept open; more are opened while all are busy, and closed after
+DASHBOARD_ROWS = 500 # Records listed on a dashboard page; totals and top lists cover every match
+
+
+class ReportStoreError(Exception):
+    """The database failed (locked past the timeout, disk I/O error, ...)."""
+
+
+@dataclass(frozen=True)
+class ReportTableSpec:
+    table: str
+    record_class: type
+    name_column: str # affiliate_name / campaign_name
+    columns: Tuple[str, ...] # The record's fields, in order; report_date first
+    sums: Tuple[str, ...] # Columns totalled on the dashboard
+    has_platform: bool = False
+
+    def schema(self) -> List[str]:
+        types = {"report_date": "TEXT NOT NULL", self.name_column: "TEXT NOT NULL", "platform": "TEXT",
+                 "cost": "REAL", "commission_amount": "REAL"}
+        columns = ", ".join(f"{column} {types.get(column, 'INTEGER')}" for column in self.columns)
+        statements = [f"CREATE TABLE IF NOT EXISTS {self.table} (id INTEGER PRIMARY KEY, {columns})",
+                      f"CREATE INDEX IF NOT EXISTS {self.table}_date ON {self.table} (report_date)",
+                      # Name and platform lookups are usually over a date range too
+                      f"CREATE INDEX IF NOT EXISTS {self.table}_name ON {self.table} ({self.name_column}, report_date)"]
+        if self.has_platform:
+            statements.append(f"CREATE INDEX IF NOT EXISTS {self.table}_platform ON {self.table} (platform, report_date)")
+        return statements
+
+
+AFFILIATE_TABLE = ReportTableSpec(
+    "affiliate_performance", AffiliatePerformanceData, "affiliate_name",
+    ("report_date", "affiliate_name", "impressions", "clicks", "conversions", "commission_amount"),
+    ("impressions", "clicks", "conversions", "commission_amount"))
+AD_CAMPAIGN_TABLE = ReportTableSpec(
+    "ad_campaign_performance", AdCampaignPerformanceData, "campaign_name",
+    ("report_date", "campaign_name", "platform", "impressions", "clicks", "cost", "conversions"),
+    ("impressions", "clicks", "cost", "conversions"), has_platform=True)
+
+
+IMPORT_JOBS_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS import_jobs (job_id TEXT PRIMARY KEY, submitted REAL NOT NULL,"
+    " finished INTEGER NOT NULL, document TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS import_jobs_finished ON import_jobs (finished, submitted)"]
+
+
+def _sqlite_errors(method):
+    """Re-raises sqlite3 errors (and ints too wide to bind) as ReportStoreError."""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except (sqlite3.Error, OverflowError) as e:
+            raise ReportStoreError(f"SQLite {method.__name__} failed: {e}") from e
+    return wrapper
+
+
+class ReportTable:
+    """One report type's records. Filters: start/end (dates, inclusive), name, platform."""
+
+    def __init__(self, store: "ReportStore", spec: ReportTableSpec):
+        self._store = store
+        self.spec = spec
+        self._values = attrgetter(*spec.columns[1:])
+        placeholders = ", ".join("?" * len(spec.columns))
+        self._insert = f"INSERT INTO {spec.table} ({', '.join(spec.columns)}) VALUES ({placeholders})"
+
+    def _where(self, start: Optional[date] = None, end: Optional[date] = None, name: Optional[str] = None,
+               platform: Optional[str] = None) -> Tuple[str, list]:
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("report_date >= ?"); params.append(start.isoformat())
+        if end is not None:
+            clauses.append("report_date <= ?"); params.append(end.isoformat())
+        if name:
+            clauses.append(f"{self.spec.name_column} = ?"); params.append(name)
+        if platform and self.spec.has_platform:
+            clauses.append("platform = ?"); params.append(platform)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    @_sqlite_errors
+    def extend(self, records: list):
+        """
+        Appends the records in one transaction (the import sink). The CSV parsers skip rows with
+        integers beyond SQLite's 64 bits; a record holding one fails the chunk (ReportStoreError).
+        """
+        if not records:
+            return
+        values = self._values
+        self._store._write(self._insert, [(record.report_date.isoformat(), *values(record)) for record in records])
+
+    @_sqlite_errors
+    def count(self, **filters) -> int:
+        where, params = self._where(**filters)
+        with self._store._connection() as connection:
+            return connection.execute(f"SELECT COUNT(*) FROM {self.spec.table}{where}", params).fetchone()[0]
+
+    @_sqlite_errors
+    def totals(self, **filters) -> Dict[str, Optional[float]]:
+        """SUM of each of spec.sums over the matching records (None where every value is missing)."""
+        where, params = self._where(**filters)
+        sums = ", ".join(f"SUM({column})" for column in self.spec.sums)
+        with self._store._connection() as connection:
+            row = connection.execute(f"SELECT {sums} FROM {self.spec.table}{where}", params).fetchone()
+        return dict(zip(self.spec.sums, row))
+
+    @_sqlite_errors
+    def records(self, order_by: str = "report_date DESC, id DESC", limit: Optional[int] = None, offset: int = 0,
+                **filters) -> list:
+        """The matching records as dataclasses, newest first by default. `order_by` is SQL: pass constants only."""
+        where, params = self._where(**filters)
+        with self._store._connection() as connection:
+            rows = connection.execute(
+                f"SELECT {', '.join(self.spec.columns)} FROM {self.spec.table}{where} ORDER BY {order_by} LIMIT ? OFFSET ?",
+                params + [-1 if limit is None else limit, offset]).fetchall()
+        record_class, from_iso = self.spec.record_class, date.fromisoformat
+        return [record_class(from_iso(row[0]), *row[1:]) for row in rows]
+
+    def top(self, column: str, limit: int = 5, **filters) -> list:
+        """The `limit` records with the highest `column` (a field name; records without one come last)."""
+        if column not in self.spec.columns:
+            raise ValueError(f"Unknown column '{column}' for {self.spec.table}")
+        return self.records(order_by=f"{column} IS NULL, {column} DESC", limit=limit, **filters)
+
+    def names(self) -> List[str]:
+        """Distinct affiliate/campaign names, for filter dropdowns (reads the name index only)."""
+        return self._distinct(self.spec.name_column)
+
+    def platforms(self) -> List[str]:
+        return self._distinct("platform") if self.spec.has_platform else []
+
+    @_sqlite_errors
+    def _distinct(self, column: str) -> List[str]:
+        with self._store._connection() as connection:
+            rows = connection.execute(
+                f"SELECT DISTINCT {column} FROM {self.spec.table} WHERE {column} IS NOT NULL ORDER BY {column}").fetchall()
+        return [row[0] for row in rows]
+
+    @_sqlite_errors
+    def delete(self, **filters) -> int:
+        """Deletes the matching records (all of them without filters); returns how many."""
+        where, params = self._where(**filters)
+        return self._store._write(f"DELETE FROM {self.spec.table}{where}", params, many=False)
+
+
+class ImportJobTable:
+    """Import job status documents (import_jobs.ImportJob.to_dict) by job id, written by the job as it runs."""
+
+    def __init__(self, store: "ReportStore"):
+        self._store = store
+
+    @_sqlite_errors
+    def save(self, job_id: str, submitted: float, finished: bool, document: dict):
+        self._store._write("INSERT OR REPLACE INTO import_jobs (job_id, submitted, finished, document) VALUES (?, ?, ?, ?)",
+                           (job_id, submitted, int(finished), json.dumps(document)), many=False)
+
+    @_sqlite_errors
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._store._connection() as connection:
+            row = connection.execute("SELECT document FROM import_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    @_sqlite_errors
+    def prune(self, keep: int) -> int:
+        """Deletes all but the `keep` newest finished jobs; returns how many."""
+        return self._store._write(
+            "DELETE FROM import_jobs WHERE finished = 1 AND job_id NOT IN"
+            " (SELECT job_id FROM import_jobs WHERE finished = 1 ORDER BY submitted DESC LIMIT ?)", (keep,), many=False)
+
+
+class ReportStore:
+    """
+    The report tables in one WAL-mode SQLite file. Each query or write takes a connection from a
+    pool of up to `pool_size` idle ones and gives it back, so request and import-job threads come
+    and go without leaving connections open. Writes run in BEGIN IMMEDIATE transactions, so
+    workers and import jobs sharing the file don't interleave.
+    """
+
+    def __init__(self, path: str = REPORT_DB_PATH, synchronous: str = "NORMAL", pool_size: int = REPORT_DB_POOL_SIZE):
+        self.path = path
+        self.synchronous = synchronous # NORMAL: durable at WAL checkpoints; FULL: fsync every commit
+        self.pool_size = pool_size
+        self._idle: List[sqlite3.Connection] = []
+        self._generation = 0 # Bumped by close(): connections opened before it are closed when given back
+        self._lock = threading.Lock()
+        self.affiliate = ReportTable(self, AFFILIATE_TABLE)
+        self.ad_campaign = ReportTable(self, AD_CAMPAIGN_TABLE)
+        self.import_jobs = ImportJobTable(self)
+
+    def table(self, kind: str) -> ReportTable:
+        """'affiliate' or 'ad_campaign' (the import kinds of csv_parallel.REPORT_KINDS)."""
+        return {"affiliate": self.affiliate, "ad_campaign": self.ad_campaign}[kind]
+
+    def _open(self) -> sqlite3.Connection:
+        # Passed between threads by the pool, used by one at a time
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(f"PRAGMA synchronous={self.synchronous}")
+            connection.execute(f"PRAGMA cache_size=-{REPORT_DB_CACHE_MB * 1024}") # Negative: KiB
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                for statement in [*AFFILIATE_TABLE.schema(), *AD_CAMPAIGN_TABLE.schema(), *IMPORT_JOBS_SCHEMA]:
+                    connection.execute(statement)
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+    @contextlib.contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """A connection for one statement or transaction: an idle one, or a new one when none is."""
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+            generation = self._generation
+        if connection is None:
+            connection = self._open()
+        try:
+            yield connection
+        finally:
+            with self._lock:
+                keep = generation == self._generation and len(self._idle) < self.pool_size
+                if keep:
+                    self._idle.append(connection)
+            if not keep:
+                connection.close()
+
+    def _write(self, sql: str, params: list, many: bool = True) -> int:
+        with self._connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = connection.executemany(sql, params) if many else connection.execute(sql, params)
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+            return cursor.rowcount
+
+    @_sqlite_errors
+    def warm(self):
+        """Opens a connection (and creates the tables) now instead of on first use."""
+        with self._connection():
+            pass
+
+    def close(self):
+        """Closes the idle connections; ones in use are closed when given back. The store reopens on next use."""
+        with self._lock:
+            connections, self._idle = self._idle, []
+            self._generation += 1
+        for connection in connections:
+            connection.close()
+
+
+_store_lock = threading.Lock()
+
+def report_store(app) -> ReportStore:
+    """The app's ReportStore, created on first use at REPORT_DB_PATH (config, then environment)."""
+    with _store_lock:
+        store = getattr(app, "report_store", None)
+        if store is None:
+            store = app.report_store = ReportStore(app.config.get("REPORT_DB_PATH", REPORT_DB_PATH))
+        return store
+
+
+if __name__ == '__main__':
+    import random
+    import tempfile
+    import time
+
+    # Bulk insert and dashboard query costs on a fresh database.
+    rng = random.Random(7)
+    campaigns = [f"Campaign {i:04d}" for i in range(2000)]
+    platforms = ("Google Ads", "Facebook Ads", "Microsoft Ads", None)
+    records = [AdCampaignPerformanceData(date(2024, rng.randrange(1, 13), rng.randrange(1, 29)), rng.choice(campaigns),
+                                         rng.choice(platforms), rng.randrange(100, 100_000), rng.randrange(0, 500),
+                                         round(rng.random() * 200, 2), rng.randrange(0, 20)) for _ in range(200_000)]
+    with tempfile.TemporaryDirectory() as directory:
+        store = ReportStore(os.path.join(directory, "reports.sqlite3"))
+        started = time.perf_counter()
+        for start in range(0, len(records), 5000): # The import's chunk size (csv_import.CSV_CHUNK_ROWS)
+            store.ad_campaign.extend(records[start:start + 5000])
+        elapsed = time.perf_counter() - started
+        print(f"insert  {len(records) / elapsed:>9.0f} records/s")
+        assert store.ad_campaign.count() == len(records)
+        first = sorted(records, key=lambda r: r.report_date)[0]
+        assert first in store.ad_campaign.records(end=first.report_date)
+        expected = sum(r.cost for r in records if r.campaign_name == "Campaign 0042" and r.report_date.month == 3)
+        queries = {
+            "totals, all": lambda: store.ad_campaign.totals(),
+            "page, all": lambda: store.ad_campaign.records(limit=DASHBOARD_ROWS),
+            "top 5, all": lambda: store.ad_campaign.top("conversions"),
+            "totals, one campaign and month": lambda: store.ad_campaign.totals(
+                name="Campaign 0042", start=date(2024, 3, 1), end=date(2024, 3, 31)),
+            "page, one platform": lambda: store.ad_campaign.records(platform="Google Ads", limit=DASHBOARD_ROWS),
+        }
+        assert abs(queries["totals, one campaign and month"]()["cost"] - expected) < 1e-6
+        for name, query in queries.items():
+            started = time.perf_counter()
+            for _ in range(20):
+                query()
+            print(f"{name:32} {(time.perf_counter() - started) / 20 * 1e3:7.2f} ms")
+        store.close()
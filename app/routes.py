@@ -1,5 +1,4 @@
-import io
-from flask import Blueprint, render_template, session, current_app, flash, redirect, url_for, request
+from flask import Blueprint, render_template, session, current_app, flash, redirect, url_for, request, jsonify
 
 # Facebook SDK imports
 from facebook_business.api import FacebookAdsApi
@@ -7,11 +6,16 @@ from facebook_business.exceptions import FacebookRequestError
 
 # Google Ads SDK / OAuth imports
 from google_auth_oauthlib.flow import Flow as GoogleAuthFlow
+import os
+import shutil
+import tempfile
 import uuid
+from datetime import date
 
 # Local (app-specific) imports
+from .import_jobs import job_queue
+from .report_store import report_store, ReportStoreError, DASHBOARD_ROWS
 from .services import (
-    parse_affiliate_csv, parse_ad_campaign_csv,
     initialize_fb_api, get_fan_ad_placements_mock, get_fan_performance_data_mock,
     get_google_ads_client, list_accessible_google_ads_customers # Added Google Ads services
 )
@@ -24,10 +28,26 @@ def index():
     """Serves the home page."""
     return render_template('index.html')
 
+# The dashboards query the report store (report_store.py): totals and top 5 over every record that
+# matches the filters (?start=&end=&name=&platform=), and the newest DASHBOARD_ROWS of them.
+def _report_filters():
+    filters = {'name': request.args.get('name') or None, 'platform': request.args.get('platform') or None}
+    for key in ('start', 'end'):
+        try: filters[key] = date.fromisoformat(request.args[key]) if request.args.get(key) else None
+        except ValueError: flash(f'Invalid {key} date, expected YYYY-MM-DD.', 'warning'); filters[key] = None
+    return filters
+
+def _report_dashboard(table, top_by):
+    filters = _report_filters()
+    return {'filters': filters, 'totals': table.totals(**filters), 'top_records': table.top(top_by, 5, **filters),
+            'record_count': table.count(**filters), 'records': table.records(limit=DASHBOARD_ROWS, **filters),
+            'names': table.names(), 'platforms': table.platforms()}
+
 @main_bp.route('/affiliate-marketing')
 def affiliate_marketing():
-    """Serves the affiliate marketing placeholder page."""
-    return render_template('affiliate_marketing.html', affiliate_data=current_app.affiliate_data_store)
+    """Serves the affiliate marketing dashboard."""
+    dashboard = _report_dashboard(report_store(current_app._get_current_object()).affiliate, 'commission_amount')
+    return render_template('affiliate_marketing.html', affiliate_data=dashboard['records'], dashboard=dashboard)
 
 @main_bp.route('/ads-optimization', methods=['GET', 'POST'])
 def ads_optimization():
@@ -101,9 +121,11 @@ def ads_optimization():
             else:
                 flash('Please connect to Google Ads first.', 'warning')
 
+    dashboard = _report_dashboard(report_store(current_app._get_current_object()).ad_campaign, 'conversions')
     return render_template(
         'ads_optimization.html',
-        ad_campaign_data=current_app.ad_campaign_data_store,
+        ad_campaign_data=dashboard['records'],
+        dashboard=dashboard,
         fb_connected=fb_connected,
         fan_placements=fan_placements,
         fan_performance_data=fan_performance_data,
@@ -113,48 +135,64 @@ def ads_optimization():
         google_ads_customers=google_ads_customers
     )
 
-# ... (CSV Upload routes - upload_affiliate_csv_route, upload_ad_csv_route - remain unchanged)
-@main_bp.route('/affiliate-marketing/upload-csv', methods=['GET', 'POST'])
-def upload_affiliate_csv_route():
+# CSV uploads are imported by background jobs (see import_jobs.py): the request saves the files,
+# queues the job and returns; /imports/<job_id> reports progress, rows/s and capped error samples.
+IMPORT_KINDS = {'affiliate': ('Affiliate performance', 'main.affiliate_marketing'),
+                'ad_campaign': ('Ad campaign performance', 'main.ads_optimization')}
+
+def _start_import(kind, files):
+    _, next_page = IMPORT_KINDS[kind]
+    directory = tempfile.mkdtemp(prefix='csv-import-')
+    try:
+        filenames = {}
+        for i, file in enumerate(files): # The job reads them after this request is gone
+            path = os.path.join(directory, f'{i:03d}.csv'); file.save(path); filenames[path] = file.filename
+    except Exception: shutil.rmtree(directory, ignore_errors=True); raise
+    app = current_app._get_current_object()
+    job = job_queue(app).submit(kind, filenames, directory, report_store(app).table(kind).extend)
+    flash(f'Importing {", ".join(file.filename for file in files)} in the background. '
+          f'Progress: {url_for("main.import_status", job_id=job.job_id)}', 'success')
+    return redirect(url_for(next_page))
+
+def _upload_csv_route(kind, template):
     if request.method == 'POST':
         if 'file' not in request.files: flash('No file part', 'danger'); return redirect(request.url)
         file = request.files['file']
         if file.filename == '': flash('No selected file', 'danger'); return redirect(request.url)
         if file and file.filename.endswith('.csv'):
-            try:
-                csv_content = file.stream.read().decode('utf-8'); file_stream = io.StringIO(csv_content)
-                new_data, errors = parse_affiliate_csv(file_stream)
-                if errors:
-                    for error in errors: flash(f'Error processing CSV: {error}', 'danger')
-                if new_data:
-                    current_app.affiliate_data_store.extend(new_data)
-                    flash(f'Successfully uploaded and processed {len(new_data)} affiliate records.', 'success')
-                elif not errors: flash('CSV processed, but no new valid data found.', 'warning')
-                return redirect(url_for('main.affiliate_marketing'))
-            except Exception as e: current_app.logger.error(f"Err affiliate CSV: {e}"); flash(f'Err: {e}', 'danger'); return redirect(request.url)
+            try: return _start_import(kind, [file])
+            except Exception as e: current_app.logger.error(f"Err {kind} CSV: {e}"); flash(f'Err: {e}', 'danger'); return redirect(request.url)
         else: flash('Invalid file type. CSV only.', 'danger'); return redirect(request.url)
-    return render_template('upload_affiliate_data.html')
+    return render_template(template)
+
+@main_bp.route('/affiliate-marketing/upload-csv', methods=['GET', 'POST'])
+def upload_affiliate_csv_route():
+    return _upload_csv_route('affiliate', 'upload_affiliate_data.html')
 
 @main_bp.route('/ads-optimization/upload-csv', methods=['GET', 'POST'])
 def upload_ad_csv_route():
+    return _upload_csv_route('ad_campaign', 'upload_ad_data.html')
+
+# Bulk import: many files (or one huge one) parsed on a process pool, see csv_parallel.py
+@main_bp.route('/imports/bulk', methods=['GET', 'POST'])
+def bulk_import_route():
     if request.method == 'POST':
-        if 'file' not in request.files: flash('No file part', 'danger'); return redirect(request.url)
-        file = request.files['file']
-        if file.filename == '': flash('No selected file', 'danger'); return redirect(request.url)
-        if file and file.filename.endswith('.csv'):
-            try:
-                csv_content = file.stream.read().decode('utf-8'); file_stream = io.StringIO(csv_content)
-                new_data, errors = parse_ad_campaign_csv(file_stream)
-                if errors:
-                    for error in errors: flash(f'Error processing CSV: {error}', 'danger')
-                if new_data:
-                    current_app.ad_campaign_data_store.extend(new_data)
-                    flash(f'Successfully processed {len(new_data)} ad campaign records.', 'success')
-                elif not errors: flash('CSV processed, but no new valid data found.', 'warning')
-                return redirect(url_for('main.ads_optimization'))
-            except Exception as e: current_app.logger.error(f"Err ad CSV: {e}"); flash(f'Err: {e}', 'danger'); return redirect(request.url)
-        else: flash('Invalid file type. CSV only.', 'danger'); return redirect(request.url)
-    return render_template('upload_ad_data.html')
+        kind = request.form.get('kind')
+        if kind not in IMPORT_KINDS: flash('Choose a report type.', 'danger'); return redirect(request.url)
+        files = [file for file in request.files.getlist('files') if file.filename]
+        if not files: flash('No selected file', 'danger'); return redirect(request.url)
+        if not all(file.filename.endswith('.csv') for file in files): flash('Invalid file type. CSV only.', 'danger'); return redirect(request.url)
+        try: return _start_import(kind, files)
+        except Exception as e: current_app.logger.error(f"Err bulk {kind} import: {e}"); flash(f'Err: {e}', 'danger'); return redirect(request.url)
+    return render_template('bulk_import.html', kinds=IMPORT_KINDS)
+
+@main_bp.route('/imports/<job_id>')
+def import_status(job_id):
+    """JSON status of an import job: status, rows_done, rows_per_second, progress, error_samples, ..."""
+    try: status = job_queue(current_app._get_current_object()).status(job_id)
+    except ReportStoreError as e: current_app.logger.error(f"Import job status {job_id}: {e}"); return jsonify({'error': 'Import job status unavailable'}), 503
+    if status is None: return jsonify({'error': 'Unknown import job (finished jobs are kept for a while)'}), 404
+    return jsonify(status)
 
 # ... (Facebook OAuth routes - connect_facebook_fan, fb_oauth_callback - remain unchanged)
 @main_bp.route('/connect-facebook-fan')
@@ -1,13 +1,7 @@
-import io
-import csv
-from datetime import datetime
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Optional
 from flask import current_app, session # Added session for Facebook token access
 import random # For mock data for Facebook
 
-# App-specific models
-from .models import AffiliatePerformanceData, AdCampaignPerformanceData
-
 # Facebook Business SDK imports
 from facebook_business.api import FacebookAdsApi
 # from facebook_business.adobjects.user import User # Not directly used in current mock
@@ -19,96 +13,8 @@ from google.ads.googleads.client import GoogleAdsClient
 from google.ads.googleads.errors import GoogleAdsException
 
 # --- CSV Parsing Functions ---
-
-def parse_affiliate_csv(file_stream: io.StringIO) -> Tuple[List[AffiliatePerformanceData], List[str]]:
-    # ... (content as before) ...
-    data_records: List[AffiliatePerformanceData] = []
-    errors: List[str] = []
-    reader = csv.DictReader(file_stream)
-    required_headers = ['report_date', 'affiliate_name']
-    optional_headers = ['impressions', 'clicks', 'conversions', 'commission_amount']
-    all_expected_headers = required_headers + optional_headers
-    if not reader.fieldnames:
-        errors.append("CSV file is empty or has no headers.")
-        return data_records, errors
-    missing_required_headers = [h for h in required_headers if h not in reader.fieldnames]
-    if missing_required_headers:
-        errors.append(f"Missing required CSV headers: {', '.join(missing_required_headers)}")
-        return data_records, errors
-    unexpected_headers = [h for h in reader.fieldnames if h not in all_expected_headers]
-    if unexpected_headers:
-        current_app.logger.warning(f"CSV contains unexpected headers (will be ignored): {', '.join(unexpected_headers)}")
-    for row_num, row in enumerate(reader, start=2):
-        try:
-            report_date_str = row.get('report_date')
-            if not report_date_str:
-                errors.append(f"Row {row_num}: Missing 'report_date'. Skipping row.")
-                continue
-            report_date = datetime.strptime(report_date_str, '%Y-%m-%d').date()
-            affiliate_name = row.get('affiliate_name')
-            if not affiliate_name:
-                errors.append(f"Row {row_num}: Missing 'affiliate_name'. Skipping row.")
-                continue
-            def safe_to_int(value_str: str, field_name: str) -> Optional[int]:
-                if value_str is None or value_str.strip() == '': return None
-                try: return int(value_str)
-                except ValueError: errors.append(f"Row {row_num}: Invalid integer value '{value_str}' for '{field_name}'."); return None
-            def safe_to_float(value_str: str, field_name: str) -> Optional[float]:
-                if value_str is None or value_str.strip() == '': return None
-                try: return float(value_str)
-                except ValueError: errors.append(f"Row {row_num}: Invalid float value '{value_str}' for '{field_name}'."); return None
-            data = AffiliatePerformanceData(
-                report_date=report_date, affiliate_name=affiliate_name.strip(),
-                impressions=safe_to_int(row.get('impressions'), 'impressions'),
-                clicks=safe_to_int(row.get('clicks'), 'clicks'),
-                conversions=safe_to_int(row.get('conversions'), 'conversions'),
-                commission_amount=safe_to_float(row.get('commission_amount'), 'commission_amount')
-            )
-            data_records.append(data)
-        except ValueError as e: errors.append(f"Row {row_num}: Error parsing data. Invalid date format for '{report_date_str}'? Expected YYYY-MM-DD. Details: {e}. Skipping row.")
-        except Exception as e: errors.append(f"Row {row_num}: An unexpected error occurred processing this row: {e}. Skipping row.")
-    return data_records, errors
-
-def parse_ad_campaign_csv(file_stream: io.StringIO) -> Tuple[List[AdCampaignPerformanceData], List[str]]:
-    # ... (content as before) ...
-    data_records: List[AdCampaignPerformanceData] = []
-    errors: List[str] = []
-    reader = csv.DictReader(file_stream)
-    required_headers = ['report_date', 'campaign_name']
-    optional_headers = ['platform', 'impressions', 'clicks', 'cost', 'conversions']
-    all_expected_headers = required_headers + optional_headers
-    if not reader.fieldnames: errors.append("CSV file is empty or has no headers."); return data_records, errors
-    missing_required_headers = [h for h in required_headers if h not in reader.fieldnames]
-    if missing_required_headers: errors.append(f"Missing required CSV headers: {', '.join(missing_required_headers)}"); return data_records, errors
-    unexpected_headers = [h for h in reader.fieldnames if h not in all_expected_headers]
-    if unexpected_headers: current_app.logger.warning(f"CSV contains unexpected headers (will be ignored): {', '.join(unexpected_headers)}")
-    for row_num, row in enumerate(reader, start=2):
-        try:
-            report_date_str = row.get('report_date')
-            if not report_date_str: errors.append(f"Row {row_num}: Missing 'report_date'. Skipping row."); continue
-            report_date = datetime.strptime(report_date_str, '%Y-%m-%d').date()
-            campaign_name = row.get('campaign_name')
-            if not campaign_name: errors.append(f"Row {row_num}: Missing 'campaign_name'. Skipping row."); continue
-            platform = row.get('platform', None); platform = platform.strip() if platform is not None else None
-            def safe_to_int(value_str: str, field_name: str) -> Optional[int]:
-                if value_str is None or value_str.strip() == '': return None
-                try: return int(value_str)
-                except ValueError: errors.append(f"Row {row_num}: Invalid integer value '{value_str}' for '{field_name}'."); return None
-            def safe_to_float(value_str: str, field_name: str) -> Optional[float]:
-                if value_str is None or value_str.strip() == '': return None
-                try: return float(value_str)
-                except ValueError: errors.append(f"Row {row_num}: Invalid float value '{value_str}' for '{field_name}'."); return None
-            data = AdCampaignPerformanceData(
-                report_date=report_date, campaign_name=campaign_name.strip(), platform=platform,
-                impressions=safe_to_int(row.get('impressions'), 'impressions'),
-                clicks=safe_to_int(row.get('clicks'), 'clicks'),
-                cost=safe_to_float(row.get('cost'), 'cost'),
-                conversions=safe_to_int(row.get('conversions'), 'conversions')
-            )
-            data_records.append(data)
-        except ValueError as e: errors.append(f"Row {row_num}: Error parsing data. Invalid date format for '{report_date_str}'? Expected YYYY-MM-DD. Details: {e}. Skipping row.")
-        except Exception as e: errors.append(f"Row {row_num}: An unexpected error occurred: {e}. Skipping row.")
-    return data_records, errors
+# Moved to csv_import.py (streaming ingestion; importable without the ads SDKs). Re-exported here.
+from .csv_import import parse_affiliate_csv, parse_ad_campaign_csv
 
 # --- Facebook Audience Network (FAN) Service Functions ---
 _fb_api_initialized_this_request = False # Simple flag for current request context
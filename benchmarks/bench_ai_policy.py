@@ -0,0 +1,129 @@
+"""
+AI policy table benchmark: decide_ai_action from precomputed alias tables vs picking from the
+candidate list built on every call (rng.choice(ai_candidate_actions(...)), the old path).
+
+    exact      every discretized state of every registered profile, plus random states between
+               the thresholds: the table's probabilities equal the candidate list's counts
+    sampled    chi-square of alias-table draws against the candidate list's frequencies, for
+               every cell reached by random states (old and new path must be indistinguishable)
+    speed      us per decision, old vs new, over opponent states sampled from real matches
+
+Usage (from the repo root):
+    python benchmarks/bench_ai_policy.py --states 2000 --draws 20000
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from collections import Counter
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import boxing_game_logic as bgl
+from boxing_simulator import SimulatedClock
+
+# Chi-square critical values at p = 0.001 by degrees of freedom (at most 5 distinct actions)
+_CHI2_CRITICAL = {1: 10.83, 2: 13.82, 3: 16.27, 4: 18.47, 5: 20.52}
+
+
+def expected_distribution(profile: bgl.AIProfile, state) -> dict:
+    candidates = profile.candidates(*state)
+    if not candidates:
+        return {bgl.ActionType.IDLE: 1.0}
+    return {action: count / len(candidates) for action, count in Counter(candidates).items()}
+
+
+def table_distribution(table: bgl.AIPolicyTable, state) -> dict:
+    cell = table.cell(*state)
+    return {bgl.ActionType.IDLE: 1.0} if cell is None else cell.probabilities()
+
+
+def check_exact(rng: random.Random, samples: int) -> int:
+    """Table vs candidate list, at the bucket edges and at random points; returns states checked."""
+    checked = 0
+    edges = sorted({v for d in bgl.ACTION_DETAILS.values() for v in (d.get("stamina_cost", 0),)} |
+                   {0, 1, bgl.MAX_HP * 0.3, bgl.MAX_HP * 0.5})
+    values = [v + delta for v in edges for delta in (-0.5, 0, 0.5)] + [bgl.MAX_HP]
+    for name, profile in bgl.AI_PROFILES.items():
+        table = bgl.ai_policy_table(name)
+        states = [(s, h, p, a) for s in values for h in values for p in values for a in bgl.ActionType]
+        states += [(rng.uniform(-5, bgl.MAX_STAMINA), rng.uniform(-5, bgl.MAX_HP), rng.uniform(-5, bgl.MAX_HP),
+                    rng.choice(list(bgl.ActionType))) for _ in range(samples)]
+        for state in states:
+            expected, actual = expected_distribution(profile, state), table_distribution(table, state)
+            assert expected.keys() == actual.keys(), (name, state, expected, actual)
+            assert all(abs(expected[a] - actual[a]) < 1e-9 for a in expected), (name, state, expected, actual)
+        checked += len(states)
+    return checked
+
+
+def match_states(count: int, seed: int) -> list:
+    """(stamina, hp, player hp, player action) of the opponent at AI decision points of real matches."""
+    rng = random.Random(seed)
+    states = []
+    while len(states) < count:
+        game = bgl.initialize_new_game(clock=SimulatedClock(), rng=random.Random(rng.random()))
+        bgl.start_new_round(game)
+        while game.match_status != bgl.GameStatus.MATCH_OVER and len(states) < count:
+            if rng.random() < 0.3:
+                bgl.queue_player_action_for_tick(game, rng.choice(bgl.PUNCH_TYPES + (bgl.ActionType.BLOCK,)))
+            if rng.random() < 0.2:
+                states.append((game.opponent.stamina, game.opponent.hp, game.player.hp, game.player.current_action))
+            game.clock.advance(0.1)
+            bgl.game_tick(game)
+    return states
+
+
+def chi_square(counts: Counter, expected: dict, draws: int) -> float:
+    return sum((counts[action] - p * draws) ** 2 / (p * draws) for action, p in expected.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--states", type=int, default=1000, help="Match states sampled")
+    parser.add_argument("--draws", type=int, default=20000, help="Draws per distinct state for the chi-square test")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    print(f"exact: {check_exact(rng, args.states)} states, table probabilities == candidate list frequencies")
+
+    tested, rejected = 0, 0
+    for name, profile in bgl.AI_PROFILES.items():
+        table, distinct = bgl.ai_policy_table(name), {}
+        for _ in range(args.states * 10):
+            state = (rng.uniform(-1, bgl.MAX_STAMINA), rng.uniform(-1, bgl.MAX_HP), rng.uniform(-1, bgl.MAX_HP),
+                     rng.choice(list(bgl.ActionType)))
+            cell = table.cell(*state)
+            if cell is not None and len(cell.outcomes) > 1:
+                distinct.setdefault(id(cell), (cell, state))
+        for cell, state in distinct.values():
+            expected = expected_distribution(profile, state)
+            counts = Counter(cell.sample(rng) for _ in range(args.draws))
+            rejected += chi_square(counts, expected, args.draws) > _CHI2_CRITICAL[len(expected) - 1]
+        tested += len(distinct)
+    print(f"sampled: {tested} cells across {len(bgl.AI_PROFILES)} profiles, {args.draws} draws each, "
+          f"{rejected} rejected at p=0.001 (~{tested * 0.001:.2f} expected by chance)")
+
+    states = match_states(args.states, args.seed)
+
+    def old_path():
+        for stamina, hp, player_hp, player_action in states:
+            candidates = bgl.ai_candidate_actions(stamina, hp, player_hp, player_action)
+            rng.choice(candidates) if candidates else bgl.ActionType.IDLE
+
+    def new_path():
+        sample = bgl.ai_policy_table("classic").sample
+        for state in states:
+            sample(rng, *state)
+
+    old_us = min(timeit.repeat(old_path, number=5, repeat=5)) / (5 * len(states)) * 1e6
+    new_us = min(timeit.repeat(new_path, number=5, repeat=5)) / (5 * len(states)) * 1e6
+    print(f"speed: candidate list {old_us:.2f} us, policy table {new_us:.2f} us per decision "
+          f"({old_us / new_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Cold start benchmark for the API entry point (app.py), each sample in a fresh interpreter.
+
+    import     `python -X importtime -c "import app"` with the production config
+               (GAME_STORE=dynamodb, Lambda environment): total, plus the heaviest imports
+    first      in-process timings of a cold process: import app, then the first POST
+               /game/start and the first punch (POST /game/<id>/action), which pay whatever
+               initialization was deferred, then a warm punch for comparison
+    process    wall time from spawning the interpreter to the first punch's response
+
+The request timings need a reachable store: GAME_STORE=memory (default here) or sqlite, or
+dynamodb with AWS_ENDPOINT_URL_DYNAMODB pointing at DynamoDB Local. Both trees are byte-compiled
+first; a Lambda package without __pycache__ also pays compiling every module on each cold start.
+
+Pass --baseline-ref to run the same measurements on an older revision (extracted with git
+archive) and compare.
+
+Usage (from the repo root):
+    python benchmarks/bench_cold_start.py --runs 5 --baseline-ref 66d6caa --json cold_start.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAMBDA_ENV = {
+    "AWS_LAMBDA_FUNCTION_NAME": "bench-cold-start", # app.py picks its Lambda defaults
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "LAMBDA_LOG_EVENTS": "0",
+}
+
+# Runs in the child interpreter, in the tree under test.
+FIRST_RESPONSE_SCRIPT = r"""
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+response = client.post('/game/start')
+assert response.status_code == 200, response.get_data(as_text=True)
+game_id = response.get_json()['game_id']
+started_game = time.perf_counter()
+assert client.post(f'/game/{game_id}/action', json={'action': 'jab'}).status_code == 200
+first_punch = time.perf_counter()
+assert client.post(f'/game/{game_id}/action', json={'action': 'jab'}).status_code == 200
+warm_punch = time.perf_counter()
+print(json.dumps({"import_ms": (imported - started) * 1e3, "first_start_ms": (started_game - imported) * 1e3,
+                  "first_punch_ms": (first_punch - started_game) * 1e3, "warm_punch_ms": (warm_punch - first_punch) * 1e3}))
+"""
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def child_env(extra: dict) -> dict:
+    env = dict(os.environ, **LAMBDA_ENV, **extra)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def measure_imports(tree: str, top: int) -> dict:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=tree,
+                            env=child_env({"GAME_STORE": "dynamodb"}), capture_output=True, text=True, check=True)
+    total_us, direct = 0, []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        cumulative, indent, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        if name == "app":
+            total_us = cumulative
+            break
+        if indent == 1: # Another top-level import (interpreter startup): children listed so far aren't app's
+            direct = []
+        elif indent == 3: # Imported directly by app.py (children are printed before their parent)
+            direct.append((cumulative, name))
+    direct.sort(reverse=True)
+    return {"import_app_ms": total_us / 1e3, "heaviest": [(name, us / 1e3) for us, name in direct[:top]]}
+
+
+def measure_first_response(tree: str, store: str) -> dict:
+    extra = {"GAME_STORE": store, "USE_IN_MEMORY_TABLE": "1" if store == "memory" else "0"}
+    with tempfile.TemporaryDirectory() as directory:
+        extra["GAME_STORE_SQLITE_PATH"] = os.path.join(directory, "games.sqlite3")
+        spawned = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", FIRST_RESPONSE_SCRIPT], cwd=tree, env=child_env(extra),
+                                capture_output=True, text=True)
+        elapsed = time.perf_counter() - spawned
+    if result.returncode != 0:
+        raise RuntimeError(f"First-response run failed in {tree}:\n{result.stderr[-2000:]}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["process_to_first_punch_ms"] = elapsed * 1e3 # Includes interpreter startup and exit
+    return timings
+
+
+def measure_tree(tree: str, runs: int, store: str, top: int) -> dict:
+    subprocess.run([sys.executable, "-m", "compileall", "-q", "-l", "."], cwd=tree, check=False, capture_output=True)
+    imports = [measure_imports(tree, top) for _ in range(runs)]
+    first = [measure_first_response(tree, store) for _ in range(runs)]
+    summary = {"import_app_ms": statistics.median(sample["import_app_ms"] for sample in imports),
+               "heaviest_imports_ms": imports[len(imports) // 2]["heaviest"]}
+    for key in first[0]:
+        summary[key] = statistics.median(sample[key] for sample in first)
+    return summary
+
+
+def extract_ref(ref: str, directory: str) -> str:
+    archive = subprocess.run(["git", "archive", ref], cwd=REPO_ROOT, capture_output=True, check=True).stdout
+    subprocess.run(["tar", "-x", "-C", directory], input=archive, check=True)
+    return directory
+
+
+def print_summary(name: str, summary: dict):
+    print(f"\n{name}")
+    for key, value in summary.items():
+        if key == "heaviest_imports_ms":
+            print("  heaviest imports: " + ", ".join(f"{module} {ms:.0f}" for module, ms in value))
+        else:
+            print(f"  {key:28}{value:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per measurement (median reported)")
+    parser.add_argument("--store", default="memory", choices=["memory", "sqlite", "dynamodb"],
+                        help="GAME_STORE for the request timings")
+    parser.add_argument("--top", type=int, default=6, help="Heaviest direct imports of app.py to list")
+    parser.add_argument("--baseline-ref", help="Git revision to compare against")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    results = {"current": measure_tree(REPO_ROOT, args.runs, args.store, args.top)}
+    if args.baseline_ref:
+        with tempfile.TemporaryDirectory() as directory:
+            results[args.baseline_ref] = measure_tree(extract_ref(args.baseline_ref, directory), args.runs,
+                                                      args.store, args.top)
+    for name, summary in results.items():
+        print_summary(name, summary)
+    if args.baseline_ref:
+        current, baseline = results["current"], results[args.baseline_ref]
+        print(f"\nimport app: {baseline['import_app_ms']:.0f} -> {current['import_app_ms']:.0f} ms; "
+              f"process to first punch: {baseline['process_to_first_punch_ms']:.0f} -> "
+              f"{current['process_to_first_punch_ms']:.0f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"runs": args.runs, "store": args.store, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+CSV import benchmark: the streaming upload pipeline vs the old read-everything path.
+
+Generates an ad campaign report (default 5M rows, ~0.1% of them broken in the ways real exports
+are: bad or missing dates, missing names) and imports it in a fresh process per mode:
+
+    legacy   what the upload routes did: read() the whole upload, decode it, copy it into an
+             io.StringIO, parse_ad_campaign_csv it into one list, extend the store with it
+    stream   ingest_csv from the binary file into a sink that drops each chunk (what a database
+             sink costs in memory: one chunk at a time)
+    store    ingest_csv into an in-process list store, as the routes do today
+    columnar ingest_csv with the columnar parser (csv_columnar.iter_ad_campaign_csv_columnar),
+             same records and errors as stream, chunks dropped like stream
+    columns  csv_columnar.iter_ad_campaign_columns: typed NumPy columns, no record objects
+
+Reported per mode: rows/sec and the process's peak RSS above its baseline (interpreter and
+imports), i.e. what one import adds to a worker.
+
+Usage (from the repo root):
+    python benchmarks/bench_csv_import.py                      # 5M rows, all modes
+    python benchmarks/bench_csv_import.py --rows 200000 --modes stream legacy
+    python benchmarks/bench_csv_import.py --rows 1000000 --modes stream columnar columns
+"""
+import argparse
+import importlib
+import importlib.machinery
+import importlib.util
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+MODES = ("legacy", "stream", "store", "columnar", "columns")
+PLATFORMS = ("Google Ads", "Facebook Ads", "Microsoft Ads", "TikTok Ads", "")
+
+
+def import_reports_module(name: str):
+    """
+    app.<name>. The reports site's package is app/, but in this tree app.py (the game API)
+    takes the name `app` first, so the package is mounted under its own name when needed.
+    """
+    try:
+        return importlib.import_module(f"app.{name}")
+    except ModuleNotFoundError:
+        if "reports_app" not in sys.modules:
+            spec = importlib.machinery.ModuleSpec("reports_app", None, is_package=True)
+            spec.submodule_search_locations = [os.path.join(REPO_ROOT, "app")]
+            sys.modules["reports_app"] = importlib.util.module_from_spec(spec)
+        return importlib.import_module(f"reports_app.{name}")
+
+
+def generate_report(path: str, rows: int, seed: int = 7):
+    """An ad campaign CSV with `rows` data rows; every ~1000th row is broken (and skipped)."""
+    rng = random.Random(seed)
+    campaigns = [f"Campaign {i:04d}" for i in range(2000)]
+    with open(path, "w", newline="") as out:
+        out.write("report_date,campaign_name,platform,impressions,clicks,cost,conversions\n")
+        lines = []
+        for i in range(rows):
+            impressions = rng.randrange(100, 100_000)
+            clicks = impressions // rng.randrange(20, 200)
+            line = (f"2024-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d},{rng.choice(campaigns)},"
+                    f"{rng.choice(PLATFORMS)},{impressions},{clicks},{clicks * 0.37:.2f},{clicks // 25}")
+            if i % 997 == 0:
+                line = rng.choice(("2024-13-40,Campaign X,Google Ads,1,1,1.0,1", ",Campaign Y,,1,1,1.0,1",
+                                   "2024-01-01,,Google Ads,1,1,1.0,1", "01/02/2024,Campaign Z,,1,1,1.0,1"))
+            lines.append(line)
+            if len(lines) == 10_000:
+                out.write("\n".join(lines) + "\n")
+                lines = []
+        if lines:
+            out.write("\n".join(lines) + "\n")
+
+
+def peak_rss_bytes() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 # KB on Linux
+
+
+def run_mode(mode: str, path: str) -> dict:
+    """One import in this process (called in a fresh child per mode)."""
+    csv_import = import_reports_module("csv_import")
+    if mode in ("columnar", "columns"):
+        csv_columnar = import_reports_module("csv_columnar")
+    baseline = peak_rss_bytes()
+    store = []
+    started = time.perf_counter()
+    with open(path, "rb") as upload:
+        if mode == "legacy":
+            csv_content = upload.read().decode('utf-8'); file_stream = io.StringIO(csv_content)
+            new_data, errors = csv_import.parse_ad_campaign_csv(file_stream)
+            store.extend(new_data)
+            records, error_count = len(new_data), len(errors)
+        elif mode == "columns":
+            records = error_count = 0
+            for columns, errors in csv_columnar.iter_ad_campaign_columns(io.TextIOWrapper(upload, encoding='utf-8', newline='')):
+                records += len(columns)
+                error_count += len(errors)
+        else:
+            sink = store.extend if mode == "store" else (lambda records: None)
+            iter_records = csv_columnar.iter_ad_campaign_csv_columnar if mode == "columnar" else csv_import.iter_ad_campaign_csv
+            result = csv_import.ingest_csv(upload, iter_records, sink)
+            records, error_count = result.records, result.error_count
+    seconds = time.perf_counter() - started
+    rows = records + error_count # Every broken row is skipped with exactly one error
+    return {"mode": mode, "records": records, "errors": error_count, "seconds": round(seconds, 2),
+            "rows_per_second": round(rows / seconds), "peak_rss_mb": round((peak_rss_bytes() - baseline) / 2**20, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CSV import paths.")
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--file", help="CSV to reuse/create (default: a temp file, deleted afterwards)")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--run-mode", help=argparse.SUPPRESS) # Child process entry
+    args = parser.parse_args()
+
+    if args.run_mode:
+        print(json.dumps(run_mode(args.run_mode, args.file)))
+        return
+
+    path = args.file or os.path.join(tempfile.mkdtemp(), "ad_report.csv")
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        generate_report(path, args.rows)
+        print(f"Generated {args.rows} rows ({os.path.getsize(path) / 2**20:.0f} MB) in {time.perf_counter() - started:.1f}s")
+    file_mb = round(os.path.getsize(path) / 2**20, 1)
+    results = []
+    for mode in args.modes:
+        output = subprocess.run([sys.executable, __file__, "--run-mode", mode, "--file", path],
+                                capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.splitlines()[-1]))
+        print(f"{mode:8} {results[-1]['rows_per_second']:>9} rows/s  {results[-1]['seconds']:>7}s  "
+              f"+{results[-1]['peak_rss_mb']} MB peak RSS  ({results[-1]['records']} records, {results[-1]['errors']} errors)")
+    if not args.file:
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump({"rows": args.rows, "file_mb": file_mb, "results": results}, out, indent=2)
+
+
+if __name__ == '__main__':
+    main()
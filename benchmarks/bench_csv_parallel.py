@@ -0,0 +1,100 @@
+"""
+Bulk import benchmark: csv_parallel.import_csv_files on 1..N processes vs ingest_csv one file at a time.
+
+Generates an ad campaign report (default 2M rows, split into --files files like a month-end
+batch) and imports it:
+
+    sequential   ingest_csv on each file in turn, row parser (what the upload route does)
+    pool N       import_csv_files with N worker processes
+
+Also reported per pool run: how much CPU the merging process used against the workers. The merge
+is the serial part, so total CPU / merge CPU is the speedup the pool can reach with enough cores
+(Amdahl), whatever the cores of the machine the benchmark runs on.
+
+Usage (from the repo root):
+    python benchmarks/bench_csv_parallel.py                          # 2M rows, 1..cpu_count processes
+    python benchmarks/bench_csv_parallel.py --rows 500000 --files 24 --processes 1 2 4 8
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_csv_import import generate_report, import_reports_module # noqa: E402
+
+
+def cpu_seconds(who) -> float:
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+def split_report(path: str, files: int, directory: str) -> list:
+    """The report cut into `files` files of about equal rows, each with the header."""
+    with open(path) as report:
+        header = report.readline()
+        lines = report.readlines()
+    per_file = -(-len(lines) // files)
+    paths = []
+    for i in range(files):
+        part = os.path.join(directory, f"network_{i:02d}.csv")
+        with open(part, "w") as out:
+            out.write(header)
+            out.writelines(lines[i * per_file:(i + 1) * per_file])
+        paths.append(part)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the process-pool CSV import.")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--files", type=int, default=1, help="Split the report into this many files")
+    parser.add_argument("--processes", type=int, nargs="+", default=None, help="Pool sizes (default: 1..cpu_count)")
+    args = parser.parse_args()
+
+    csv_import = import_reports_module("csv_import")
+    csv_parallel = import_reports_module("csv_parallel")
+    directory = tempfile.mkdtemp()
+    try:
+        report = os.path.join(directory, "report.csv")
+        generate_report(report, args.rows)
+        paths = [report] if args.files == 1 else split_report(report, args.files, directory)
+        print(f"{args.rows} rows in {len(paths)} file(s), {sum(map(os.path.getsize, paths)) / 2**20:.0f} MB, "
+              f"{os.cpu_count()} cores")
+
+        started = time.perf_counter()
+        sequential = 0
+        for path in paths:
+            with open(path, "rb") as upload:
+                sequential += csv_import.ingest_csv(upload, csv_import.iter_ad_campaign_csv, lambda records: None).records
+        baseline = time.perf_counter() - started
+        print(f"sequential  {args.rows / baseline:>9.0f} rows/s  {baseline:6.2f}s")
+
+        for processes in args.processes or range(1, os.cpu_count() + 1):
+            parent_cpu, child_cpu = cpu_seconds(resource.RUSAGE_SELF), cpu_seconds(resource.RUSAGE_CHILDREN)
+            started = time.perf_counter()
+            # Forked workers (safe here, one thread) so their CPU shows up in RUSAGE_CHILDREN; the
+            # app's fork-server workers are the server's children, not this process's
+            with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("fork")) as pool:
+                results = csv_parallel.import_csv_files(paths, "ad_campaign", lambda records: None, processes, pool=pool)
+            elapsed = time.perf_counter() - started
+            parent_cpu = cpu_seconds(resource.RUSAGE_SELF) - parent_cpu
+            child_cpu = cpu_seconds(resource.RUSAGE_CHILDREN) - child_cpu # Collected when the pool shuts down
+            records = sum(result.records for result in results.values())
+            assert records == sequential, (records, sequential)
+            line = f"pool {processes:<6} {args.rows / elapsed:>9.0f} rows/s  {elapsed:6.2f}s  x{baseline / elapsed:.1f}"
+            if child_cpu:
+                line += (f"  merge {parent_cpu:.2f} CPU-s of {parent_cpu + child_cpu:.2f}"
+                         f" (pool can reach x{(parent_cpu + child_cpu) / parent_cpu:.0f} over 1 process)")
+            print(line)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,429 @@
+"""
+Load test for the game HTTP API: many concurrent simulated players against /game/start,
+/game/<id>/action and /game/<id>/state.
+
+    client     app.py in this process, driven through Flask's test client (one per player thread):
+               the app's own cost, no sockets or HTTP parsing
+    gunicorn   a real local gunicorn (--workers/--threads as in the Dockerfile) over keep-alive
+               HTTP connections
+
+Every player starts a match, then sends punches/blocks (and polls the state every --poll-every
+requests) until the match ends or its time is up, then starts another. The store is the local
+stand-in (GAME_STORE=memory by default; sqlite with --store). Reported per endpoint:
+requests/sec, p50/p95/p99/max latency, and the time per request spent in each phase:
+
+    deserialize   store reads, snapshot decode, GameState hydration, request body parsing
+    tick          engine work: bgl.game_tick, starting a match
+    serialize     serialize_game_state_for_api, snapshot encode, JSON responses
+    persist       store writes (put/update/batch_put)
+    other         the rest: routing, locks, WSGI (and HTTP for gunicorn)
+
+Phases are measured by wrapping those functions (innermost phase wins, so nested calls aren't
+counted twice). In gunicorn mode the workers run instrumented_app below, which returns each
+request's phases in an X-Bench-Phases header. Writes the write-behind flusher makes outside any
+request are reported separately as background time. Use --write-through to put them on the
+request path.
+
+Results go to --json; --compare prints the change against an earlier results file.
+
+Usage (from the repo root):
+    python benchmarks/bench_http_api.py --mode both --players 32 --duration 10 --json api.json
+    python benchmarks/bench_http_api.py --mode gunicorn --compare api.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+PHASES = ("deserialize", "tick", "serialize", "persist")
+PHASES_HEADER = "X-Bench-Phases"
+PHASES_PATH = "/bench/phases" # Served by instrumented_app: totals per phase, background included
+ENDPOINTS = ("start", "action", "state")
+PLAYER_ACTIONS = ("jab", "jab", "cross", "hook", "uppercut", "block")
+
+
+# --- Phase timing (runs inside the app process) ---
+
+class PhaseTimer:
+    """Exclusive time per phase, per thread; totals for every thread, requests and background."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.totals = defaultdict(float) # "<phase>" (in requests) / "background:<phase>" -> seconds
+        self.installed = False
+
+    def begin_request(self):
+        self._local.request = defaultdict(float)
+
+    def end_request(self) -> dict:
+        phases, self._local.request = getattr(self._local, "request", None) or {}, None
+        return dict(phases)
+
+    def wrap(self, phase: str, function):
+        local = self._local
+
+        @wraps(function)
+        def timed(*args, **kwargs):
+            stack = local.__dict__.setdefault("stack", [])
+            frame = [time.perf_counter(), 0.0] # started, time spent in nested phases
+            stack.append(frame)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stack.pop()
+                elapsed = time.perf_counter() - frame[0]
+                if stack:
+                    stack[-1][1] += elapsed
+                exclusive = elapsed - frame[1]
+                request = getattr(local, "request", None)
+                if request is not None:
+                    request[phase] += exclusive
+                key = phase if request is not None else "background:" + phase
+                with self._lock:
+                    self.totals[key] += exclusive
+        return timed
+
+    def install(self, app_module):
+        """Wraps the phase functions of app.py, its engine and its store (creating them if needed)."""
+        if self.installed:
+            return
+        import flask
+        import boxing_game_logic
+        import boxing_replay
+        cache = app_module.get_state_cache()
+        if cache is None:
+            raise RuntimeError("Game store unavailable; set GAME_STORE=memory or sqlite")
+        store, storage = cache.store, cache.storage
+        for obj, name in ((store, "get"), (storage, "from_storage"), (cache, "deserialize"),
+                          (flask.Request, "get_json")):
+            setattr(obj, name, self.wrap("deserialize", getattr(obj, name)))
+        for obj, name in ((boxing_game_logic, "game_tick"), (boxing_replay, "start_recorded_match"),
+                          (boxing_game_logic, "initialize_new_game"), (boxing_game_logic, "start_new_round")):
+            setattr(obj, name, self.wrap("tick", getattr(obj, name)))
+        for obj, name in ((app_module, "serialize_game_state_for_api"), (storage, "to_storage"),
+                          (app_module, "jsonify")):
+            setattr(obj, name, self.wrap("serialize", getattr(obj, name)))
+        if hasattr(storage, "serialize"): # SnapshotStorage keeps its own reference to the serializer
+            storage.serialize = app_module.serialize_game_state_for_api
+        for name in ("put", "update", "batch_put"):
+            setattr(store, name, self.wrap("persist", getattr(store, name)))
+        self.installed = True
+
+
+phase_timer = PhaseTimer()
+_install_lock = threading.Lock()
+
+
+def instrumented_app(environ, start_response):
+    """WSGI entry point for gunicorn runs: app.app with per-request phases in a response header."""
+    import app
+    if not phase_timer.installed:
+        with _install_lock:
+            phase_timer.install(app)
+    if environ.get("PATH_INFO") == PHASES_PATH:
+        with phase_timer._lock:
+            body = json.dumps(dict(phase_timer.totals)).encode()
+        start_response("200 OK", [("Content-Type", "application/json"), ("Content-Length", str(len(body)))])
+        return [body]
+    phase_timer.begin_request()
+
+    def start_with_phases(status, headers, exc_info=None):
+        phases = phase_timer.end_request() # The view has returned; only the body is left to send
+        headers.append((PHASES_HEADER, ",".join(f"{name}={seconds * 1e3:.4f}" for name, seconds in phases.items())))
+        return start_response(status, headers, exc_info)
+
+    return app.app.wsgi_app(environ, start_with_phases)
+
+
+def parse_phases_header(value: str) -> dict:
+    phases = {}
+    for part in filter(None, (value or "").split(",")):
+        name, _, ms = part.partition("=")
+        phases[name] = float(ms) / 1e3
+    return phases
+
+
+# --- Simulated players ---
+
+class TestClientTransport:
+    """Requests through app.app's test client, in this process."""
+
+    def __init__(self, app_module):
+        self.client = app_module.app.test_client()
+
+    def request(self, method: str, path: str, body: dict = None):
+        phase_timer.begin_request()
+        response = self.client.open(path, method=method, json=body)
+        phases = phase_timer.end_request()
+        return response.status_code, response.get_data(), phases
+
+
+class HTTPTransport:
+    """Requests over one keep-alive connection to the gunicorn instance."""
+
+    def __init__(self, port: int):
+        self.port = port
+        self.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+
+    def request(self, method: str, path: str, body: dict = None):
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        for attempt in (0, 1):
+            try:
+                self.connection.request(method, path, body=data, headers=headers)
+                response = self.connection.getresponse()
+                payload = response.read()
+                return response.status, payload, parse_phases_header(response.getheader(PHASES_HEADER))
+            except (http.client.HTTPException, OSError):
+                self.connection.close() # Server closed the kept-alive connection; reconnect once
+                self.connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+                if attempt:
+                    raise
+
+
+class Recorder:
+    """(latency, phases) per endpoint, plus error counts; shared by every player thread."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def add(self, endpoint: str, latency: float, status: int, phases: dict, expected=(200,)):
+        with self.lock:
+            if status in expected:
+                self.samples[endpoint].append((latency, phases))
+            else:
+                self.errors[f"{endpoint} {status}"] += 1
+
+
+def play(transport, recorder: Recorder, deadline: float, poll_every: int, seed: int):
+    rng = random.Random(seed)
+    game_id, sent = None, 0
+    while time.perf_counter() < deadline:
+        if game_id is None:
+            started = time.perf_counter()
+            status, body, phases = transport.request("POST", "/game/start")
+            recorder.add("start", time.perf_counter() - started, status, phases)
+            if status != 200:
+                continue
+            game_id = json.loads(body)["game_id"]
+        sent += 1
+        if poll_every and sent % poll_every == 0:
+            started = time.perf_counter()
+            status, body, phases = transport.request("GET", f"/game/{game_id}/state")
+            recorder.add("state", time.perf_counter() - started, status, phases)
+            continue
+        started = time.perf_counter()
+        status, body, phases = transport.request("POST", f"/game/{game_id}/action",
+                                                 {"action": rng.choice(PLAYER_ACTIONS)})
+        if status == 400 and b"Match is over" in body:
+            game_id = None # Not a failure: the player starts the next match
+            continue
+        recorder.add("action", time.perf_counter() - started, status, phases, expected=(200, 202))
+
+
+def run_players(make_transport, players: int, duration: float, poll_every: int, seed: int):
+    recorder = Recorder()
+    transports = [make_transport() for _ in range(players)]
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=play, args=(transport, recorder, deadline, poll_every, seed + i))
+               for i, transport in enumerate(transports)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, time.perf_counter() - started
+
+
+# --- Reporting ---
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def summarize(recorder: Recorder, elapsed: float, background: dict) -> dict:
+    endpoints = {}
+    for endpoint in ENDPOINTS:
+        samples = recorder.samples.get(endpoint, [])
+        if not samples:
+            continue
+        latencies = sorted(latency for latency, _ in samples)
+        phases_ms = {}
+        for phase in PHASES:
+            values = sorted(phases.get(phase, 0.0) for _, phases in samples)
+            phases_ms[phase] = {"mean": statistics.fmean(values) * 1e3, "p95": percentile(values, 0.95) * 1e3}
+        other = sorted(latency - sum(phases.get(phase, 0.0) for phase in PHASES) for latency, phases in samples)
+        phases_ms["other"] = {"mean": statistics.fmean(other) * 1e3, "p95": percentile(other, 0.95) * 1e3}
+        endpoints[endpoint] = {
+            "requests": len(samples),
+            "rps": len(samples) / elapsed,
+            "mean_ms": statistics.fmean(latencies) * 1e3,
+            "p50_ms": percentile(latencies, 0.50) * 1e3,
+            "p95_ms": percentile(latencies, 0.95) * 1e3,
+            "p99_ms": percentile(latencies, 0.99) * 1e3,
+            "max_ms": latencies[-1] * 1e3,
+            "phases_ms": phases_ms,
+        }
+    total = sum(summary["requests"] for summary in endpoints.values())
+    return {"elapsed_s": elapsed, "requests": total, "rps": total / elapsed, "endpoints": endpoints,
+            "errors": dict(recorder.errors),
+            "background_ms": {key.split(":", 1)[1]: seconds * 1e3 for key, seconds in background.items()
+                              if key.startswith("background:")}}
+
+
+def print_summary(mode: str, summary: dict):
+    print(f"\n{mode}: {summary['requests']} requests in {summary['elapsed_s']:.1f} s, {summary['rps']:.0f} req/s")
+    print(f"  {'endpoint':8}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}   "
+          + "".join(f"{phase:>12}" for phase in PHASES + ("other",)) + "   (ms; phases: mean per request)")
+    for endpoint, stats in summary["endpoints"].items():
+        print(f"  {endpoint:8}{stats['rps']:9.0f}{stats['p50_ms']:9.2f}{stats['p95_ms']:9.2f}{stats['p99_ms']:9.2f}"
+              f"{stats['max_ms']:9.1f}   " + "".join(f"{stats['phases_ms'][p]['mean']:12.3f}" for p in PHASES + ("other",)))
+    if summary["background_ms"]:
+        print("  background (write-behind flusher): " +
+              ", ".join(f"{phase} {ms:.1f} ms" for phase, ms in summary["background_ms"].items()))
+    if summary["errors"]:
+        print(f"  errors: {summary['errors']}")
+
+
+def print_comparison(current: dict, baseline: dict):
+    print(f"\nchange vs baseline ({baseline.get('git_revision', '?')}):")
+    differing = sorted(k for k, v in current["config"].items() if baseline.get("config", {}).get(k) != v)
+    if differing:
+        print(f"  note: runs differ in {', '.join(differing)}")
+    for mode, summary in current["results"].items():
+        before = baseline.get("results", {}).get(mode)
+        if not before:
+            continue
+        for endpoint, stats in summary["endpoints"].items():
+            old = before["endpoints"].get(endpoint)
+            if not old:
+                continue
+            changes = ", ".join(f"{key.replace('_ms', '')} {old[key]:.2f} -> {stats[key]:.2f} ms "
+                                f"({(stats[key] / old[key] - 1) * 100:+.0f}%)" for key in ("p50_ms", "p99_ms"))
+            print(f"  {mode:8} {endpoint:7} rps {old['rps']:.0f} -> {stats['rps']:.0f} "
+                  f"({(stats['rps'] / old['rps'] - 1) * 100:+.0f}%), {changes}")
+
+
+# --- Modes ---
+
+def store_env(args, directory: str) -> dict:
+    env = {"GAME_STORE": args.store, "USE_IN_MEMORY_TABLE": "1" if args.store == "memory" else "0",
+           "GAME_STORE_SQLITE_PATH": os.path.join(directory, "games.sqlite3"), "LAMBDA_LOG_EVENTS": "0"}
+    if args.write_through:
+        env["GAME_STATE_DURABILITY_SECONDS"] = "0"
+    return env
+
+
+def run_test_client(args, directory: str) -> dict:
+    os.environ.update(store_env(args, directory)) # Read by app.py at import
+    import logging
+    import app
+    app.app.logger.setLevel(logging.WARNING) # Per-request INFO logging would dominate the timings
+    phase_timer.install(app)
+    recorder, elapsed = run_players(lambda: TestClientTransport(app), args.players, args.duration,
+                                    args.poll_every, args.seed)
+    app.get_state_cache().flush()
+    with phase_timer._lock:
+        background = dict(phase_timer.totals)
+    return summarize(recorder, elapsed, background)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_gunicorn(args, directory: str) -> dict:
+    if args.store == "memory" and args.gunicorn_workers > 1:
+        raise SystemExit("--store memory is per process; use --store sqlite with more than one gunicorn worker")
+    port = free_port()
+    command = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}",
+               "--workers", str(args.gunicorn_workers), "--threads", str(args.threads), "--timeout", "0",
+               "--log-level", "warning", "--chdir", REPO_ROOT, "--pythonpath", os.path.join(REPO_ROOT, "benchmarks"),
+               "bench_http_api:instrumented_app"]
+    server = subprocess.Popen(command, env=dict(os.environ, **store_env(args, directory)), cwd=REPO_ROOT)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                    break
+            except OSError:
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("gunicorn didn't start")
+                time.sleep(0.1)
+        HTTPTransport(port).request("GET", PHASES_PATH) # Imports app and installs the phase wrappers
+        recorder, elapsed = run_players(lambda: HTTPTransport(port), args.players, args.duration,
+                                        args.poll_every, args.seed)
+        time.sleep(0.1)
+        _, body, _ = HTTPTransport(port).request("GET", PHASES_PATH)
+        return summarize(recorder, elapsed, json.loads(body))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def git_revision() -> str:
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True)
+    return result.stdout.strip() or "unknown"
+
+
+def main():
+    import tempfile
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", default="both", choices=["client", "gunicorn", "both"])
+    parser.add_argument("--players", type=int, default=32, help="Concurrent simulated players")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per mode")
+    parser.add_argument("--poll-every", type=int, default=4, help="Every Nth request is a GET /state (0: never)")
+    parser.add_argument("--store", default="memory", choices=["memory", "sqlite"])
+    parser.add_argument("--write-through", action="store_true", help="GAME_STATE_DURABILITY_SECONDS=0")
+    parser.add_argument("--gunicorn-workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--compare", help="Earlier --json results to compare against")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        # gunicorn first: the test client mode imports app into this process with its settings
+        if args.mode in ("gunicorn", "both"):
+            results["gunicorn"] = run_gunicorn(args, directory)
+            print_summary("gunicorn", results["gunicorn"])
+        if args.mode in ("client", "both"):
+            results["client"] = run_test_client(args, directory)
+            print_summary("client", results["client"])
+
+    report = {"git_revision": git_revision(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "python": platform.python_version(), "cpus": os.cpu_count(),
+              "config": {k: v for k, v in vars(args).items() if k not in ("json", "compare")}, "results": results}
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(report, json.load(f))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
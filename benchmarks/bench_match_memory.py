@@ -0,0 +1,78 @@
+"""
+Memory benchmark: bytes per live match for boxing_game_logic.
+
+Builds N matches, plays a few ticks of simulated fighting in each so stats, knockdown info
+and the event log are populated, and measures the traced allocation per match. Pass
+--baseline-ref to load boxing_game_logic.py from an older git revision and compare.
+
+Usage (from the repo root):
+    python benchmarks/bench_match_memory.py --matches 20000 --baseline-ref f32913b
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tracemalloc
+import types
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+
+def load_engine(ref=None):
+    """Imports the current boxing_game_logic, or the version at git `ref` as a throwaway module."""
+    if ref is None:
+        import boxing_game_logic
+        return boxing_game_logic
+    source = subprocess.check_output(["git", "show", f"{ref}:boxing_game_logic.py"], cwd=REPO_ROOT, text=True)
+    module = types.ModuleType(f"boxing_game_logic_{ref}")
+    exec(compile(source, f"boxing_game_logic.py@{ref}", "exec"), module.__dict__)
+    return module
+
+
+def build_match(bgl, actions_per_fighter):
+    game = bgl.initialize_new_game()
+    bgl.start_new_round(game)
+    for _ in range(actions_per_fighter):
+        bgl.execute_fighter_action(game, bgl.FighterName.PLAYER, random.choice(
+            [bgl.ActionType.JAB, bgl.ActionType.CROSS, bgl.ActionType.HOOK]))
+        bgl.execute_fighter_action(game, bgl.FighterName.OPPONENT, bgl.ActionType.JAB)
+        game.player.stamina = game.opponent.stamina = bgl.MAX_STAMINA # Keep both able to punch
+        game.player.hp = game.opponent.hp = bgl.MAX_HP # ...and on their feet
+    return game
+
+
+def bytes_per_match(bgl, matches, actions_per_fighter):
+    random.seed(1234)
+    gc.collect()
+    with contextlib.redirect_stdout(io.StringIO()): # Older engines print every log line
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        live = [build_match(bgl, actions_per_fighter) for _ in range(matches)]
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    assert len(live) == matches
+    return (after - before) / matches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--matches", type=int, default=5000)
+    parser.add_argument("--actions", type=int, default=10, help="Actions per fighter before measuring")
+    parser.add_argument("--baseline-ref", default=None, help="git revision to compare against")
+    args = parser.parse_args()
+
+    results = {"matches": args.matches, "actions_per_fighter": args.actions,
+               "current_bytes_per_match": round(bytes_per_match(load_engine(), args.matches, args.actions))}
+    if args.baseline_ref:
+        baseline = bytes_per_match(load_engine(args.baseline_ref), args.matches, args.actions)
+        results["baseline_ref"] = args.baseline_ref
+        results["baseline_bytes_per_match"] = round(baseline)
+        results["reduction_pct"] = round(100 * (1 - results["current_bytes_per_match"] / baseline), 1)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,131 @@
+"""
+Snapshot codec benchmark: binary snapshot vs the dict round trip for one stored match.
+
+"dict" is what stored games used to be: encode = serialize_game_state_for_api, decode = the
+item as DynamoDB hands it back (numbers as Decimal) through upgrade_legacy_item /
+create_gamestate_from_dict. "snapshot" is encode_game_state / decode_game_state. The event log
+and state_version are stored the same way in both forms, so they are left out of every number.
+
+Item bytes follow DynamoDB's item size rules (attribute names + values; numbers ~1 byte per two
+significant digits + 1; maps/lists 3 bytes + 1 per element), i.e. what write/read units bill.
+
+Usage (from the repo root):
+    python benchmarks/bench_snapshot_codec.py --matches 200 --repeat 2000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+from decimal import Decimal
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.environ.setdefault("USE_IN_MEMORY_TABLE", "1") # Only the serializer is needed from app.py
+
+import boxing_game_logic as bgl
+from app import serialize_game_state_for_api
+from boxing_simulator import SimulatedClock
+from boxing_snapshot_codec import decode_game_state, encode_game_state, upgrade_legacy_item
+
+_NOT_STATE = ("event_log", "state_version")
+
+
+def dynamodb_size(value) -> int:
+    """Approximate DynamoDB storage size of one attribute value."""
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, Decimal)):
+        digits = len(str(Decimal(str(value)).normalize()).replace("-", "").replace(".", "").lstrip("0")) or 1
+        return (digits + 1) // 2 + 1
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, dict):
+        return 3 + sum(1 + len(k.encode("utf-8")) + dynamodb_size(v) for k, v in value.items())
+    if isinstance(value, list):
+        return 3 + sum(1 + dynamodb_size(v) for v in value)
+    raise TypeError(type(value))
+
+
+def item_size(item: dict) -> int:
+    return sum(len(k.encode("utf-8")) + dynamodb_size(v) for k, v in item.items())
+
+
+def build_match(seed: int, ticks: int) -> bgl.GameState:
+    """A match `ticks` x 0.1s in, with simulated player punches."""
+    rng = random.Random(seed)
+    game = bgl.initialize_new_game(clock=SimulatedClock(1_700_000_000.0), rng=rng)
+    game.game_id = f"{seed:08d}-bench-0000-0000-000000000000"
+    bgl.start_new_round(game)
+    for _ in range(ticks):
+        if game.match_status == bgl.GameStatus.MATCH_OVER:
+            break
+        if rng.random() < 0.3:
+            bgl.queue_player_action_for_tick(game, rng.choice(bgl.PUNCH_TYPES))
+        game.clock.advance(0.1)
+        bgl.game_tick(game)
+    return game
+
+
+def dict_item(game: bgl.GameState) -> dict:
+    item = serialize_game_state_for_api(game)
+    for key in _NOT_STATE:
+        item.pop(key, None)
+    return item
+
+
+def as_stored(item: dict) -> dict:
+    """The item as boto3 returns it: every number a Decimal."""
+    return json.loads(json.dumps(item), parse_float=Decimal, parse_int=Decimal)
+
+
+def per_call_us(fn, games, repeat: int) -> float:
+    calls = 0
+    total = 0.0
+    for game in games:
+        total += min(timeit.repeat(lambda: fn(game), number=repeat // 10 or 1, repeat=10))
+        calls += repeat // 10 or 1
+    return total / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--matches", type=int, default=100, help="Matches sampled, at different points of the fight")
+    parser.add_argument("--repeat", type=int, default=1000, help="Timed calls per match and operation")
+    args = parser.parse_args()
+
+    games = [build_match(seed, seed * 30) for seed in range(args.matches)]
+    items = [as_stored(dict_item(game)) for game in games]
+    snapshots = [encode_game_state(game) for game in games]
+    for game, snapshot in zip(games, snapshots): # Same match either way before timing anything
+        decoded = decode_game_state(snapshot)
+        assert dict_item(decoded) == dict_item(game)
+
+    results = {
+        "dict": {
+            "encode_us": per_call_us(dict_item, games, args.repeat),
+            "decode_us": per_call_us(upgrade_legacy_item, items, args.repeat),
+            "item_bytes": sum(item_size(item) for item in items) / len(items),
+        },
+        "snapshot": {
+            "encode_us": per_call_us(encode_game_state, games, args.repeat),
+            "decode_us": per_call_us(decode_game_state, snapshots, args.repeat),
+            "item_bytes": sum(item_size({"game_id": game.game_id, "snapshot": snapshot})
+                              for game, snapshot in zip(games, snapshots)) / len(games),
+        },
+    }
+    print(f"{args.matches} matches, {args.repeat} calls each (event log and state_version excluded)")
+    print(f"{'':10}{'encode us':>12}{'decode us':>12}{'item bytes':>12}")
+    for name, row in results.items():
+        print(f"{name:10}{row['encode_us']:12.1f}{row['decode_us']:12.1f}{row['item_bytes']:12.0f}")
+    dict_row, snap_row = results["dict"], results["snapshot"]
+    print(f"snapshot: encode {dict_row['encode_us'] / snap_row['encode_us']:.1f}x, "
+          f"decode {dict_row['decode_us'] / snap_row['decode_us']:.1f}x faster, "
+          f"{snap_row['item_bytes'] / dict_row['item_bytes']:.0%} of the item bytes")
+
+
+if __name__ == "__main__":
+    main()
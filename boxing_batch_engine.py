@@ -0,0 +1,639 @@
+"""
+Vectorized batch engine: steps many boxing matches per tick with NumPy.
+
+Matches run on event timelines (see "Match timeline" in boxing_game_logic): between its
+scheduled events a match only changes continuously (round clock, stamina regen and block drain,
+knockdown count, rest between rounds), and those values follow from the snapshot ("anchor")
+taken at its last event. BatchEngine keeps what the events read and write for N matches in
+columnar arrays (anchors, round clocks, HP, stamina, current actions, stat counters) and advances
+all of them with one step():
+
+- Quiet matches (nothing due, no player input) cost nothing: their continuous values are only
+  computed from the anchors when something reads them (an event, an input, syncing the
+  GameState), the same way game_tick would have computed them on that tick.
+- Due events run in waves, one event per match per wave. Impacts, recoveries and the AI's
+  moves are resolved for the whole wave at once: hit rolls against the ACTION_DETAILS accuracy
+  table, blocks, damage, stamina and stat counters are array operations. Player inputs are
+  started the same way after the last wave.
+- Per-match work that can't be vectorized without changing results stays per match: RNG draws
+  (every match keeps its own random.Random stream), the AI's policy sample, event logging and
+  the timeline heap. Rare events (knockdowns, the count, the bell) run through the regular
+  boxing_game_logic functions on the match's GameState.
+
+step(now) produces exactly what calling game_tick on each match would, given the same seeds and
+a clock that reads `now`: same RNG draw order, same numbers (including int vs float types, so
+log lines are identical), same events.
+
+Requires numpy (optional for the rest of the game).
+
+Usage:
+    engine = BatchEngine()
+    row = engine.add(game_state)        # the match now runs on the engine's clock
+    engine.step(now)                    # or engine.step() to use time.time()
+    game_state = engine.remove(row)     # synced back, original clock restored
+"""
+import heapq
+import time
+
+import numpy as np
+
+import boxing_game_logic as bgl
+from boxing_game_logic import ActionType, FighterName, GameStatus
+
+ACTION_CODES = list(ActionType)
+ACTION_CODE = {action: code for code, action in enumerate(ACTION_CODES)}
+STATUS_CODES = list(GameStatus)
+STATUS_CODE = {status: code for code, status in enumerate(STATUS_CODES)}
+FIGHTERS = (FighterName.PLAYER, FighterName.OPPONENT) # Column 0 and 1 of the per-fighter arrays
+
+IDLE = ACTION_CODE[ActionType.IDLE]
+BLOCK = ACTION_CODE[ActionType.BLOCK]
+MATCH_OVER = STATUS_CODE[GameStatus.MATCH_OVER]
+# Events resolved on the arrays while the round is running; everything else is a fallback
+_BATCHED_EVENTS = frozenset((bgl.EV_IMPACT, bgl.EV_RECOVER, bgl.EV_BLOCK_BROKE, bgl.EV_AI_THINK))
+# Columns of the `values` arrays: what the round's events read and change
+ROUND_TIMER, PLAYER_STAMINA, OPPONENT_STAMINA = range(3)
+
+
+class BatchClock:
+    """Clock handed to every match in the engine so object-side code sees the step's time."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class _ActionTable:
+    """ACTION_DETAILS (and the stamina rates) flattened into arrays indexed by action code."""
+
+    def __init__(self):
+        n = len(ACTION_CODES)
+        self.in_details = np.zeros(n, dtype=bool)
+        self.cost = np.zeros(n)
+        self.cost_is_int = np.ones(n, dtype=bool)
+        self.accuracy = np.zeros(n)
+        self.damage = np.zeros(n)
+        self.damage_is_int = np.ones(n, dtype=bool)
+        self.punch_base = np.full(n, -1, dtype=np.int64) # Stat slot of the punch's "thrown" counter
+        for action, details in bgl.ACTION_DETAILS.items():
+            code = ACTION_CODE[action]
+            self.in_details[code] = True
+            self.cost[code] = details.get("stamina_cost", 0)
+            self.cost_is_int[code] = isinstance(details.get("stamina_cost", 0), int)
+            self.accuracy[code] = details.get("accuracy", 0)
+            self.damage[code] = details.get("damage", 0)
+            self.damage_is_int[code] = isinstance(details.get("damage", 0), int)
+        for action, base in bgl._STAT_PUNCH_INDEX.items():
+            self.punch_base[ACTION_CODE[action]] = base
+        block = bgl.ACTION_DETAILS[ActionType.BLOCK]
+        self.block_on_hit = block["stamina_cost_on_hit"]
+        self.block_drain = block["stamina_cost_active_drain"]
+        self.regen = bgl.STAMINA_REGEN_PER_SECOND
+        # Stamina change per second while doing each action, computed the way _stamina_at does
+        self.stamina_rate = np.full(n, self.regen, dtype=np.float64) # Float even when the regen is an int
+        self.stamina_rate[BLOCK] = self.regen - self.block_drain
+
+
+_action_table_cache = [None, None] # (key, _ActionTable)
+
+
+def _action_table() -> _ActionTable:
+    """The table for the current ACTION_DETAILS, rebuilt only after they (or the regen) change."""
+    key = (bgl.STAMINA_REGEN_PER_SECOND,
+           [(action, tuple(details.items())) for action, details in bgl.ACTION_DETAILS.items()])
+    if _action_table_cache[0] != key:
+        _action_table_cache[:] = [key, _ActionTable()]
+    return _action_table_cache[1]
+
+
+def _typed(value, is_int):
+    """Python number with the int/float type the object engine would have produced."""
+    return int(value) if is_int else float(value)
+
+
+def _advance_to_event(game, due, kind, arg, action):
+    """One event of advance_match on a GameState (the caller anchors)."""
+    bgl._advance_continuous(game, due)
+    bgl._run_event(game, due, kind, arg, action)
+
+
+class BatchEngine:
+    """Columnar store + vectorized stepper for many GameStates. See the module docstring."""
+
+    def __init__(self, capacity: int = 256):
+        self.clock = BatchClock()
+        self.games = [None] * capacity # GameState per row (None = free row)
+        self._saved_clocks = [None] * capacity
+        self._free_rows = list(range(capacity - 1, -1, -1))
+        self._allocate(capacity)
+
+    # --- Storage ---
+
+    def _allocate(self, capacity: int):
+        def grow(name, shape, dtype, fill=0):
+            array = np.full(shape, fill, dtype=dtype)
+            old = getattr(self, name, None)
+            if old is not None:
+                array[:len(old)] = old
+            setattr(self, name, array)
+
+        grow("in_use", capacity, bool)
+        grow("live", capacity, bool) # In use and not over
+        grow("status", capacity, np.int8)
+        grow("round_active", capacity, bool)
+        grow("fighting", capacity, bool) # Round running, no knockdown count: events run on the arrays
+        grow("next_due", capacity, np.float64, np.inf)
+        # What the GameState doesn't have yet: ticks since the last sync (up to last_tick), changes
+        # made by events (round clock, fighters) and an anchor taken by the engine
+        grow("last_tick", capacity, np.float64)
+        grow("ticked", capacity, bool)
+        grow("dirty", capacity, bool)
+        grow("reanchored", capacity, bool)
+        # Round clock and stamina as of the row's latest event, and at its anchor
+        grow("values", (capacity, 3), np.float64)
+        grow("values_is_int", (capacity, 3), bool)
+        grow("anchor_time", capacity, np.float64)
+        grow("anchor_values", (capacity, 3), np.float64)
+        grow("anchor_is_int", (capacity, 3), bool)
+        # Fighters
+        grow("max_stamina", (capacity, 2), np.float64)
+        grow("max_stamina_is_int", (capacity, 2), bool)
+        grow("hp", (capacity, 2), np.float64)
+        grow("hp_is_int", (capacity, 2), bool)
+        grow("action", (capacity, 2), np.int8)
+        grow("stats", (capacity, 2, bgl._STAT_SLOT_COUNT), np.int64)
+        self.capacity = capacity
+
+    def _load_row(self, row: int):
+        """Object -> arrays."""
+        game = self.games[row]
+        status = STATUS_CODE[game.match_status]
+        self.status[row] = status
+        self.live[row] = status != MATCH_OVER
+        self.round_active[row] = game.is_round_active
+        # A running round always has an anchor (start_new_round takes one)
+        self.fighting[row] = game.is_round_active and not game.knockdown_info.is_knockdown
+        timeline = game.timeline
+        self.next_due[row] = timeline.events[0][0] if timeline.events else np.inf
+        self.ticked[row] = self.dirty[row] = self.reanchored[row] = False
+        player, opponent = game.player, game.opponent
+        values = (game.round_timer, player.stamina, opponent.stamina)
+        self.values[row] = values
+        self.values_is_int[row] = [isinstance(value, int) for value in values]
+        anchor = timeline.anchor
+        if anchor is not None:
+            self.anchor_time[row] = timeline.anchor_time
+            anchored = (anchor[0], anchor[3], anchor[4])
+            self.anchor_values[row] = anchored
+            self.anchor_is_int[row] = [isinstance(value, int) for value in anchored]
+        for side, fighter in enumerate((player, opponent)):
+            self.max_stamina[row, side] = fighter.max_stamina
+            self.max_stamina_is_int[row, side] = isinstance(fighter.max_stamina, int)
+            self.hp[row, side] = fighter.hp
+            self.hp_is_int[row, side] = isinstance(fighter.hp, int)
+            self.action[row, side] = ACTION_CODE[fighter.current_action]
+            self.stats[row, side] = fighter.stats._counts
+
+    def _store_row(self, row: int):
+        """Arrays -> object: whatever the steps changed since the last sync."""
+        if not (self.ticked[row] or self.dirty[row] or self.reanchored[row]):
+            return
+        game = self.games[row]
+        fighters = (game.player, game.opponent)
+        if self.dirty[row]:
+            values, is_int = self.values[row].tolist(), self.values_is_int[row].tolist()
+            game.round_timer = _typed(values[ROUND_TIMER], is_int[ROUND_TIMER])
+            for side, fighter in enumerate(fighters):
+                fighter.stamina = _typed(values[PLAYER_STAMINA + side], is_int[PLAYER_STAMINA + side])
+                fighter.hp = _typed(self.hp[row, side], self.hp_is_int[row, side])
+                fighter.current_action = ACTION_CODES[self.action[row, side]]
+                fighter.stats._counts[:] = self.stats[row, side].tolist()
+        if self.reanchored[row]:
+            # Only taken while a round runs, when the rest timer and the count don't move
+            values, is_int = self.anchor_values[row].tolist(), self.anchor_is_int[row].tolist()
+            timeline = game.timeline
+            timeline.anchor_time = float(self.anchor_time[row])
+            timeline.anchor = (_typed(values[ROUND_TIMER], is_int[ROUND_TIMER]),
+                               game.between_rounds_timer, game.knockdown_info.count,
+                               _typed(values[PLAYER_STAMINA], is_int[PLAYER_STAMINA]),
+                               _typed(values[OPPONENT_STAMINA], is_int[OPPONENT_STAMINA]))
+        if self.ticked[row]: # The rest of the row's latest game_tick
+            last_tick = float(self.last_tick[row])
+            bgl._advance_continuous(game, last_tick)
+            game.last_tick_time = last_tick
+        self.ticked[row] = self.dirty[row] = self.reanchored[row] = False
+
+    def _fallback(self, row: int, due: float, func, *args):
+        """Runs an object-engine step of advance_match on one match, then anchors and reloads it."""
+        self._store_row(row)
+        game = self.games[row]
+        func(game, *args)
+        if game.match_status != GameStatus.MATCH_OVER:
+            bgl._anchor(game, due)
+        self._load_row(row)
+
+    def _refresh_next_due(self, rows):
+        events = [self.games[row].timeline.events for row in rows]
+        self.next_due[rows] = [queue[0][0] if queue else np.inf for queue in events]
+
+    # --- Moving matches in and out ---
+
+    def add(self, game_state: bgl.GameState) -> int:
+        """Loads a match into a free row; it runs on the engine's clock until removed."""
+        if not self._free_rows:
+            old_capacity = self.capacity
+            self._allocate(old_capacity * 2)
+            self.games.extend([None] * old_capacity)
+            self._saved_clocks.extend([None] * old_capacity)
+            self._free_rows = list(range(self.capacity - 1, old_capacity - 1, -1))
+        row = self._free_rows.pop()
+        self.games[row] = game_state
+        self._saved_clocks[row] = game_state.clock
+        game_state.clock = self.clock
+        self.in_use[row] = True
+        self._load_row(row)
+        return row
+
+    def game(self, row: int) -> bgl.GameState:
+        """The row's GameState, synced with the arrays (it stays in the engine)."""
+        self._store_row(row)
+        return self.games[row]
+
+    def remove(self, row: int) -> bgl.GameState:
+        """Takes a match out of the engine as a regular, synced GameState."""
+        game_state = self.game(row)
+        game_state.clock = self._saved_clocks[row]
+        self.games[row] = None
+        self._saved_clocks[row] = None
+        self.in_use[row] = self.live[row] = False
+        self.next_due[row] = np.inf
+        self._free_rows.append(row)
+        return game_state
+
+    def sync(self):
+        """Writes every row back to its GameState (e.g. before serializing them all)."""
+        for row in np.flatnonzero(self.in_use):
+            self._store_row(row)
+
+    def __len__(self):
+        return int(self.in_use.sum())
+
+    # --- Stepping ---
+
+    def step(self, now: float = None):
+        """Advances every match in the engine by one game_tick at time `now`."""
+        now = time.time() if now is None else now
+        self.clock.now = now
+        table = _action_table()
+
+        rows = np.flatnonzero(self.live)
+        if not rows.size:
+            return
+        games = self.games
+        for row in rows.tolist():
+            journal = games[row].journal
+            if journal is not None:
+                journal.record_tick(now)
+
+        self._run_due_events(now, table)
+        rows = rows[self.live[rows]] # Knockouts and the final bell end matches
+        self.last_tick[rows] = now
+        self._player_inputs(rows[self.round_active[rows]], now, table)
+        self.ticked[rows] = True
+
+    def _run_due_events(self, now, table):
+        """advance_match's event loop for every match: one event per match per wave."""
+        games = self.games
+        while True:
+            due_rows = np.flatnonzero(self.next_due <= now) # Free and finished rows are never due
+            if not due_rows.size:
+                return
+            due_rows = due_rows.tolist()
+            batch_rows, batch_dues, impacts, recoveries, thinks = [], [], [], [], []
+            for row, fighting in zip(due_rows, self.fighting[due_rows].tolist()):
+                event = heapq.heappop(games[row].timeline.events)
+                due, _, kind, arg, action = event
+                if not fighting or kind not in _BATCHED_EVENTS:
+                    self._fallback(row, due, _advance_to_event, due, kind, arg, action)
+                    continue
+                batch_rows.append(row)
+                batch_dues.append(due)
+                if kind == bgl.EV_IMPACT:
+                    impacts.append((row, event))
+                elif kind == bgl.EV_AI_THINK:
+                    thinks.append((row, due))
+                else:
+                    recoveries.append((row, event))
+
+            if batch_rows:
+                rows, dues = np.array(batch_rows), np.array(batch_dues)
+                self._advance_round(rows, dues, table)
+                knocked_down = self._impacts(impacts, table) if impacts else ()
+                if recoveries:
+                    self._thinks(self._recoveries(recoveries), table, scheduled=False)
+                if thinks:
+                    self._thinks(thinks, table)
+                if knocked_down: # Anchored by the knockdown
+                    keep = np.array([row not in knocked_down for row in batch_rows])
+                    rows, dues = rows[keep], dues[keep]
+                self._anchor(rows, dues)
+            self._refresh_next_due(due_rows)
+
+    def _anchor(self, rows, times):
+        """bgl._anchor for many matches."""
+        self.anchor_time[rows] = times
+        self.anchor_values[rows] = self.values[rows]
+        self.anchor_is_int[rows] = self.values_is_int[rows]
+        self.reanchored[rows] = True
+
+    def _advance_round(self, rows, now, table):
+        """bgl._advance_continuous for matches whose round is running, at `now` (one time or one per row)."""
+        self.dirty[rows] = True
+        elapsed = now - self.anchor_time[rows]
+        moving = elapsed > 0
+        if not moving.all():
+            rows, elapsed = rows[moving], elapsed[moving]
+        anchored = self.anchor_values[rows]
+        values = np.empty_like(anchored)
+        is_int = np.zeros(anchored.shape, dtype=bool)
+        values[:, ROUND_TIMER] = anchored[:, ROUND_TIMER] - elapsed
+
+        # _stamina_at: min(max, x) while regen wins, max(0, x) while a block drains faster
+        rate = table.stamina_rate[self.action[rows]]
+        raised = anchored[:, PLAYER_STAMINA:] + rate * elapsed[:, None]
+        maximum = self.max_stamina[rows]
+        gaining = rate >= 0
+        values[:, PLAYER_STAMINA:] = np.where(gaining, np.minimum(raised, maximum), np.maximum(raised, 0))
+        # min(max, x) keeps max unless x < max, max(0, x) keeps 0 unless x > 0
+        is_int[:, PLAYER_STAMINA:] = np.where(gaining, ~(raised < maximum) & self.max_stamina_is_int[rows], ~(raised > 0))
+        knocked_out = self.hp[rows] <= 0 # Cannot regenerate if knocked out
+        if knocked_out.any():
+            values[:, PLAYER_STAMINA:] = np.where(knocked_out, anchored[:, PLAYER_STAMINA:], values[:, PLAYER_STAMINA:])
+            is_int[:, PLAYER_STAMINA:] = np.where(knocked_out, self.anchor_is_int[rows, PLAYER_STAMINA:],
+                                                  is_int[:, PLAYER_STAMINA:])
+        self.values[rows] = values
+        self.values_is_int[rows] = is_int
+
+    def _consume(self, rows, columns, cost, cost_is_int):
+        """Fighter.consume_stamina for (row, stamina column) pairs: max(0, stamina - cost)."""
+        lowered = self.values[rows, columns] - cost
+        positive = lowered > 0
+        self.values[rows, columns] = np.where(positive, lowered, 0)
+        self.values_is_int[rows, columns] = ~positive | (self.values_is_int[rows, columns] & cost_is_int)
+
+    # --- Events resolved on the arrays ---
+
+    def _impacts(self, items, table) -> set:
+        """resolve_impact for many matches; returns the rows that ended in a knockdown."""
+        rows, sides, codes, rolls, guard_first = [], [], [], [], []
+        for row, event in items:
+            game, side = self.games[row], event[3]
+            fighters = (game.player, game.opponent)
+            rows.append(row)
+            sides.append(side)
+            codes.append(ACTION_CODE[event[4]])
+            rolls.append(game.rng.random()) # One hit roll per impact, blocked or not
+            guard_first.append(fighters[1 - side].action_start_time < fighters[side].action_start_time)
+        rows, sides, codes = np.array(rows), np.array(sides), np.array(codes)
+        others = 1 - sides
+        # Guard up at the moment of impact, and already up when the punch was thrown
+        blocked = (self.action[rows, others] == BLOCK) & np.array(guard_first, dtype=bool)
+        landed = ~blocked & (np.array(rolls) < table.accuracy[codes])
+
+        punch_base = table.punch_base[codes]
+        self.stats[rows, sides, bgl._STAT_PUNCHES_THROWN] += 1
+        self.stats[rows, sides, punch_base] += 1
+        if blocked.any():
+            self._consume(rows[blocked], PLAYER_STAMINA + others[blocked], table.block_on_hit,
+                          isinstance(table.block_on_hit, int))
+        if landed.any():
+            hit_rows, hit_sides, hit_others = rows[landed], sides[landed], others[landed]
+            damage = table.damage[codes[landed]]
+            lowered = self.hp[hit_rows, hit_others] - damage
+            self.hp[hit_rows, hit_others] = np.where(lowered > 0, lowered, 0)
+            self.hp_is_int[hit_rows, hit_others] = ~(lowered > 0) | \
+                (self.hp_is_int[hit_rows, hit_others] & table.damage_is_int[codes[landed]])
+            self.stats[hit_rows, hit_sides, bgl._STAT_PUNCHES_LANDED] += 1
+            self.stats[hit_rows, hit_sides, punch_base[landed] + 1] += 1
+            self.stats[hit_rows, hit_sides, bgl._STAT_DAMAGE_DEALT] += damage.astype(np.int64)
+
+        knocked_down = set()
+        defender_hp, defender_hp_is_int = self.hp[rows, others].tolist(), self.hp_is_int[rows, others].tolist()
+        for i, ((row, (due, _, _, side, action)), was_blocked, hit) in enumerate(
+                zip(items, blocked.tolist(), landed.tolist())):
+            game = self.games[row]
+            attacker_name, defender_name = FIGHTERS[side], FIGHTERS[1 - side]
+            if was_blocked:
+                game.log(bgl.EVT_BLOCKED, defender_name, action)
+            elif hit:
+                game.log(bgl.EVT_LANDED, action, attacker_name, defender_name,
+                         _typed(defender_hp[i], defender_hp_is_int[i]))
+                if defender_hp[i] <= 0:
+                    anchored = (self.anchor_time[row], self.anchor_values[row].copy(), self.anchor_is_int[row].copy())
+                    self._anchor(row, due) # So syncing the row doesn't roll it back to its last tick
+                    self._fallback(row, due, bgl.handle_knockdown, defender_name, attacker_name, due)
+                    if game.match_status == GameStatus.MATCH_OVER: # A TKO: advance_match leaves the anchor be
+                        self.anchor_time[row], self.anchor_values[row], self.anchor_is_int[row] = anchored
+                        self.reanchored[row] = True
+                        self._store_row(row)
+                    knocked_down.add(row)
+                    continue # The knockdown cleared the timeline; nobody recovers into a count
+            else:
+                game.log(bgl.EVT_MISSED, action, attacker_name)
+            _, recovery = bgl.action_timing(action)
+            game.timeline.schedule(due + recovery, bgl.EV_RECOVER, side, action)
+        return knocked_down
+
+    def _recoveries(self, items):
+        """
+        EV_RECOVER / EV_BLOCK_BROKE for many matches: back to IDLE. Returns (row, due) of the
+        matches whose opponent is idle now, which think right away.
+        """
+        rows = np.array([row for row, _ in items])
+        self.action[rows, [event[3] for _, event in items]] = IDLE
+        opponent_idle = (self.action[rows, 1] == IDLE).tolist()
+        reacting = []
+        for (row, (due, _, kind, side, _)), idle in zip(items, opponent_idle):
+            if kind == bgl.EV_BLOCK_BROKE:
+                game = self.games[row]
+                game.log(bgl.EVT_BLOCK_BROKE, FIGHTERS[side])
+                if side == 1: # Out of stamina: it doesn't raise its guard again at the same instant
+                    game.timeline.schedule_think(due + bgl.AI_THINK_SECONDS)
+                    continue
+            if idle: # The opponent is free again, or sees the player drop their guard / finish a punch
+                reacting.append((row, due))
+        return reacting
+
+    def _thinks(self, items, table, scheduled: bool = True):
+        """
+        _opponent_think for many matches: policy samples per match, the chosen actions at once.
+        `scheduled`: the items are EV_AI_THINK events (skipped if superseded) rather than direct
+        calls. Returns the rows whose opponent spent stamina.
+        """
+        rows = [row for row, _ in items]
+        opponent_stamina = self.values[rows, OPPONENT_STAMINA].tolist()
+        hp, action = self.hp[rows].tolist(), self.action[rows].tolist()
+        acting, codes, times = [], [], []
+        for (row, due), stamina, (player_hp, opponent_hp), (player_action, opponent_action) in zip(
+                items, opponent_stamina, hp, action):
+            game = self.games[row]
+            timeline = game.timeline
+            if scheduled and due != timeline.think_at:
+                continue # Superseded by an earlier think
+            timeline.think_at = None
+            if opponent_action != IDLE:
+                continue
+            choice = bgl.ai_policy_table(game.ai_profile).sample(
+                game.rng, stamina, opponent_hp, player_hp, ACTION_CODES[player_action])
+            if choice != ActionType.IDLE:
+                acting.append(row)
+                codes.append(ACTION_CODE[choice])
+                times.append(due)
+            else:
+                timeline.schedule_think(due + bgl.AI_THINK_SECONDS)
+        if not acting:
+            return np.array([], dtype=np.int64)
+        return self._execute(np.array(acting), 1, np.array(codes), times, table) # Anchored by the caller
+
+    def _player_inputs(self, rows, now, table):
+        """The player-input half of game_tick for the matches whose round is running."""
+        acting, codes = [], []
+        for row in rows.tolist():
+            game = self.games[row]
+            if not game.action_queue:
+                continue
+            player_action = game.pop_player_action()
+            if player_action is None:
+                continue
+            if game.journal is not None:
+                game.journal.record_action(player_action)
+            busy_with = self.action[row, 0]
+            if busy_with == IDLE: # Can only act if idle
+                acting.append(row)
+                codes.append(ACTION_CODE[player_action])
+            else:
+                game.log(bgl.EVT_PLAYER_BUSY, player_action, ACTION_CODES[busy_with])
+        if not acting:
+            return
+        acting = np.array(acting)
+        self._advance_round(acting, now, table)
+        started = self._execute(acting, 0, np.array(codes), [now] * acting.size, table)
+        if started.size:
+            self._anchor(started, now)
+        reacting = acting[self.action[acting, 1] == IDLE].tolist()
+        if reacting: # The AI reacts to the wind-up
+            reacted = self._thinks([(row, now) for row in reacting], table, scheduled=False)
+            if reacted.size:
+                self._anchor(reacted, now)
+        self._refresh_next_due(acting)
+
+    def _execute(self, rows, side, codes, times, table):
+        """
+        execute_fighter_action for one side across many matches, each at its own time. Returns
+        the rows that spent stamina, which the caller anchors.
+        """
+        attacker_name = FIGHTERS[side]
+        column = PLAYER_STAMINA + side
+        in_details = table.in_details[codes]
+        can = ~in_details | ((self.values[rows, column] >= table.cost[codes]) & (self.hp[rows, side] > 0))
+        self.action[rows, side] = np.where(can, codes, IDLE) # Starting IDLE leaves the fighter IDLE
+        started = can & in_details
+
+        # Can't act, or a movement action: no stamina spent.
+        for i in np.flatnonzero(~started).tolist():
+            row, action, now = rows[i], ACTION_CODES[codes[i]], times[i]
+            game = self.games[row]
+            if not can[i]:
+                game.log(bgl.EVT_ACTION_FAILED, attacker_name, action)
+                continue
+            game.get_fighter_by_name(attacker_name).action_start_time = now
+            game.log(bgl.EVT_MOVE, attacker_name, action)
+            game.timeline.schedule(now + bgl.MOVE_SECONDS, bgl.EV_RECOVER, side, action)
+
+        index = np.flatnonzero(started)
+        rows, codes = rows[index], codes[index]
+        if not rows.size:
+            return rows
+        self._consume(rows, column, table.cost[codes], table.cost_is_int[codes])
+        self.stats[rows, side, bgl._STAT_PUNCHES_THROWN] += 1
+        punch_base = table.punch_base[codes]
+        punch = punch_base >= 0
+        self.stats[rows[punch], side, punch_base[punch]] += 1
+
+        stamina, stamina_is_int = self.values[rows, column].tolist(), self.values_is_int[rows, column].tolist()
+        block_net_drain = table.block_drain - table.regen
+        for i, (row, code, is_punch) in enumerate(zip(rows.tolist(), codes.tolist(), punch.tolist())):
+            game, action, now = self.games[row], ACTION_CODES[code], times[index[i]]
+            game.get_fighter_by_name(attacker_name).action_start_time = now
+            spent = _typed(stamina[i], stamina_is_int[i])
+            game.log(bgl.EVT_ACTION, attacker_name, action, spent)
+            if is_punch:
+                windup, _ = bgl.action_timing(action)
+                game.timeline.schedule(now + windup, bgl.EV_IMPACT, side, action)
+            elif action == ActionType.BLOCK:
+                if block_net_drain > 0 and spent / block_net_drain < bgl.BLOCK_HOLD_SECONDS:
+                    game.timeline.schedule(now + spent / block_net_drain, bgl.EV_BLOCK_BROKE, side, action)
+                else:
+                    game.timeline.schedule(now + bgl.BLOCK_HOLD_SECONDS, bgl.EV_RECOVER, side, action)
+            elif action == ActionType.DODGE:
+                game.timeline.schedule(now + bgl.DODGE_SECONDS, bgl.EV_RECOVER, side, action)
+        return rows
+
+
+if __name__ == '__main__':
+    import random
+
+    # Same seeds through game_tick and through the batch engine must give identical matches.
+    PUNCHES = [ActionType.JAB, ActionType.CROSS, ActionType.HOOK, ActionType.UPPERCUT, ActionType.BLOCK]
+
+    def new_match(seed, clock):
+        game = bgl.initialize_new_game(clock=clock, rng=random.Random(seed))
+        bgl.start_new_round(game)
+        return game
+
+    def queue_inputs(games, inputs, input_chance):
+        for game, input_rng in zip(games, inputs):
+            if input_rng.random() < input_chance:
+                game.queue_player_action(input_rng.choice(PUNCHES))
+
+    def snapshot(game):
+        return (game.match_status, game.winner, game.current_round, game.round_timer,
+                game.player.hp, game.player.stamina, game.player.stats.to_dict(), game.player.round_scores,
+                game.opponent.hp, game.opponent.stamina, game.opponent.stats.to_dict(),
+                game.opponent.round_scores, list(game.event_log))
+
+    def compare(matches, tick, input_chance):
+        now = [0.0]
+        scalar_games = [new_match(seed, lambda: now[0]) for seed in range(matches)]
+        inputs = [random.Random(seed + 10_000) for seed in range(matches)]
+        started = time.perf_counter()
+        while any(g.match_status != GameStatus.MATCH_OVER for g in scalar_games):
+            now[0] += tick
+            queue_inputs(scalar_games, inputs, input_chance)
+            for game in scalar_games:
+                bgl.game_tick(game)
+        scalar_seconds = time.perf_counter() - started
+
+        engine = BatchEngine()
+        batch_games = [new_match(seed, engine.clock) for seed in range(matches)]
+        rows = [engine.add(game) for game in batch_games]
+        inputs = [random.Random(seed + 10_000) for seed in range(matches)]
+        started = time.perf_counter()
+        t = 0.0
+        while (engine.status[rows] != MATCH_OVER).any():
+            t += tick
+            queue_inputs(batch_games, inputs, input_chance)
+            engine.step(t)
+        batch_seconds = time.perf_counter() - started
+        batch_games = [engine.remove(row) for row in rows]
+
+        mismatches = [i for i, (a, b) in enumerate(zip(scalar_games, batch_games)) if snapshot(a) != snapshot(b)]
+        assert not mismatches, f"Batch engine diverged for seeds {mismatches[:10]}"
+        print(f"{matches} matches identical ({tick * 1000:g} ms ticks, player input chance {input_chance}). "
+              f"game_tick loop: {scalar_seconds:.2f}s, batch engine: {batch_seconds:.2f}s")
+
+    # Busy matches (player input on 30% of ticks) and idle ones (most matches between events)
+    compare(200, 0.1, 0.3)
+    compare(500, 0.02, 0.0)
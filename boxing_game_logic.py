@@ -1,6 +1,13 @@
+import bisect
 import enum
+import heapq
+import math
 import time # For game tick simulation later
 import random # For AI and hit chances
+import threading # Per-game input queue lock
+from collections import deque
+
+from boxing_metrics import timed # Per-phase timers; no-ops unless GAME_METRICS=1
 
 # --- Constants ---
 MAX_HP = 100
@@ -10,6 +17,22 @@ MAX_ROUNDS = 3
 STAMINA_REGEN_PER_SECOND = 5
 STAMINA_REGEN_BETWEEN_ROUNDS = 25
 KNOCKDOWN_COUNT_MAX = 10
+KNOCKDOWN_GET_UP_COUNT = 8 # A downed fighter beats the count here (the mandatory eight count)...
+KNOCKDOWN_GET_UP_HP = 20 # ...back up with this much HP; the third knockdown of a round is a TKO
+PLAYER_ACTION_QUEUE_MAX = 8 # Pending player inputs kept per game; oldest are dropped beyond this
+EVENT_LOG_MAX = 100 # Events kept per game; older ones fall off the ring buffer
+DEFAULT_AI_PROFILE = "classic" # Opponent behaviour for new matches (see AI_PROFILES)
+BETWEEN_ROUNDS_SECONDS = 5
+# Action durations (see the match timeline below). A punch takes ACTION_WINDOW_SECONDS, the
+# window the tick loop used to hold an action for: it winds up for WINDUP_SECONDS_PER_SPEED / speed,
+# resolves at impact, then recovers for the rest. A JAB (speed 8) is 0.125 s + 0.375 s, an UPPERCUT
+# (speed 4) 0.25 s + 0.25 s. Other actions are held for a fixed time.
+ACTION_WINDOW_SECONDS = 0.5
+WINDUP_SECONDS_PER_SPEED = 1.0
+BLOCK_HOLD_SECONDS = 1.0
+DODGE_SECONDS = 0.4
+MOVE_SECONDS = 0.5 # Movement actions (no ACTION_DETAILS entry)
+AI_THINK_SECONDS = 0.25 # An idle opponent that chose to wait reconsiders after this long
 
 # --- Enums ---
 class ActionType(enum.Enum):
@@ -59,21 +82,198 @@ if __name__ == '__main__':
 # Next steps will be to define Fighter and GameState classes.
 # This file will be expanded as we go through the plan.
 
+# --- Fighter stats (fixed layout) ---
+# Stats are kept in one flat list of ints instead of a dict of dicts so a live match stays small.
+# FighterStats still behaves like the old stats dict: stats["damage_dealt"],
+# stats[ActionType.JAB]["landed"], items(), assignment when loading from storage, etc.
+PUNCH_TYPES = (ActionType.JAB, ActionType.CROSS, ActionType.HOOK, ActionType.UPPERCUT)
+
+_STAT_PUNCHES_THROWN = 0
+_STAT_PUNCHES_LANDED = 1
+_STAT_DAMAGE_DEALT = 2
+_STAT_KNOCKDOWNS_SCORED = 3
+_STAT_TOTAL_INDEX = {
+    "punches_thrown": _STAT_PUNCHES_THROWN,
+    "punches_landed": _STAT_PUNCHES_LANDED,
+    "damage_dealt": _STAT_DAMAGE_DEALT,
+    "knockdowns_scored": _STAT_KNOCKDOWNS_SCORED,
+}
+# Per-punch counters follow the totals as (thrown, landed) pairs.
+_STAT_PUNCH_INDEX = {punch: len(_STAT_TOTAL_INDEX) + 2 * i for i, punch in enumerate(PUNCH_TYPES)}
+_STAT_SLOT_COUNT = len(_STAT_TOTAL_INDEX) + 2 * len(PUNCH_TYPES)
+# Iteration order matches the old dict built by create_empty_fighter_stats.
+_STAT_KEYS = ("punches_thrown", "punches_landed", "damage_dealt") + PUNCH_TYPES + ("knockdowns_scored",)
+
+
+class PunchCounter:
+    """Live {"thrown": n, "landed": n} view onto one punch type's slots in FighterStats."""
+    __slots__ = ("_counts", "_base")
+
+    def __init__(self, counts: list, base: int):
+        self._counts = counts
+        self._base = base
+
+    def _offset(self, key: str) -> int:
+        if key == "thrown":
+            return self._base
+        if key == "landed":
+            return self._base + 1
+        raise KeyError(key)
+
+    def __getitem__(self, key: str) -> int:
+        return self._counts[self._offset(key)]
+
+    def __setitem__(self, key: str, value: int):
+        self._counts[self._offset(key)] = int(value)
+
+    def to_dict(self) -> dict:
+        return {"thrown": self._counts[self._base], "landed": self._counts[self._base + 1]}
+
+    def __eq__(self, other):
+        if isinstance(other, PunchCounter):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+class FighterStats:
+    """
+    Dict-like per-fighter match stats backed by a fixed, integer-indexed counter list.
+
+    Per-round numbers come from a snapshot of the counters taken when each round starts
+    (start_round): the current round's value is counter - snapshot, and finished rounds are kept
+    as counter lists in `_rounds`. Nothing has to replay the event log to score a round.
+    """
+    __slots__ = ("_counts", "_round_base", "_rounds")
+
+    def __init__(self):
+        self._counts = [0] * _STAT_SLOT_COUNT
+        self._round_base = None # _counts when the current round started (None: no round yet)
+        self._rounds = [] # Counter lists of the finished rounds
+
+    @classmethod
+    def from_counts(cls, counts: list) -> "FighterStats":
+        stats = cls()
+        stats._counts = list(counts)
+        return stats
+
+    def __getitem__(self, key):
+        index = _STAT_TOTAL_INDEX.get(key)
+        if index is not None:
+            return self._counts[index]
+        base = _STAT_PUNCH_INDEX.get(key)
+        if base is not None:
+            return PunchCounter(self._counts, base)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        index = _STAT_TOTAL_INDEX.get(key)
+        if index is not None:
+            self._counts[index] = int(value) # int() also normalizes Decimals from DynamoDB
+            return
+        base = _STAT_PUNCH_INDEX.get(key)
+        if base is None:
+            raise KeyError(key)
+        self._counts[base] = int(value.get("thrown", 0))
+        self._counts[base + 1] = int(value.get("landed", 0))
+
+    def __contains__(self, key):
+        return key in _STAT_TOTAL_INDEX or key in _STAT_PUNCH_INDEX
+
+    def __iter__(self):
+        return iter(_STAT_KEYS)
+
+    def __len__(self):
+        return len(_STAT_KEYS)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def keys(self):
+        return _STAT_KEYS
+
+    def items(self):
+        """(key, value) pairs with plain-dict punch counters, safe to serialize."""
+        return [(key, self[key].to_dict() if key in _STAT_PUNCH_INDEX else self[key]) for key in _STAT_KEYS]
+
+    def to_dict(self) -> dict:
+        return dict(self.items())
+
+    def start_round(self):
+        """Rolls the per-round counters over: the round in progress (if any) becomes history."""
+        if self._round_base is not None:
+            self._rounds.append(self._current_round_counts())
+        self._round_base = self._counts[:]
+
+    def _current_round_counts(self) -> list:
+        base = self._round_base
+        return [count - start for count, start in zip(self._counts, base)] if base is not None else self._counts[:]
+
+    def this_round(self, key: str) -> int:
+        """A total counter for the round in progress, e.g. this_round("damage_dealt"); O(1)."""
+        index = _STAT_TOTAL_INDEX[key]
+        base = self._round_base
+        return self._counts[index] - base[index] if base is not None else self._counts[index]
+
+    def round_counts(self) -> list:
+        """Counter lists per round: the finished ones, then the one in progress (if started)."""
+        if self._round_base is None:
+            return list(self._rounds)
+        return self._rounds + [self._current_round_counts()]
+
+    def rounds(self) -> list:
+        """round_counts() as FighterStats, for per-round breakdowns."""
+        return [FighterStats.from_counts(counts) for counts in self.round_counts()]
+
+    def restore_rounds(self, round_counts: list):
+        """Inverse of round_counts() when loading, with the match totals already in _counts."""
+        if not round_counts:
+            self._round_base, self._rounds = None, []
+            return
+        *finished, current = ([int(n) for n in counts] for counts in round_counts)
+        self._rounds = finished
+        self._round_base = [count - n for count, n in zip(self._counts, current)]
+
+    def record(self, action_type: ActionType, landed: bool, damage_dealt: int = 0):
+        """Hot-path counter update used by Fighter.record_action_stat."""
+        counts = self._counts
+        counts[_STAT_PUNCHES_THROWN] += 1
+        base = _STAT_PUNCH_INDEX.get(action_type)
+        if base is not None:
+            counts[base] += 1
+            if landed:
+                counts[_STAT_PUNCHES_LANDED] += 1
+                counts[base + 1] += 1
+                counts[_STAT_DAMAGE_DEALT] += damage_dealt
+
+    def __eq__(self, other):
+        if isinstance(other, FighterStats):
+            return self._counts == other._counts
+        return self.to_dict() == other
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+def can_afford_action(stamina: float, hp: int, action_type: ActionType) -> bool:
+    """Whether a fighter with this stamina/HP can start `action_type`."""
+    if action_type not in ACTION_DETAILS:
+        return True # For non-stamina costing actions like IDLE or movement (cost handled elsewhere if any)
+    action_cost = ACTION_DETAILS[action_type].get("stamina_cost", 0)
+    return stamina >= action_cost and hp > 0
+
+
 # --- Helper function for fighter stats ---
-def create_empty_fighter_stats():
-    return {
-        "punches_thrown": 0,
-        "punches_landed": 0,
-        "damage_dealt": 0,
-        ActionType.JAB: {"thrown": 0, "landed": 0},
-        ActionType.CROSS: {"thrown": 0, "landed": 0},
-        ActionType.HOOK: {"thrown": 0, "landed": 0},
-        ActionType.UPPERCUT: {"thrown": 0, "landed": 0},
-        "knockdowns_scored": 0
-    }
+def create_empty_fighter_stats() -> FighterStats:
+    return FighterStats()
 
 # --- Classes ---
 class Fighter:
+    __slots__ = ("name", "hp", "max_hp", "stamina", "max_stamina", "knockdowns_this_round",
+                 "total_knockdowns", "current_action", "action_start_time", "stats", "round_scores")
+
     def __init__(self, name: FighterName):
         self.name = name
         self.hp = MAX_HP
@@ -92,10 +292,7 @@ class Fighter:
         return f"{self.name.value} (HP: {self.hp}/{self.max_hp}, SP: {self.stamina}/{self.max_stamina})"
 
     def can_perform_action(self, action_type: ActionType) -> bool:
-        if action_type not in ACTION_DETAILS:
-            return True # For non-stamina costing actions like IDLE or movement (cost handled elsewhere if any)
-        action_cost = ACTION_DETAILS[action_type].get("stamina_cost", 0)
-        return self.stamina >= action_cost and self.hp > 0
+        return can_afford_action(self.stamina, self.hp, action_type)
 
     def apply_damage(self, damage: int):
         self.hp = max(0, self.hp - damage)
@@ -109,20 +306,220 @@ class Fighter:
 
     def reset_for_new_round(self):
         self.knockdowns_this_round = 0
+        self.stats.start_round()
         # Stamina is regenerated by the game state logic between rounds typically
 
     def record_action_stat(self, action_type: ActionType, landed: bool, damage_dealt: int = 0):
-        self.stats["punches_thrown"] += 1
-        if action_type in [ActionType.JAB, ActionType.CROSS, ActionType.HOOK, ActionType.UPPERCUT]:
-            self.stats[action_type]["thrown"] += 1
-            if landed:
-                self.stats["punches_landed"] += 1
-                self.stats[action_type]["landed"] += 1
-                self.stats["damage_dealt"] += damage_dealt
+        self.stats.record(action_type, landed, damage_dealt)
+
+
+# --- Event log ---
+# Events are stored as (timestamp, code, *args) tuples and only turned into text when someone
+# reads them (API serialization, debug sink). Codes map to templates; args are the raw values
+# (enums are formatted via .value at render time).
+EVT_TEXT = "TEXT"
+EVT_ACTION = "ACTION"
+EVT_ACTION_FAILED = "ACTION_FAILED"
+EVT_MOVE = "MOVE"
+EVT_BLOCKED = "BLOCKED"
+EVT_LANDED = "LANDED"
+EVT_MISSED = "MISSED"
+EVT_KNOCKDOWN = "KNOCKDOWN"
+EVT_TKO = "TKO"
+EVT_KNOCKDOWN_COUNT = "KNOCKDOWN_COUNT"
+EVT_KNOCKOUT = "KNOCKOUT"
+EVT_GET_UP = "GET_UP"
+EVT_BLOCK_BROKE = "BLOCK_BROKE"
+EVT_PLAYER_BUSY = "PLAYER_BUSY"
+
+EVENT_TEMPLATES = {
+    EVT_TEXT: "{0}",
+    EVT_ACTION: "{0.value} uses {1.value} (Stamina: {2})",
+    EVT_ACTION_FAILED: "{0.value} tried {1.value} but couldn't (low stamina/HP).",
+    EVT_MOVE: "{0.value} performs {1.value}.",
+    EVT_BLOCKED: "{0.value} blocks the {1.value}!",
+    EVT_LANDED: "{0.value} from {1.value} lands! {2.value} HP: {3}",
+    EVT_MISSED: "{0.value} from {1.value} missed.",
+    EVT_KNOCKDOWN: "{0.value} is KNOCKED DOWN by {1.value}!",
+    EVT_TKO: "Three knockdowns in this round! {0.value} wins by TKO!",
+    EVT_KNOCKDOWN_COUNT: "Knockdown count: {0:.1f}",
+    EVT_KNOCKOUT: "{0.value} is KNOCKED OUT!",
+    EVT_GET_UP: "{0.value} beats the count and is back up (HP: {1})!",
+    EVT_BLOCK_BROKE: "{0.value} block broke due to low stamina.",
+    EVT_PLAYER_BUSY: "Player tried {0.value} but was busy with {1.value}",
+}
 
+# Opt-in debug output: a callable taking each formatted log line (e.g. print). Games pick up
+# the default when created; GameState(event_sink=...) overrides it per game.
+DEFAULT_EVENT_SINK = None
+
+
+def format_event(entry: tuple) -> str:
+    """Renders one (timestamp, code, *args) entry the way log lines have always looked."""
+    timestamp, code = entry[0], entry[1]
+    message = EVENT_TEMPLATES[code].format(*entry[2:])
+    if timestamp is None: # Text restored from storage already carries its timestamp
+        return message
+    return f"[{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))}] {message}"
+
+
+class EventLog:
+    """
+    Ring buffer of structured events. Reading it (indexing, slicing, iterating) yields the
+    formatted strings the old list held, so `game_state.event_log[-10:]` keeps working.
+    """
+    __slots__ = ("_entries", "total", "sink")
+
+    def __init__(self, sink=None, maxlen: int = EVENT_LOG_MAX):
+        self._entries = deque(maxlen=maxlen)
+        self.total = 0 # Events ever appended, including ones that fell off the buffer
+        self.sink = sink
+
+    def append(self, timestamp, code: str, *args):
+        entry = (timestamp, code) + args
+        self._entries.append(entry)
+        self.total += 1
+        if self.sink is not None:
+            self.sink(format_event(entry))
+
+    def extend_text(self, lines):
+        """Loads already-formatted lines (e.g. the event_log list of a stored game)."""
+        for line in lines:
+            self.append(None, EVT_TEXT, line)
+
+    def records(self) -> list:
+        """Raw (timestamp, code, args) tuples, oldest first."""
+        return [(entry[0], entry[1], entry[2:]) for entry in self._entries]
+
+    def tail(self, count: int) -> list:
+        """The last `count` events, formatted, oldest first."""
+        entries = self._entries
+        start = max(0, len(entries) - count)
+        return [format_event(entries[i]) for i in range(start, len(entries))]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [format_event(self._entries[i]) for i in range(*index.indices(len(self._entries)))]
+        return format_event(self._entries[index])
+
+    def __iter__(self):
+        return (format_event(entry) for entry in list(self._entries))
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class KnockdownInfo:
+    """Slotted replacement for the old knockdown_info dict; still supports info["count"] access."""
+    __slots__ = ("is_knockdown", "fighter_down", "count")
+
+    def __init__(self):
+        self.is_knockdown = False
+        self.fighter_down = None # FighterName
+        self.count = 0
+
+    def __getitem__(self, key: str):
+        if key not in KnockdownInfo.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value):
+        if key not in KnockdownInfo.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in KnockdownInfo.__slots__ else default
+
+    def to_dict(self) -> dict:
+        return {"is_knockdown": self.is_knockdown, "fighter_down": self.fighter_down, "count": self.count}
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+# --- Match timeline ---
+# Actions take time: a punch winds up, resolves at its impact (hit roll, block check, damage) and
+# then recovers. Each match keeps its pending events in a heap ordered by due time, and game_tick
+# runs the ones that are due, in order, instead of re-checking both fighters on every tick.
+# Between events a match only changes continuously (round clock, stamina regen and block drain,
+# knockdown count), and those values are computed from a snapshot taken at the last event (the
+# "anchor") instead of being accumulated tick by tick. Stepping a match in 0.1 s ticks, in one
+# 90 s step or from event to event therefore gives the same match.
+EV_IMPACT = 0 # A punch lands, is blocked or misses
+EV_RECOVER = 1 # The fighter's action is over: back to IDLE
+EV_BLOCK_BROKE = 2 # Block drain emptied the fighter's stamina before the hold ended
+EV_AI_THINK = 3 # The idle opponent picks its next action
+EV_ROUND_END = 4
+EV_ROUND_START = 5
+EV_KNOCKDOWN_COUNT = 6
+EV_KNOCKOUT = 7 # Only in timelines saved before fighters got up (EV_GET_UP)
+EV_GET_UP = 8
+_FIGHTER_EVENTS = frozenset((EV_IMPACT, EV_RECOVER, EV_BLOCK_BROKE))
+
+
+class MatchTimeline:
+    """
+    Pending events of one match, a heap of (due, seq, kind, arg, action) tuples: `arg` is the
+    fighter's side (0 player, 1 opponent) for fighter events and the count for knockdown counts.
+    """
+    __slots__ = ("events", "seq", "anchor_time", "anchor", "think_at")
 
-class GameState:
     def __init__(self):
+        self.events = []
+        self.seq = 0 # Tie-breaker: events due at the same time run in the order they were scheduled
+        self.anchor_time = 0.0
+        # (round_timer, between_rounds_timer, knockdown count, player stamina, opponent stamina) at
+        # anchor_time; None until the match first starts a round (or is loaded)
+        self.anchor = None
+        self.think_at = None # Due time of the one pending EV_AI_THINK that still counts
+
+    def schedule(self, due: float, kind: int, arg: int = -1, action: ActionType = None):
+        heapq.heappush(self.events, (due, self.seq, kind, arg, action))
+        self.seq += 1
+
+    def schedule_think(self, due: float):
+        """The opponent reconsiders at `due`, unless it already will earlier."""
+        if self.think_at is not None and self.think_at <= due:
+            return
+        self.think_at = due
+        self.schedule(due, EV_AI_THINK)
+
+    def next_due(self):
+        return self.events[0][0] if self.events else None
+
+    def cancel(self, kinds=None, side: int = None):
+        """Drops pending events of the given kinds (all if None), only those of `side` if given."""
+        self.events = [event for event in self.events
+                       if not ((kinds is None or event[2] in kinds) and (side is None or event[3] == side))]
+        heapq.heapify(self.events)
+        if kinds is None or EV_AI_THINK in kinds:
+            self.think_at = None
+
+    def __len__(self):
+        return len(self.events)
+
+
+class GameState:
+    __slots__ = ("clock", "rng", "game_id", "match_status", "current_round", "max_rounds",
+                 "round_timer", "is_round_active", "between_rounds_timer", "winner", "player", "opponent",
+                 "knockdown_info", "event_log", "last_tick_time", "action_queue", "_action_queue_lock", "ai_profile",
+                 "journal", "timeline")
+
+    def __init__(self, clock=None, rng=None, event_sink=None, ai_profile=None):
+        # Injectable time source and RNG. Defaults are the wall clock and the module-level
+        # `random`, so live games behave as before; the headless simulator passes a
+        # simulated clock and a seeded random.Random for deterministic matches.
+        self.clock = clock if clock is not None else time.time
+        self.rng = rng if rng is not None else random
+
+        self.game_id = None # Assigned by the API layer
         self.match_status = GameStatus.PENDING
         self.current_round = 0
         self.max_rounds = MAX_ROUNDS
@@ -134,26 +531,47 @@ class GameState:
         self.player = Fighter(FighterName.PLAYER)
         self.opponent = Fighter(FighterName.OPPONENT) # Basic AI for now
 
-        self.knockdown_info = {
-            "is_knockdown": False,
-            "fighter_down": None, # FighterName
-            "count": 0
-        }
-        self.event_log = []
+        self.knockdown_info = KnockdownInfo()
+        self.event_log = EventLog(sink=event_sink if event_sink is not None else DEFAULT_EVENT_SINK)
         self.last_tick_time = 0
 
+        # Player inputs waiting for the next game_tick. Owned by this game so concurrent
+        # requests for different games can't consume each other's actions. The deque is
+        # created on first use; most stored/idle matches never need one.
+        self.action_queue = None
+        self._action_queue_lock = threading.Lock()
+        self.ai_profile = ai_profile if ai_profile is not None else DEFAULT_AI_PROFILE # Key into AI_PROFILES
+        self.journal = None # Optional input recorder (boxing_replay.MatchJournal), fed by game_tick
+        self.timeline = MatchTimeline() # Pending action/round events; see "Match timeline"
+
     def __str__(self):
         return (f"Round: {self.current_round}/{self.max_rounds}, Timer: {self.round_timer:.1f}s, "
                 f"Status: {self.match_status.value}\n"
                 f"Player: {self.player}\nOpponent: {self.opponent}")
 
+    @timed("log_event")
+    def log(self, code: str, *args):
+        """Records a structured event (see EVENT_TEMPLATES); formatting is deferred until read."""
+        self.event_log.append(self.clock(), code, *args)
+
+    @timed("log_event")
     def log_event(self, message: str):
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-        log_entry = f"[{timestamp}] {message}"
-        print(log_entry) # For real-time feedback during development
-        self.event_log.append(log_entry)
-        if len(self.event_log) > 100: # Keep log from growing too large
-            self.event_log.pop(0)
+        """Records a free-form message. Prefer log() with an event code on hot paths."""
+        self.event_log.append(self.clock(), EVT_TEXT, message)
+
+    def queue_player_action(self, action: ActionType):
+        """Thread-safe: queues a player action for the next tick (oldest dropped when full)."""
+        with self._action_queue_lock:
+            if self.action_queue is None:
+                self.action_queue = deque(maxlen=PLAYER_ACTION_QUEUE_MAX)
+            self.action_queue.append(action)
+
+    def pop_player_action(self):
+        """Thread-safe: returns the oldest queued player action, or None if there is none."""
+        if not self.action_queue: # Unlocked fast path; a racing enqueue is picked up next tick
+            return None
+        with self._action_queue_lock:
+            return self.action_queue.popleft() if self.action_queue else None
 
     def get_fighter_by_name(self, name: FighterName) -> Fighter:
         if name == FighterName.PLAYER:
@@ -169,6 +587,7 @@ if __name__ == '__main__':
     # Test class instantiation
     player = Fighter(FighterName.PLAYER)
     opponent = Fighter(FighterName.OPPONENT)
+    DEFAULT_EVENT_SINK = print # Echo log lines while running these demos
     game = GameState()
     print(player)
     print(opponent)
@@ -182,89 +601,128 @@ if __name__ == '__main__':
 
 # --- Core Game Mechanics ---
 
-def initialize_new_game() -> GameState:
-    """Creates and returns a fresh GameState instance."""
-    game = GameState()
+def initialize_new_game(clock=None, rng=None, event_sink=None, ai_profile=None) -> GameState:
+    """Creates and returns a fresh GameState instance.
+
+    `clock` (a zero-argument callable returning seconds) and `rng` (a random.Random-like
+    object) default to the wall clock and the module-level `random`. `event_sink` receives
+    each formatted log line (e.g. print) for debugging. `ai_profile` names the opponent's
+    behaviour in AI_PROFILES (default DEFAULT_AI_PROFILE); unknown names raise KeyError.
+    """
+    if ai_profile is not None and ai_profile not in AI_PROFILES:
+        raise KeyError(f"Unknown AI profile: {ai_profile}")
+    game = GameState(clock=clock, rng=rng, event_sink=event_sink, ai_profile=ai_profile)
     game.log_event("New game initialized.")
-    # Potential further setup: e.g., set opponent AI profile if we have different types
     return game
 
-def execute_fighter_action(game_state: GameState, attacker_name: FighterName, action_type: ActionType):
+def action_timing(action_type: ActionType):
+    """(wind-up, recovery) seconds of a punch, from its ACTION_DETAILS speed."""
+    speed = ACTION_DETAILS[action_type]["speed"]
+    windup = WINDUP_SECONDS_PER_SPEED / speed
+    return windup, ACTION_WINDOW_SECONDS - windup
+
+@timed("execute_fighter_action")
+def execute_fighter_action(game_state: GameState, attacker_name: FighterName, action_type: ActionType,
+                           now: float = None):
     """
-    Handles the execution of an action by a fighter (player or opponent).
-    Updates game state based on the action (damage, stamina, stats, knockdowns).
+    Starts an action by a fighter (player or opponent) at time `now` (default: the last tick).
+    Stamina is spent and the attempt counted right away; a punch resolves at its impact event
+    (see resolve_impact) and every action ends with a recovery event on the match timeline.
     """
+    now = game_state.last_tick_time if now is None else now
     attacker = game_state.get_fighter_by_name(attacker_name)
-    defender_name = FighterName.OPPONENT if attacker_name == FighterName.PLAYER else FighterName.PLAYER
-    defender = game_state.get_fighter_by_name(defender_name)
+    side = 0 if attacker_name == FighterName.PLAYER else 1
+    timeline = game_state.timeline
 
     if not attacker.can_perform_action(action_type):
-        game_state.log_event(f"{attacker.name.value} tried {action_type.value} but couldn't (low stamina/HP).")
+        game_state.log(EVT_ACTION_FAILED, attacker.name, action_type)
         attacker.current_action = ActionType.IDLE # Ensure action is reset
         return
 
     action_info = ACTION_DETAILS.get(action_type)
     if not action_info: # Movement or other non-combat actions
         attacker.current_action = action_type
-        game_state.log_event(f"{attacker.name.value} performs {action_type.value}.")
+        attacker.action_start_time = now
+        game_state.log(EVT_MOVE, attacker.name, action_type)
         # Movement logic would be handled separately if it has specific effects on distance, etc.
-        # For now, just log and set current_action. Stamina cost for movement can be added.
+        # For now, just log, hold the action for MOVE_SECONDS. Stamina cost for movement can be added.
+        timeline.schedule(now + MOVE_SECONDS, EV_RECOVER, side, action_type)
         return
 
-    attacker.consume_stamina(action_info["stamina_cost"])
+    attacker.consume_stamina(action_info.get("stamina_cost", 0)) # BLOCK has no upfront cost
     attacker.current_action = action_type
-    attacker.action_start_time = time.time() # For timed actions like block
+    # The tick's (or event's) time rather than a fresh clock read, so a match is a function of
+    # its tick times alone (see boxing_replay.py).
+    attacker.action_start_time = now
 
-    game_state.log_event(f"{attacker.name.value} uses {action_type.value} (Stamina: {attacker.stamina})")
+    game_state.log(EVT_ACTION, attacker.name, action_type, attacker.stamina)
     attacker.record_action_stat(action_type, landed=False) # Initially record as thrown
 
-    is_blocked = defender.current_action == ActionType.BLOCK
-    # Basic hit chance calculation
-    hit_roll = random.random()
-    accuracy = action_info.get("accuracy", 0) # Default to 0 if no accuracy defined (e.g. for block)
-
-    if action_type in [ActionType.JAB, ActionType.CROSS, ActionType.HOOK, ActionType.UPPERCUT]:
-        if is_blocked:
-            game_state.log_event(f"{defender.name.value} blocks the {action_type.value}!")
-            defender.consume_stamina(ACTION_DETAILS[ActionType.BLOCK]["stamina_cost_on_hit"])
-            # Potentially reduced "chip" damage even on block, or guard break mechanic later
-            # For now, block negates damage fully.
-            attacker.record_action_stat(action_type, landed=False) # Update: it was blocked, not landed on target HP
-        elif hit_roll < accuracy:
-            damage = action_info["damage"]
-            defender.apply_damage(damage)
-            attacker.record_action_stat(action_type, landed=True, damage_dealt=damage) # Update: landed
-            game_state.log_event(
-                f"{action_type.value} from {attacker.name.value} lands! "
-                f"{defender.name.value} HP: {defender.hp}"
-            )
-            if defender.hp <= 0:
-                handle_knockdown(game_state, defender_name, attacker_name)
-        else:
-            game_state.log_event(f"{action_type.value} from {attacker.name.value} missed.")
-            attacker.record_action_stat(action_type, landed=False) # Update: missed
-
+    if action_type in PUNCH_TYPES:
+        windup, _ = action_timing(action_type)
+        timeline.schedule(now + windup, EV_IMPACT, side, action_type)
     elif action_type == ActionType.BLOCK:
-        # Block is a state. Its effect happens when an opponent attacks.
-        # Stamina drain while active blocking can be handled in game_tick.
-        pass
+        # Block is a state: its effect happens when an opponent's punch lands (resolve_impact).
+        # It's held for BLOCK_HOLD_SECONDS unless the drain empties the fighter's stamina first.
+        hold = BLOCK_HOLD_SECONDS
+        net_drain = ACTION_DETAILS[ActionType.BLOCK]["stamina_cost_active_drain"] - STAMINA_REGEN_PER_SECOND
+        if net_drain > 0 and attacker.stamina / net_drain < hold:
+            timeline.schedule(now + attacker.stamina / net_drain, EV_BLOCK_BROKE, side, action_type)
+        else:
+            timeline.schedule(now + hold, EV_RECOVER, side, action_type)
     elif action_type == ActionType.DODGE:
         # Dodge effect: if opponent attacks during dodge window, it's a miss.
         # Could also set up a counter-attack window.
-        pass
-
-    # Reset attacker's action to IDLE after a short duration for non-continuous actions
-    # Continuous actions like BLOCK will be managed by their own logic or by game_tick
-    if action_type not in [ActionType.BLOCK]: # Block might persist
-         # This is a simplification; in a real-time game, actions have durations.
-         # For now, assume offensive actions are somewhat instant for turn-based processing.
+        timeline.schedule(now + DODGE_SECONDS, EV_RECOVER, side, action_type)
+    else: # IDLE
         attacker.current_action = ActionType.IDLE
+    _anchor(game_state, now) # Stamina was spent
 
 
-def handle_knockdown(game_state: GameState, downed_fighter_name: FighterName, attacker_name: FighterName):
-    """Manages the knockdown sequence."""
-    if game_state.knockdown_info["is_knockdown"]: # Another knockdown already in progress
+def resolve_impact(game_state: GameState, attacker_name: FighterName, action_type: ActionType, now: float):
+    """A punch's impact: blocked, landed (maybe a knockdown) or missed, then the attacker recovers."""
+    attacker = game_state.get_fighter_by_name(attacker_name)
+    defender_name = FighterName.OPPONENT if attacker_name == FighterName.PLAYER else FighterName.PLAYER
+    defender = game_state.get_fighter_by_name(defender_name)
+    action_info = ACTION_DETAILS[action_type]
+
+    # Guard up at the moment of impact, and already up when the punch was thrown: a guard raised
+    # during the wind-up (the AI sees it start) would block every punch on reaction.
+    is_blocked = (defender.current_action == ActionType.BLOCK
+                  and defender.action_start_time < attacker.action_start_time)
+    # Basic hit chance calculation
+    hit_roll = game_state.rng.random()
+    accuracy = action_info.get("accuracy", 0)
+
+    if is_blocked:
+        game_state.log(EVT_BLOCKED, defender.name, action_type)
+        defender.consume_stamina(ACTION_DETAILS[ActionType.BLOCK]["stamina_cost_on_hit"])
+        # Potentially reduced "chip" damage even on block, or guard break mechanic later
+        # For now, block negates damage fully.
+        attacker.record_action_stat(action_type, landed=False) # Update: it was blocked, not landed on target HP
+    elif hit_roll < accuracy:
+        damage = action_info["damage"]
+        defender.apply_damage(damage)
+        attacker.record_action_stat(action_type, landed=True, damage_dealt=damage) # Update: landed
+        game_state.log(EVT_LANDED, action_type, attacker.name, defender.name, defender.hp)
+        if defender.hp <= 0:
+            handle_knockdown(game_state, defender_name, attacker_name, now)
+            return # The knockdown cleared the timeline; nobody recovers into a count
+    else:
+        game_state.log(EVT_MISSED, action_type, attacker.name)
+        attacker.record_action_stat(action_type, landed=False) # Update: missed
+
+    _, recovery = action_timing(action_type)
+    game_state.timeline.schedule(now + recovery, EV_RECOVER, 0 if attacker_name == FighterName.PLAYER else 1,
+                                 action_type)
+
+
+def handle_knockdown(game_state: GameState, downed_fighter_name: FighterName, attacker_name: FighterName,
+                     now: float = None):
+    """Manages the knockdown sequence: the round stops and the count runs on the timeline."""
+    if game_state.knockdown_info.is_knockdown: # Another knockdown already in progress
         return
+    now = game_state.last_tick_time if now is None else now
 
     downed_fighter = game_state.get_fighter_by_name(downed_fighter_name)
     attacker = game_state.get_fighter_by_name(attacker_name)
@@ -273,23 +731,178 @@ def handle_knockdown(game_state: GameState, downed_fighter_name: FighterName, at
     downed_fighter.total_knockdowns += 1
     attacker.stats["knockdowns_scored"] += 1
 
-    game_state.knockdown_info["is_knockdown"] = True
-    game_state.knockdown_info["fighter_down"] = downed_fighter_name
-    game_state.knockdown_info["count"] = 0
+    game_state.knockdown_info.is_knockdown = True
+    game_state.knockdown_info.fighter_down = downed_fighter_name
+    game_state.knockdown_info.count = 0
     game_state.is_round_active = False # Pause round during knockdown count
 
-    game_state.log_event(f"{downed_fighter.name.value} is KNOCKED DOWN by {attacker.name.value}!")
+    game_state.log(EVT_KNOCKDOWN, downed_fighter.name, attacker.name)
+
+    # Punches in flight, the round clock and the AI stop; the count takes over
+    timeline = game_state.timeline
+    timeline.cancel()
+    game_state.player.current_action = ActionType.IDLE
+    game_state.opponent.current_action = ActionType.IDLE
 
     # TKO Check: 3 knockdowns in a round
     if downed_fighter.knockdowns_this_round >= 3:
-        game_state.log_event(f"Three knockdowns in this round! {attacker.name.value} wins by TKO!")
+        game_state.log(EVT_TKO, attacker.name)
         game_state.winner = attacker.name
-        # game_state.match_status = GameStatus.MATCH_OVER # This will be set by end_match
-        # end_match(game_state) # This might be called from game_tick or a managing function
-        return # Match ends here due to TKO
+        end_match(game_state) # Match ends here due to TKO
+        return
+
+    # The count runs on the timeline: EV_KNOCKDOWN_COUNT each second, then EV_GET_UP.
+    for count in range(1, KNOCKDOWN_GET_UP_COUNT):
+        timeline.schedule(now + count, EV_KNOCKDOWN_COUNT, count)
+    timeline.schedule(now + KNOCKDOWN_GET_UP_COUNT, EV_GET_UP)
+    _anchor(game_state, now)
+
+def beat_the_count(game_state: GameState, now: float):
+    """The downed fighter gets up with KNOCKDOWN_GET_UP_HP and the round resumes where it stopped."""
+    knockdown_info = game_state.knockdown_info
+    fighter = game_state.get_fighter_by_name(knockdown_info.fighter_down)
+    fighter.hp = max(fighter.hp, KNOCKDOWN_GET_UP_HP)
+    game_state.log(EVT_GET_UP, fighter.name, fighter.hp)
+    knockdown_info.is_knockdown = False
+    knockdown_info.fighter_down = None
+    knockdown_info.count = 0
+    game_state.is_round_active = True
+    timeline = game_state.timeline
+    timeline.schedule(now + game_state.round_timer, EV_ROUND_END) # The round clock stood still during the count
+    _anchor(game_state, now)
+    timeline.schedule_think(now)
+
+# --- Running the timeline ---
+
+def _anchor(game_state: GameState, now: float):
+    """Snapshots the continuously changing values at `now`; see _advance_continuous."""
+    timeline = game_state.timeline
+    timeline.anchor_time = now
+    timeline.anchor = (game_state.round_timer, game_state.between_rounds_timer, game_state.knockdown_info.count,
+                       game_state.player.stamina, game_state.opponent.stamina)
+
+def _stamina_at(fighter: Fighter, anchored: float, elapsed: float):
+    if fighter.hp <= 0: # Cannot regenerate if knocked out
+        return anchored
+    rate = STAMINA_REGEN_PER_SECOND
+    if fighter.current_action == ActionType.BLOCK: # Active block drain
+        rate -= ACTION_DETAILS[ActionType.BLOCK]["stamina_cost_active_drain"]
+    if rate >= 0:
+        return min(fighter.max_stamina, anchored + rate * elapsed)
+    return max(0, anchored + rate * elapsed)
+
+def _advance_continuous(game_state: GameState, now: float):
+    """
+    Sets the round clock, stamina and knockdown count to their values at `now`, computed from
+    the anchor rather than accumulated, so the result doesn't depend on how often this is called.
+    """
+    timeline = game_state.timeline
+    anchor = timeline.anchor
+    if anchor is None:
+        return
+    elapsed = now - timeline.anchor_time
+    if elapsed <= 0:
+        return
+    round_timer, between_rounds_timer, count, player_stamina, opponent_stamina = anchor
+    if game_state.knockdown_info.is_knockdown:
+        game_state.knockdown_info.count = count + elapsed
+    elif game_state.is_round_active:
+        game_state.round_timer = round_timer - elapsed
+        game_state.player.stamina = _stamina_at(game_state.player, player_stamina, elapsed)
+        game_state.opponent.stamina = _stamina_at(game_state.opponent, opponent_stamina, elapsed)
+    elif game_state.match_status == GameStatus.BETWEEN_ROUNDS:
+        game_state.between_rounds_timer = between_rounds_timer - elapsed
+
+def _opponent_think(game_state: GameState, now: float):
+    """The idle opponent picks an action now; if it chooses to wait, it reconsiders later."""
+    timeline = game_state.timeline
+    timeline.think_at = None # Any think still queued is superseded
+    if game_state.opponent.current_action != ActionType.IDLE or not game_state.is_round_active:
+        return
+    ai_action_choice = decide_ai_action(game_state)
+    if ai_action_choice != ActionType.IDLE:
+        execute_fighter_action(game_state, FighterName.OPPONENT, ai_action_choice, now)
+    else:
+        timeline.schedule_think(now + AI_THINK_SECONDS)
+
+def _run_event(game_state: GameState, due: float, kind: int, arg: int, action: ActionType):
+    if kind in _FIGHTER_EVENTS:
+        name = FighterName.PLAYER if arg == 0 else FighterName.OPPONENT
+        if kind == EV_IMPACT:
+            resolve_impact(game_state, name, action, due)
+            return
+        game_state.get_fighter_by_name(name).current_action = ActionType.IDLE
+        if kind == EV_BLOCK_BROKE:
+            game_state.log(EVT_BLOCK_BROKE, name)
+            if arg == 1: # Out of stamina: a guard raised again at once would break at the same instant
+                game_state.timeline.schedule_think(due + AI_THINK_SECONDS)
+                return
+        if game_state.opponent.current_action == ActionType.IDLE:
+            # The opponent is free again, or sees the player drop their guard / finish a punch
+            _opponent_think(game_state, due)
+    elif kind == EV_AI_THINK:
+        if due == game_state.timeline.think_at:
+            _opponent_think(game_state, due)
+    elif kind == EV_ROUND_END:
+        finish_round_by_time(game_state, due)
+    elif kind == EV_ROUND_START:
+        start_new_round(game_state, now=due)
+    elif kind == EV_KNOCKDOWN_COUNT:
+        game_state.knockdown_info.count = float(arg)
+        game_state.log(EVT_KNOCKDOWN_COUNT, game_state.knockdown_info.count)
+    elif kind == EV_GET_UP:
+        game_state.knockdown_info.count = float(KNOCKDOWN_GET_UP_COUNT)
+        game_state.log(EVT_KNOCKDOWN_COUNT, game_state.knockdown_info.count)
+        beat_the_count(game_state, due)
+    elif kind == EV_KNOCKOUT:
+        game_state.knockdown_info.count = float(KNOCKDOWN_COUNT_MAX)
+        game_state.log(EVT_KNOCKDOWN_COUNT, game_state.knockdown_info.count)
+        finish_knockout(game_state)
+
+def advance_match(game_state: GameState, until: float):
+    """Runs every event due by `until`, in order, then brings the continuous values up to `until`."""
+    timeline = game_state.timeline
+    while timeline.events and timeline.events[0][0] <= until:
+        due, _, kind, arg, action = heapq.heappop(timeline.events)
+        _advance_continuous(game_state, due)
+        _run_event(game_state, due, kind, arg, action)
+        if game_state.match_status == GameStatus.MATCH_OVER:
+            return
+        _anchor(game_state, due)
+    _advance_continuous(game_state, until)
+
+def next_event_time(game_state: GameState):
+    """When the match next changes other than continuously (None if nothing is scheduled)."""
+    return game_state.timeline.next_due()
+
+def rebuild_timeline(game_state: GameState) -> GameState:
+    """
+    Reconstructs the timeline of a game loaded from a format that didn't store one (dict items,
+    snapshots before v5), as of its last_tick_time: the round clock and knockdown count resume,
+    and fighters caught mid-action are back to IDLE as soon as the match is next ticked.
+    """
+    timeline = game_state.timeline = MatchTimeline()
+    if game_state.match_status in (GameStatus.PENDING, GameStatus.MATCH_OVER):
+        return game_state
+    now = game_state.last_tick_time
+    knockdown_info = game_state.knockdown_info
+    if knockdown_info.is_knockdown:
+        counted = int(knockdown_info.count)
+        for count in range(counted + 1, KNOCKDOWN_GET_UP_COUNT):
+            timeline.schedule(now + count - knockdown_info.count, EV_KNOCKDOWN_COUNT, count)
+        timeline.schedule(now + max(0.0, KNOCKDOWN_GET_UP_COUNT - knockdown_info.count), EV_GET_UP)
+    elif game_state.is_round_active:
+        timeline.schedule(now + game_state.round_timer, EV_ROUND_END)
+        for side, fighter in enumerate((game_state.player, game_state.opponent)):
+            if fighter.current_action != ActionType.IDLE:
+                timeline.schedule(now, EV_RECOVER, side, fighter.current_action)
+        if game_state.opponent.current_action == ActionType.IDLE:
+            timeline.schedule_think(now)
+    elif game_state.match_status == GameStatus.BETWEEN_ROUNDS:
+        timeline.schedule(now + game_state.between_rounds_timer, EV_ROUND_START)
+    _anchor(game_state, now)
+    return game_state
 
-    # The actual 10-count will be managed by game_tick or a similar time-based update function.
-    # For now, this function sets up the state for that.
 
 if __name__ == '__main__':
     # ... (previous test code remains) ...
@@ -297,11 +910,17 @@ if __name__ == '__main__':
     game = initialize_new_game()
     print(game)
 
+    def resolve(game):
+        """Runs the punches just thrown through impact and recovery."""
+        advance_match(game, game.last_tick_time + 1.0)
+
     # Player Jabs Opponent
     execute_fighter_action(game, FighterName.PLAYER, ActionType.JAB)
+    resolve(game)
     print(game)
     # Opponent Jabs Player
     execute_fighter_action(game, FighterName.OPPONENT, ActionType.JAB)
+    resolve(game)
     print(game)
 
     # Player blocks, Opponent Jabs
@@ -309,6 +928,7 @@ if __name__ == '__main__':
     game.player.action_start_time = time.time()
     game.log_event(f"{game.player.name.value} is now blocking.")
     execute_fighter_action(game, FighterName.OPPONENT, ActionType.JAB)
+    resolve(game)
     print(game)
     game.player.current_action = ActionType.IDLE # Reset block
 
@@ -316,6 +936,7 @@ if __name__ == '__main__':
     game.opponent.hp = ACTION_DETAILS[ActionType.CROSS]["damage"] # Set HP to be knocked out by one cross
     game.log_event(f"Setting opponent HP to {game.opponent.hp} for knockdown test.")
     execute_fighter_action(game, FighterName.PLAYER, ActionType.CROSS)
+    resolve(game)
     print(game)
     print(f"Knockdown info: {game.knockdown_info}")
     if game.winner:
@@ -323,8 +944,8 @@ if __name__ == '__main__':
 
 # --- Round and Match Progression ---
 
-def start_new_round(game_state: GameState):
-    """Initializes settings for the start of a new round."""
+def start_new_round(game_state: GameState, now: float = None):
+    """Initializes settings for the start of a new round (at `now`, default the clock's time)."""
     game_state.current_round += 1
     game_state.is_round_active = True
     game_state.match_status = GameStatus.ACTIVE
@@ -337,14 +958,20 @@ def start_new_round(game_state: GameState):
     game_state.player.regenerate_stamina(STAMINA_REGEN_BETWEEN_ROUNDS)
     game_state.opponent.regenerate_stamina(STAMINA_REGEN_BETWEEN_ROUNDS)
 
-    game_state.knockdown_info["is_knockdown"] = False # Ensure no carry-over knockdown state
-    game_state.knockdown_info["fighter_down"] = None
-    game_state.knockdown_info["count"] = 0
+    game_state.knockdown_info.is_knockdown = False # Ensure no carry-over knockdown state
+    game_state.knockdown_info.fighter_down = None
+    game_state.knockdown_info.count = 0
 
     game_state.log_event(
         f"Round {game_state.current_round} starting! Player SP: {game_state.player.stamina}, Opponent SP: {game_state.opponent.stamina}"
     )
-    game_state.last_tick_time = time.time() # Reset tick timer for the new round
+    now = game_state.clock() if now is None else now
+    game_state.last_tick_time = now # Reset tick timer for the new round
+    timeline = game_state.timeline
+    timeline.cancel()
+    timeline.schedule(now + game_state.round_timer, EV_ROUND_END)
+    _anchor(game_state, now)
+    timeline.schedule_think(now) # The opponent's opening move
 
 def end_round_due_to_time(game_state: GameState):
     """Handles the end of a round when the timer expires."""
@@ -365,6 +992,7 @@ def end_match(game_state: GameState):
     """Finalizes the match, determining a winner if not already set by KO/TKO."""
     game_state.is_round_active = False # Ensure no further actions
     game_state.match_status = GameStatus.MATCH_OVER
+    game_state.timeline.cancel()
 
     if game_state.winner: # Winner already determined by KO/TKO
         game_state.log_event(f"Match ended. Winner by KO/TKO: {game_state.winner.value}")
@@ -381,89 +1009,28 @@ def end_match(game_state: GameState):
 def score_round(game_state: GameState):
     """
     Scores the completed round based on performance (simplified for now).
-    Uses a 10-point must system.
+    Uses a 10-point must system: the round winner (more damage dealt *in this round*, from the
+    per-round stat snapshots) gets 10, the loser 9; knockdowns suffered cost a point each, min 7.
     """
-    player_score = 0
-    opponent_score = 0
-
-    # Simplified criteria: damage dealt. More complex: punches landed, aggression, defense.
-    # For this example, let's assume we need to sum damage dealt *in this specific round*.
-    # The current stats are cumulative, so this needs refinement if we want per-round exactness for scoring.
-    # For now, we'll use total damage as a proxy.
-
-    # This is a placeholder. Proper round scoring would require tracking stats per round.
-    # Let's use a proxy: whoever has more HP at the end of the round, or dealt more relative damage.
-    # Or, more simply, award based on knockdowns primarily.
-
-    if game_state.player.stats["damage_dealt"] > game_state.opponent.stats["damage_dealt"]: # Placeholder for actual round performance
-        player_score = 10
-        opponent_score = 9
-    elif game_state.opponent.stats["damage_dealt"] > game_state.player.stats["damage_dealt"]:
-        opponent_score = 10
-        player_score = 9
-    else: # Equal performance or no clear winner based on this simple metric
-        player_score = 10 # Could be 9-9 for some judging styles for an even round
-        opponent_score = 10
-
-    # Adjust for knockdowns in the round
-    # Player knocked down opponent
-    player_knockdowns_on_opponent = game_state.opponent.knockdowns_this_round
-    # opponent_knockdowns_on_player = game_state.player.knockdowns_this_round
-
-    # This logic is a bit confusing. Let's simplify:
-    # If player scored knockdowns, opponent score is reduced.
-    # If opponent scored knockdowns, player score is reduced.
-
-    # Score for player: 10 (base if won round) or 9 (base if lost round)
-    # Score for opponent: 10 (base if won round) or 9 (base if lost round)
-
-    # Example: if player won the round (10-9), but was knocked down once, it becomes 9-9.
-    # If player won round (10-9) and knocked opponent down once, it becomes 10-8 for player.
-
-    # Let's use a simpler direct assignment based on who did better, then adjust.
-    # Assume player_score and opponent_score are initially 0.
-    # The "10-point must" system: winner of round gets 10, loser gets 9.
-    # Exception: if loser is knocked down, they get 8. If knocked down twice, 7.
-
-    # Simplified scoring:
-    # 1. Determine round winner (e.g. based on damage, aggression - very basic for now)
-    p_round_damage = game_state.player.stats["damage_dealt"] # This is total, not per-round, needs fixing for real scoring
-    o_round_damage = game_state.opponent.stats["damage_dealt"]
-
-    round_winner = None
-    if p_round_damage > o_round_damage : round_winner = game_state.player
-    elif o_round_damage > p_round_damage : round_winner = game_state.opponent
-
-    if round_winner == game_state.player:
-        player_score = 10
-        opponent_score = 9 - game_state.opponent.knockdowns_this_round # if opponent was knocked down
-        if game_state.opponent.knockdowns_this_round > 0 : opponent_score = max(7, 9 - game_state.opponent.knockdowns_this_round) # Min score usually 7
-        else: opponent_score = 9
-        if game_state.player.knockdowns_this_round > 0: # If player won round but was also knocked down
-            player_score = max(7, 10 - game_state.player.knockdowns_this_round)
-
-    elif round_winner == game_state.opponent:
-        opponent_score = 10
-        player_score = 9 - game_state.player.knockdowns_this_round # if player was knocked down
-        if game_state.player.knockdowns_this_round > 0: player_score = max(7, 9 - game_state.player.knockdowns_this_round)
-        else: player_score = 9
-        if game_state.opponent.knockdowns_this_round > 0: # If opponent won round but was also knocked down
-            opponent_score = max(7, 10 - game_state.opponent.knockdowns_this_round)
+    player, opponent = game_state.player, game_state.opponent
+    p_round_damage = player.stats.this_round("damage_dealt")
+    o_round_damage = opponent.stats.this_round("damage_dealt")
+
+    if p_round_damage > o_round_damage:
+        player_score = max(7, 10 - player.knockdowns_this_round) # Won the round, but may have been down too
+        opponent_score = max(7, 9 - opponent.knockdowns_this_round)
+    elif o_round_damage > p_round_damage:
+        opponent_score = max(7, 10 - opponent.knockdowns_this_round)
+        player_score = max(7, 9 - player.knockdowns_this_round)
     else: # Even round
-        player_score = 10 - game_state.player.knockdowns_this_round
-        opponent_score = 10 - game_state.opponent.knockdowns_this_round
-        player_score = max(7, player_score)
-        opponent_score = max(7, opponent_score)
+        player_score = max(7, 10 - player.knockdowns_this_round)
+        opponent_score = max(7, 10 - opponent.knockdowns_this_round)
 
-
-    game_state.player.round_scores.append(player_score)
-    game_state.opponent.round_scores.append(opponent_score)
+    player.round_scores.append(player_score)
+    opponent.round_scores.append(opponent_score)
     game_state.log_event(
         f"Round {game_state.current_round} scored: Player {player_score}, Opponent {opponent_score}"
     )
-    # Crucially, for accurate round-by-round scoring, stats like damage_dealt
-    # would need to be reset or snapshotted at the start/end of each round.
-    # The current Fighter.stats are cumulative for the whole match.
 
 def determine_winner_by_decision(game_state: GameState):
     """Determines the winner based on accumulated round scores."""
@@ -520,13 +1087,15 @@ if __name__ == '__main__':
 
 # --- Basic AI Logic ---
 
-def decide_ai_action(game_state: GameState) -> ActionType:
+def ai_candidate_actions(opponent_stamina: float, opponent_hp: int, player_hp: int,
+                         player_action: ActionType) -> list:
     """
-    Simple AI decision-making logic for the opponent.
-    Returns an ActionType for the opponent to perform.
+    The opponent's weighted candidate actions for one decision (duplicates act as weights).
+    Pure function of the fighters' numbers so the batch engine can share it.
+    An empty list means the AI stays IDLE.
     """
-    opponent = game_state.opponent
-    player = game_state.player
+    def can(action_type):
+        return can_afford_action(opponent_stamina, opponent_hp, action_type)
 
     # Very basic AI:
     # 1. If low stamina, try to rest (IDLE) or throw a quick jab if possible.
@@ -536,50 +1105,212 @@ def decide_ai_action(game_state: GameState) -> ActionType:
 
     possible_actions = []
 
-    if not opponent.can_perform_action(ActionType.JAB) and \
-       not opponent.can_perform_action(ActionType.CROSS) and \
-       not opponent.can_perform_action(ActionType.BLOCK): # Cannot do much
-        return ActionType.IDLE # Conserve stamina or is stunned/unable
+    if not can(ActionType.JAB) and not can(ActionType.CROSS) and not can(ActionType.BLOCK): # Cannot do much
+        return possible_actions # Conserve stamina or is stunned/unable
 
     # Stamina considerations
-    if opponent.stamina < ACTION_DETAILS[ActionType.CROSS]["stamina_cost"]: # Not enough for a cross
-        if opponent.can_perform_action(ActionType.JAB):
+    if opponent_stamina < ACTION_DETAILS[ActionType.CROSS]["stamina_cost"]: # Not enough for a cross
+        if can(ActionType.JAB):
             possible_actions.append(ActionType.JAB)
-        if opponent.can_perform_action(ActionType.BLOCK):
+        if can(ActionType.BLOCK):
              possible_actions.append(ActionType.BLOCK)
-        if not possible_actions: return ActionType.IDLE
-        return random.choice(possible_actions)
+        return possible_actions
 
     # Aggression if player is low HP
-    if player.hp < MAX_HP * 0.3: # Player is weak
-        if opponent.can_perform_action(ActionType.CROSS):
+    if player_hp < MAX_HP * 0.3: # Player is weak
+        if can(ActionType.CROSS):
             possible_actions.append(ActionType.CROSS)
-        if opponent.can_perform_action(ActionType.JAB):
+        if can(ActionType.JAB):
             possible_actions.append(ActionType.JAB)
 
     # Default actions
-    if opponent.can_perform_action(ActionType.JAB): possible_actions.append(ActionType.JAB)
-    if opponent.can_perform_action(ActionType.CROSS): possible_actions.append(ActionType.CROSS)
-    if opponent.can_perform_action(ActionType.HOOK): possible_actions.append(ActionType.HOOK) # Add hook if enough stamina
-    if opponent.can_perform_action(ActionType.UPPERCUT): possible_actions.append(ActionType.UPPERCUT) # Add uppercut
+    if can(ActionType.JAB): possible_actions.append(ActionType.JAB)
+    if can(ActionType.CROSS): possible_actions.append(ActionType.CROSS)
+    if can(ActionType.HOOK): possible_actions.append(ActionType.HOOK) # Add hook if enough stamina
+    if can(ActionType.UPPERCUT): possible_actions.append(ActionType.UPPERCUT) # Add uppercut
 
-    if opponent.can_perform_action(ActionType.BLOCK):
+    if can(ActionType.BLOCK):
         # Add block more frequently if player is aggressive or AI is defensive
-        if player.current_action not in [ActionType.IDLE, ActionType.BLOCK] or opponent.hp < MAX_HP * 0.5:
+        if player_action not in [ActionType.IDLE, ActionType.BLOCK] or opponent_hp < MAX_HP * 0.5:
             possible_actions.extend([ActionType.BLOCK] * 3) # Weight block higher
         else:
             possible_actions.append(ActionType.BLOCK)
 
     # Basic distance consideration (conceptual, as distance isn't fully implemented)
     # if distance_between_fighters > certain_threshold:
-    #     if opponent.can_perform_action(ActionType.ADVANCE): possible_actions.append(ActionType.ADVANCE)
+    #     if can(ActionType.ADVANCE): possible_actions.append(ActionType.ADVANCE)
     # else: # Close range
-    #     if opponent.can_perform_action(ActionType.UPPERCUT): possible_actions.append(ActionType.UPPERCUT)
-
-    if not possible_actions:
-        return ActionType.IDLE # Fallback if no other action is viable
+    #     if can(ActionType.UPPERCUT): possible_actions.append(ActionType.UPPERCUT)
+
+    return possible_actions
+
+
+# --- AI policy tables ---
+# An AI profile's candidate function only changes its answer when a number crosses a threshold:
+# an action's stamina cost, hp > 0, or a profile's own cut-offs (e.g. player below 30% HP). So
+# the (own stamina bucket, own HP bucket, player HP bucket, player action) space is small, and
+# each cell's weighted distribution is precomputed once per profile as an alias table. A decision
+# is then three bisects, one lookup and one rng.random(), with the same probabilities as picking
+# from the candidate list (but a different draw, so seeded matches don't replay older runs).
+# Tables are built on first use; call reset_ai_policy_tables() after changing ACTION_DETAILS.
+
+_HP_ABOVE_ZERO = math.nextafter(0.0, 1.0) # Smallest hp with hp > 0, as a ">= threshold"
+
+
+class AliasTable:
+    """Walker/Vose alias table: O(1) sampling of `outcomes` with the given weights."""
+    __slots__ = ("outcomes", "_probability", "_alias", "_size")
+
+    def __init__(self, weighted: dict):
+        self.outcomes = list(weighted)
+        size = len(self.outcomes)
+        total = sum(weighted.values())
+        scaled = [weighted[outcome] * size / total for outcome in self.outcomes]
+        self._probability = [1.0] * size
+        self._alias = list(range(size))
+        self._size = size
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            low, high = small.pop(), large.pop()
+            self._probability[low] = scaled[low]
+            self._alias[low] = high
+            scaled[high] -= 1.0 - scaled[low]
+            (small if scaled[high] < 1.0 else large).append(high)
+
+    def sample(self, rng):
+        """One rng.random() draw: its integer part picks a column, the fraction the coin flip."""
+        u = rng.random() * self._size
+        column = int(u)
+        return self.outcomes[column if u - column < self._probability[column] else self._alias[column]]
+
+    def probabilities(self) -> dict:
+        size = self._size
+        result = dict.fromkeys(self.outcomes, 0.0)
+        for column, outcome in enumerate(self.outcomes):
+            result[outcome] += self._probability[column] / size
+            result[self.outcomes[self._alias[column]]] += (1.0 - self._probability[column]) / size
+        return result
+
+
+class AIProfile:
+    """
+    A named AI behaviour. `candidates(own_stamina, own_hp, player_hp, player_action)` returns the
+    weighted candidate actions (a list where duplicates act as weights, like ai_candidate_actions;
+    empty means IDLE). It must only depend on the numbers through `>=` comparisons with action
+    stamina costs, hp > 0, and the thresholds listed here.
+    """
+    __slots__ = ("name", "candidates", "own_hp_thresholds", "player_hp_thresholds")
 
-    return random.choice(possible_actions)
+    def __init__(self, name: str, candidates, own_hp_thresholds=(), player_hp_thresholds=()):
+        self.name = name
+        self.candidates = candidates
+        self.own_hp_thresholds = tuple(own_hp_thresholds)
+        self.player_hp_thresholds = tuple(player_hp_thresholds)
+
+
+class AIPolicyTable:
+    """An AIProfile compiled into one alias table (or None for IDLE) per discretized state."""
+    __slots__ = ("profile", "_stamina_cuts", "_own_hp_cuts", "_player_hp_cuts", "_cells")
+
+    def __init__(self, profile: AIProfile):
+        self.profile = profile
+        costs = {details.get("stamina_cost", 0) for details in ACTION_DETAILS.values()}
+        self._stamina_cuts = sorted(costs) # Includes 0: even BLOCK needs stamina >= 0
+        self._own_hp_cuts = sorted({_HP_ABOVE_ZERO, *profile.own_hp_thresholds})
+        self._player_hp_cuts = sorted(set(profile.player_hp_thresholds))
+        self._cells = [[[self._compile(stamina, own_hp, player_hp)
+                         for player_hp in self._representatives(self._player_hp_cuts)]
+                        for own_hp in self._representatives(self._own_hp_cuts)]
+                       for stamina in self._representatives(self._stamina_cuts)]
+
+    @staticmethod
+    def _representatives(cuts: list) -> list:
+        """One value inside each bucket: below the first cut, then each cut itself."""
+        return [(cuts[0] - 1) if cuts else 0] + list(cuts)
+
+    def _compile(self, stamina, own_hp, player_hp) -> dict:
+        cell = {}
+        for player_action in ActionType:
+            weighted = {}
+            for action in self.profile.candidates(stamina, own_hp, player_hp, player_action):
+                weighted[action] = weighted.get(action, 0) + 1
+            cell[player_action] = AliasTable(weighted) if weighted else None
+        return cell
+
+    def cell(self, own_stamina: float, own_hp: float, player_hp: float, player_action: ActionType):
+        """The alias table for these numbers (None: the AI stays IDLE)."""
+        return self._cells[bisect.bisect_right(self._stamina_cuts, own_stamina)][
+            bisect.bisect_right(self._own_hp_cuts, own_hp)][
+            bisect.bisect_right(self._player_hp_cuts, player_hp)][player_action]
+
+    def sample(self, rng, own_stamina: float, own_hp: float, player_hp: float, player_action: ActionType) -> ActionType:
+        table = self.cell(own_stamina, own_hp, player_hp, player_action)
+        return table.sample(rng) if table is not None else ActionType.IDLE
+
+
+def _aggressive_candidates(own_stamina, own_hp, player_hp, player_action) -> list:
+    """Throws the heaviest affordable punches, blocks only when hurt."""
+    punches = [p for p in (ActionType.UPPERCUT, ActionType.HOOK, ActionType.CROSS, ActionType.JAB)
+               if can_afford_action(own_stamina, own_hp, p)]
+    candidates = [p for i, p in enumerate(punches) for _ in range(len(punches) - i)] # Heavier first, weighted up
+    if own_hp < MAX_HP * 0.3 and can_afford_action(own_stamina, own_hp, ActionType.BLOCK):
+        candidates.append(ActionType.BLOCK)
+    return candidates
+
+
+def _defensive_candidates(own_stamina, own_hp, player_hp, player_action) -> list:
+    """Blocks against anything but IDLE, counters with jabs/crosses, finishes a weak player."""
+    if own_hp <= 0:
+        return []
+    candidates = []
+    if player_action != ActionType.IDLE:
+        candidates.extend([ActionType.BLOCK] * 4)
+    for punch in (ActionType.JAB, ActionType.CROSS):
+        if can_afford_action(own_stamina, own_hp, punch):
+            candidates.append(punch)
+            if player_hp < MAX_HP * 0.3:
+                candidates.append(punch)
+    return candidates or [ActionType.BLOCK]
+
+
+AI_PROFILES = {}
+_AI_POLICY_TABLES = {} # profile name -> AIPolicyTable, built on first use
+
+
+def register_ai_profile(profile: AIProfile):
+    """Adds (or replaces) a profile; matches pick one by name (GameState.ai_profile)."""
+    AI_PROFILES[profile.name] = profile
+    _AI_POLICY_TABLES.pop(profile.name, None)
+
+
+def reset_ai_policy_tables():
+    """Drops compiled tables, e.g. after ACTION_DETAILS changed; they rebuild on next use."""
+    _AI_POLICY_TABLES.clear()
+
+
+def ai_policy_table(profile_name: str) -> AIPolicyTable:
+    table = _AI_POLICY_TABLES.get(profile_name)
+    if table is None:
+        table = _AI_POLICY_TABLES[profile_name] = AIPolicyTable(AI_PROFILES[profile_name])
+    return table
+
+
+register_ai_profile(AIProfile("classic", ai_candidate_actions, own_hp_thresholds=(MAX_HP * 0.5,),
+                              player_hp_thresholds=(MAX_HP * 0.3,)))
+register_ai_profile(AIProfile("aggressive", _aggressive_candidates, own_hp_thresholds=(MAX_HP * 0.3,)))
+register_ai_profile(AIProfile("defensive", _defensive_candidates, player_hp_thresholds=(MAX_HP * 0.3,)))
+
+
+@timed("decide_ai_action")
+def decide_ai_action(game_state: GameState) -> ActionType:
+    """
+    AI decision for the opponent, from the match's AI profile's precomputed policy table.
+    Returns an ActionType for the opponent to perform (IDLE if nothing is viable).
+    """
+    opponent = game_state.opponent
+    return ai_policy_table(game_state.ai_profile).sample(
+        game_state.rng, opponent.stamina, opponent.hp, game_state.player.hp, game_state.player.current_action)
 
 
 if __name__ == '__main__':
@@ -607,107 +1338,71 @@ if __name__ == '__main__':
 
 # --- Basic Game Loop Structure (for testing logic) ---
 
-PLAYER_ACTION_QUEUE = [] # Global queue for player actions, for testing game_tick
-
-def queue_player_action_for_tick(action: ActionType):
-    """Adds a player action to the queue for game_tick to process."""
-    PLAYER_ACTION_QUEUE.append(action)
-
+def queue_player_action_for_tick(game_state: GameState, action: ActionType):
+    """Adds a player action to the game's own queue for game_tick to process."""
+    game_state.queue_player_action(action)
+
+def finish_knockout(game_state: GameState):
+    """The knockdown count reached KNOCKDOWN_COUNT_MAX: the downed fighter is out."""
+    downed_fighter_name = game_state.knockdown_info.fighter_down
+    attacker_name = FighterName.PLAYER if downed_fighter_name == FighterName.OPPONENT else FighterName.OPPONENT
+
+    game_state.log(EVT_KNOCKOUT, downed_fighter_name)
+    game_state.winner = attacker_name
+    end_match(game_state)
+
+def finish_round_by_time(game_state: GameState, now: float = None):
+    """The round timer ran out: score the round and either rest or end the match."""
+    now = game_state.last_tick_time if now is None else now
+    game_state.round_timer = 0
+    # Actions still winding up or recovering are cut off by the bell
+    game_state.timeline.cancel(_FIGHTER_EVENTS | {EV_AI_THINK})
+    game_state.player.current_action = ActionType.IDLE
+    game_state.opponent.current_action = ActionType.IDLE
+    end_round_due_to_time(game_state)
+    if game_state.match_status != GameStatus.MATCH_OVER:
+        game_state.between_rounds_timer = BETWEEN_ROUNDS_SECONDS
+        game_state.timeline.schedule(now + BETWEEN_ROUNDS_SECONDS, EV_ROUND_START)
+        _anchor(game_state, now)
+
+@timed("game_tick")
 def game_tick(game_state: GameState):
     """
     Simulates one tick or step of the game.
-    Processes player inputs, AI actions, updates timers, checks conditions.
-    This is a simplified version for testing the logic before API/WebSockets.
+    Runs the match's timeline up to the clock's time (see advance_match), then starts the
+    queued player action, if any. Ticks can be any distance apart: the match only changes at
+    its scheduled events, so a single tick 90 s later gives the same result as 900 small ones.
     """
     if game_state.match_status == GameStatus.MATCH_OVER:
         return # Game has ended
 
-    current_time = time.time()
-    delta_time = current_time - game_state.last_tick_time
-    game_state.last_tick_time = current_time
+    current_time = game_state.clock()
+    journal = game_state.journal
+    if journal is not None:
+        journal.record_tick(current_time)
 
-    # Handle knockdown count
-    if game_state.knockdown_info["is_knockdown"]:
-        game_state.knockdown_info["count"] += delta_time # Increment count by time passed
-        game_state.log_event(f"Knockdown count: {game_state.knockdown_info['count']:.1f}")
-        if game_state.knockdown_info["count"] >= KNOCKDOWN_COUNT_MAX:
-            downed_fighter_name = game_state.knockdown_info["fighter_down"]
-            attacker_name = FighterName.PLAYER if downed_fighter_name == FighterName.OPPONENT else FighterName.OPPONENT
-
-            game_state.log_event(f"{downed_fighter_name.value} is KNOCKED OUT!")
-            game_state.winner = attacker_name
-            end_match(game_state)
-            return # Match ends
-        # No "getting up" mechanic yet if HP is 0. If HP > 0, could add it here.
-        return # Pause other game logic during knockdown count
+    # Everything that came due since the last tick: impacts, recoveries, the AI's next move,
+    # the knockdown count, the bell. Nothing is due for an idle match between events.
+    advance_match(game_state, current_time)
+    if game_state.match_status == GameStatus.MATCH_OVER:
+        return # Knockout or final bell
+    game_state.last_tick_time = current_time
 
     if not game_state.is_round_active:
-        if game_state.match_status == GameStatus.BETWEEN_ROUNDS:
-            # Could have a timer for between_rounds state
-            game_state.between_rounds_timer -= delta_time
-            if game_state.between_rounds_timer <=0:
-                start_new_round(game_state)
-        return # Round not active (e.g., between rounds, paused)
-
-    # Update round timer
-    game_state.round_timer -= delta_time
-
-    # Regenerate stamina for both fighters based on delta_time
-    # STAMINA_REGEN_PER_SECOND is 'units per second', so multiply by delta_time
-    game_state.player.regenerate_stamina(STAMINA_REGEN_PER_SECOND * delta_time)
-    game_state.opponent.regenerate_stamina(STAMINA_REGEN_PER_SECOND * delta_time)
-
-    # Active block stamina drain
-    if game_state.player.current_action == ActionType.BLOCK:
-        cost = ACTION_DETAILS[ActionType.BLOCK]["stamina_cost_active_drain"] * delta_time
-        game_state.player.consume_stamina(cost)
-        if not game_state.player.can_perform_action(ActionType.BLOCK): # No more stamina for block
-            game_state.player.current_action = ActionType.IDLE
-            game_state.log_event("Player block broke due to low stamina.")
-    if game_state.opponent.current_action == ActionType.BLOCK:
-        cost = ACTION_DETAILS[ActionType.BLOCK]["stamina_cost_active_drain"] * delta_time
-        game_state.opponent.consume_stamina(cost)
-        if not game_state.opponent.can_perform_action(ActionType.BLOCK):
-            game_state.opponent.current_action = ActionType.IDLE
-            game_state.log_event("Opponent block broke due to low stamina.")
-
+        return # Round not active (knockdown count, between rounds)
 
     # Process Player action from queue (if any)
-    if PLAYER_ACTION_QUEUE:
-        player_action = PLAYER_ACTION_QUEUE.pop(0)
+    player_action = game_state.pop_player_action()
+    if player_action is not None:
+        if journal is not None:
+            journal.record_action(player_action)
         # Check if player is stunned or otherwise unable to act (future enhancement)
         if game_state.player.current_action == ActionType.IDLE: # Can only act if idle (simplification)
-             execute_fighter_action(game_state, FighterName.PLAYER, player_action)
+            execute_fighter_action(game_state, FighterName.PLAYER, player_action, current_time)
+            if game_state.opponent.current_action == ActionType.IDLE:
+                _opponent_think(game_state, current_time) # The AI reacts to the wind-up
         else:
-            game_state.log_event(f"Player tried {player_action.value} but was busy with {game_state.player.current_action.value}")
-
-
-    # Process AI action (AI might act based on a timer or reaction, simplified here)
-    # For a more turn-based feel in testing, AI could act after player or on its own "turn"
-    # For real-time, AI decision could be more frequent or reactive.
-    if game_state.opponent.current_action == ActionType.IDLE: # AI acts if idle
-        ai_action_choice = decide_ai_action(game_state)
-        if ai_action_choice != ActionType.IDLE:
-            execute_fighter_action(game_state, FighterName.OPPONENT, ai_action_choice)
-
-    # Reset actions that are not meant to be persistent states after some time
-    # (This is a very rough way to handle action durations)
-    action_duration_limit = 0.5 # seconds
-    if game_state.player.current_action not in [ActionType.IDLE, ActionType.BLOCK] and \
-       (current_time - game_state.player.action_start_time > action_duration_limit):
-        game_state.player.current_action = ActionType.IDLE
-
-    if game_state.opponent.current_action not in [ActionType.IDLE, ActionType.BLOCK] and \
-       (current_time - game_state.opponent.action_start_time > action_duration_limit):
-        game_state.opponent.current_action = ActionType.IDLE
-
-
-    # Check for end of round by time
-    if game_state.round_timer <= 0:
-        end_round_due_to_time(game_state)
-        if game_state.match_status != GameStatus.MATCH_OVER:
-             game_state.between_rounds_timer = 5 # 5 seconds rest
-        return
+            game_state.log(EVT_PLAYER_BUSY, player_action, game_state.player.current_action)
 
     # Log game state periodically for debugging if needed
     # print(f"Tick: P_HP:{game_state.player.hp:.0f} P_SP:{game_state.player.stamina:.0f} ({game_state.player.current_action.value}) | "
@@ -728,8 +1423,6 @@ if __name__ == '__main__':
 
     # Simulate some player inputs over time
     # (In a real game, these would come from user interaction)
-    if sim_duration > 2: time.eval('PLAYER_ACTION_QUEUE.append(ActionType.JAB)',  globals={'PLAYER_ACTION_QUEUE': PLAYER_ACTION_QUEUE, 'ActionType': ActionType}, locals={}) # Incorrect use of time.eval
-    # Correct way for delayed actions in simulation:
     # We'll just add them periodically in the loop for this test.
 
     print(f"\nStarting {sim_duration}s simulation of game ticks...")
@@ -739,13 +1432,13 @@ if __name__ == '__main__':
         loop_count += 1
         # Simulate player input at intervals
         if loop_count % 20 == 5: # Every ~2 seconds if tick is ~0.1s
-            queue_player_action_for_tick(ActionType.JAB)
+            queue_player_action_for_tick(game, ActionType.JAB)
             print("*** Player queued JAB ***")
         if loop_count % 30 == 0:
-            queue_player_action_for_tick(ActionType.BLOCK)
+            queue_player_action_for_tick(game, ActionType.BLOCK)
             print("*** Player queued BLOCK ***")
         if loop_count % 50 == 0 and game.player.current_action == ActionType.BLOCK: # Unblock
-             PLAYER_ACTION_QUEUE.append(ActionType.IDLE) # Crude way to stop blocking
+             queue_player_action_for_tick(game, ActionType.IDLE) # Crude way to stop blocking
              print("*** Player queued IDLE (to stop block) ***")
 
 
@@ -768,6 +1461,15 @@ if __name__ == '__main__':
 
 
 # --- Helper for Deserialization (New for DynamoDB integration) ---
+def stats_dict_counts(raw_stats: dict) -> list:
+    """A serialized stats dict (punch keys as ActionType strings) as a FighterStats counter list."""
+    stats = create_empty_fighter_stats()
+    for k, v in raw_stats.items():
+        key = ActionType.__members__.get(k, k) # Punch keys are stored as ActionType strings
+        if key in stats: # Unknown keys don't fit the fixed stats layout; drop them
+            stats[key] = v
+    return stats._counts
+
 def create_fighter_from_dict(data: dict, name_enum: FighterName) -> Fighter:
     """Creates a Fighter instance from a dictionary (e.g., from DynamoDB)."""
     if not data:
@@ -790,18 +1492,15 @@ def create_fighter_from_dict(data: dict, name_enum: FighterName) -> Fighter:
     fighter.action_start_time = data.get("action_start_time", 0) # May not be in older saves
 
     # Stats deserialization: ensure enum keys are handled if they were stored as strings
-    raw_stats = data.get("stats", {})
-    fighter.stats = create_empty_fighter_stats() # Start with a clean slate
-    for k, v in raw_stats.items():
-        try:
-            action_key = ActionType[k] # If key is an ActionType string
-            fighter.stats[action_key] = v
-        except KeyError:
-            fighter.stats[k] = v # For non-ActionType keys like "punches_thrown"
+    fighter.stats = FighterStats.from_counts(stats_dict_counts(data.get("stats", {})))
 
     fighter.round_scores = data.get("round_scores", [])
+    round_stats = data.get("round_stats")
+    if round_stats is not None:
+        fighter.stats.restore_rounds([stats_dict_counts(round_data) for round_data in round_stats])
     return fighter
 
+@timed("deserialize_state")
 def create_gamestate_from_dict(data: dict) -> GameState:
     """Creates a GameState instance from a dictionary (e.g., from DynamoDB)."""
     if not data:
@@ -845,21 +1544,26 @@ def create_gamestate_from_dict(data: dict) -> GameState:
 
     # Deserialize knockdown_info
     kd_info_data = data.get("knockdown_info", {})
-    game_state.knockdown_info["is_knockdown"] = kd_info_data.get("is_knockdown", False)
+    game_state.knockdown_info.is_knockdown = kd_info_data.get("is_knockdown", False)
     kd_fighter_str = kd_info_data.get("fighter_down")
     if kd_fighter_str:
         try:
-            game_state.knockdown_info["fighter_down"] = FighterName[kd_fighter_str]
+            game_state.knockdown_info.fighter_down = FighterName[kd_fighter_str]
         except KeyError:
-            game_state.knockdown_info["fighter_down"] = None
+            game_state.knockdown_info.fighter_down = None
     else:
-        game_state.knockdown_info["fighter_down"] = None
-    game_state.knockdown_info["count"] = kd_info_data.get("count", 0)
+        game_state.knockdown_info.fighter_down = None
+    game_state.knockdown_info.count = kd_info_data.get("count", 0)
 
-    game_state.event_log = data.get("event_log", []) # Assumes event log is stored as list of strings
+    game_state.event_log.extend_text(data.get("event_log", [])) # Stored as already-formatted strings
     game_state.last_tick_time = data.get("last_tick_time", time.time()) # Default to now if not present
+    game_state.ai_profile = data.get("ai_profile") or DEFAULT_AI_PROFILE # Items from before profiles existed
+    if game_state.current_round > 0:
+        for fighter in (game_state.player, game_state.opponent):
+            if not fighter.stats.round_counts(): # Saved before per-round stats: the round counts from here
+                fighter.stats.restore_rounds([[0] * _STAT_SLOT_COUNT])
 
-    return game_state
+    return rebuild_timeline(game_state) # Items don't carry the pending events
 
 
 # --- Placeholder Functions for API Interaction ---
@@ -889,7 +1593,7 @@ def handle_player_action_request(current_game_state: GameState, player_action_da
         # In a real game, this action would be queued or processed by the game loop.
         # For direct testing, we can queue it for our test game_tick.
         if current_game_state.match_status == GameStatus.ACTIVE and current_game_state.is_round_active:
-            queue_player_action_for_tick(action) # Uses the global test queue
+            queue_player_action_for_tick(current_game_state, action) # Queued on this game only
             # execute_fighter_action(current_game_state, FighterName.PLAYER, action) # Alternative direct execution
             return {"status": "success", "message": f"Action {action.value} received and queued."}
         else:
@@ -933,16 +1637,18 @@ if __name__ == '__main__':
     response = handle_player_action_request(game_instance_api, action_data)
     print(f"API response to JAB action: {response}")
     assert response["status"] == "success"
-    assert PLAYER_ACTION_QUEUE[-1] == ActionType.JAB # Check if it was added to our test queue
+    assert game_instance_api.action_queue[-1] == ActionType.JAB # Check it was added to this game's queue
 
     # Simulate a game tick to process the queued action for this separate game_instance_api
-    if PLAYER_ACTION_QUEUE: # Ensure the queue specific to this test path is processed
+    if game_instance_api.action_queue:
         game_instance_api.last_tick_time = time.time() # Initialize tick time for this instance
         game_tick(game_instance_api)
+        # The jab resolves at the end of its wind-up
+        advance_match(game_instance_api, game_instance_api.last_tick_time + action_timing(ActionType.JAB)[0])
         print(f"API game state after JAB and tick: P HP: {game_instance_api.player.hp}, O HP: {game_instance_api.opponent.hp}")
-        assert game_instance_api.opponent.hp < MAX_HP or not ACTION_DETAILS[ActionType.JAB]["accuracy"] # Opponent took damage or jab missed
+        assert game_instance_api.opponent.hp < MAX_HP or not game_instance_api.player.stats["punches_landed"] # Opponent took damage or jab missed
 
-    PLAYER_ACTION_QUEUE.clear() # Clear queue for next test
+    game_instance_api.action_queue.clear() # Clear queue for next test
 
     action_data_invalid = {"action": "FLY"}
     response_invalid = handle_player_action_request(game_instance_api, action_data_invalid)
@@ -0,0 +1,247 @@
+"""
+Per-phase timers and counters for the game engine and the request pipeline.
+
+When a tick or a request is slow we want to know where the time went: decide_ai_action,
+execute_fighter_action, log_event, the serializers or the store calls. Functions are marked
+with @timed("<phase>"), and blocks with `with phase("<phase>"):`. Every call is recorded
+into a latency histogram per phase. app.py exports them as Prometheus text at /metrics and,
+per request, in a Server-Timing header.
+
+Off by default, and then close to free: with GAME_METRICS unset @timed returns the function
+itself (no wrapper at all), phase() returns a shared no-op context manager and count() returns
+right away. The switch is read once at import; GAME_SERVER_TIMING=1 turns it on too.
+
+Durations are inclusive: game_tick contains the decide_ai_action and execute_fighter_action calls
+it makes. Histograms and counters are per process.
+
+Usage:
+    GAME_METRICS=1 gunicorn app:app ...        # then GET /metrics
+    GAME_SERVER_TIMING=1 gunicorn app:app ...  # also Server-Timing on /game/... responses
+    python boxing_metrics.py                   # overhead of the hooks, on and off
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Dict, Optional, Tuple
+
+SERVER_TIMING_ENABLED = os.environ.get('GAME_SERVER_TIMING', '0') == '1'
+METRICS_ENABLED = os.environ.get('GAME_METRICS', '0') == '1' or SERVER_TIMING_ENABLED
+METRIC_PREFIX = "boxing"
+# Histogram bucket upper bounds in seconds: engine phases take microseconds, store calls milliseconds
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_NOOP = nullcontext()
+
+
+class Histogram:
+    __slots__ = ("buckets", "count", "sum")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1) # Last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+
+class Registry:
+    """Histograms (phase durations, request latencies) and counters, keyed by metric name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms: Dict[Tuple[str, tuple], Histogram] = {}
+        self.counters: Dict[Tuple[str, tuple], float] = {}
+        self.help: Dict[str, str] = {
+            "phase_seconds": "Time spent per call of an instrumented phase (inclusive of nested phases).",
+            "http_request_seconds": "Request latency by route, method and status.",
+        }
+
+    def observe(self, name: str, labels: tuple, seconds: float):
+        key = (name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name: str, labels: tuple = (), amount: float = 1):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def render(self, extra: Optional[Dict[str, Tuple[str, float]]] = None) -> str:
+        """
+        Prometheus text exposition format (0.0.4). `extra` adds point-in-time values owned by
+        the caller: {name: (type, value)}, e.g. {"cached_games": ("gauge", 12)}.
+        """
+        lines = []
+        with self._lock:
+            histograms = sorted((key, list(h.buckets), h.count, h.sum) for key, h in self.histograms.items())
+            counters = sorted(self.counters.items())
+        previous = None
+        for (name, labels), buckets, count, total in histograms:
+            metric = f"{METRIC_PREFIX}_{name}"
+            if name != previous:
+                if name in self.help:
+                    lines.append(f"# HELP {metric} {self.help[name]}")
+                lines.append(f"# TYPE {metric} histogram")
+                previous = name
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + ("+Inf",), buckets):
+                cumulative += bucket
+                lines.append(f"{metric}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{metric}_sum{_labels(labels)} {total!r}")
+            lines.append(f"{metric}_count{_labels(labels)} {count}")
+        previous = None
+        for (name, labels), value in counters:
+            metric = f"{METRIC_PREFIX}_{name}_total"
+            if name != previous:
+                lines.append(f"# TYPE {metric} counter")
+                previous = name
+            lines.append(f"{metric}{_labels(labels)} {_number(value)}")
+        for name, (kind, value) in sorted((extra or {}).items()):
+            metric = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.append(f"{metric} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _number(value) -> str:
+    """Ints in full, floats as repr() (shortest exact form, like the _sum lines): never rounded to 6 digits."""
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+registry = Registry()
+
+# Request-scoped totals for Server-Timing: phase -> [calls, seconds], only between
+# begin_request() and end_request() on this thread (scheduler and flusher threads have none).
+_local = threading.local()
+
+
+def _record(name: str, seconds: float):
+    registry.observe("phase_seconds", (("phase", name),), seconds)
+    request_phases = getattr(_local, "phases", None)
+    if request_phases is not None:
+        entry = request_phases.get(name)
+        if entry is None:
+            request_phases[name] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+
+def timed(name: str):
+    """Decorator: records each call's duration under phase `name`. Returns the function unchanged when disabled."""
+    def decorate(function):
+        if not METRICS_ENABLED:
+            return function
+
+        @wraps(function)
+        def timed_call(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _record(name, time.perf_counter() - started)
+        return timed_call
+    return decorate
+
+
+@contextmanager
+def _timed_block(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - started)
+
+
+def phase(name: str):
+    """Context manager timing a block as phase `name` (a shared no-op when disabled)."""
+    return _timed_block(name) if METRICS_ENABLED else _NOOP
+
+
+def count(name: str, amount: float = 1, **labels):
+    """Adds to counter `name` (exported as <prefix>_<name>_total)."""
+    if METRICS_ENABLED:
+        registry.inc(name, tuple(sorted(labels.items())), amount)
+
+
+# --- Request pipeline ---
+
+def begin_request():
+    if METRICS_ENABLED:
+        _local.phases = {}
+        _local.started = time.perf_counter()
+
+
+def end_request(route: str, method: str, status: int) -> Optional[str]:
+    """Records the request; returns its Server-Timing header value when that is enabled."""
+    phases = getattr(_local, "phases", None)
+    if phases is None:
+        return None
+    _local.phases = None
+    elapsed = time.perf_counter() - _local.started
+    registry.observe("http_request_seconds", (("method", method), ("route", route), ("status", str(status))), elapsed)
+    if not SERVER_TIMING_ENABLED:
+        return None
+    return server_timing(phases, elapsed)
+
+
+def server_timing(phases: dict, total: float) -> str:
+    """`<phase>;dur=<ms>;desc="<calls> calls"` per phase, then the whole request as `total`."""
+    parts = [f'{name};dur={seconds * 1e3:.3f};desc="{calls} calls"' if calls > 1 else f"{name};dur={seconds * 1e3:.3f}"
+             for name, (calls, seconds) in phases.items()]
+    parts.append(f"total;dur={total * 1e3:.3f}")
+    return ", ".join(parts)
+
+
+if __name__ == '__main__':
+    import subprocess
+    import sys
+
+    # Times 200 simulated matches with the hooks compiled out (default) and in (GAME_METRICS=1).
+    script = (
+        "import random, time, boxing_game_logic as bgl, boxing_metrics\n"
+        "from boxing_simulator import SimulatedClock\n"
+        "started = time.perf_counter(); ticks = 0\n"
+        "for seed in range(200):\n"
+        "    game = bgl.initialize_new_game(clock=SimulatedClock(), rng=random.Random(seed))\n"
+        "    bgl.start_new_round(game); rng = random.Random(-seed)\n"
+        "    while game.match_status != bgl.GameStatus.MATCH_OVER:\n"
+        "        if rng.random() < 0.3: bgl.queue_player_action_for_tick(game, bgl.ActionType.JAB)\n"
+        "        game.clock.advance(0.1); bgl.game_tick(game); ticks += 1\n"
+        "print((time.perf_counter() - started) / ticks * 1e6)\n"
+        "if boxing_metrics.METRICS_ENABLED:\n"
+        "    print(*(l for l in boxing_metrics.registry.render().splitlines() if '_count{' in l), sep='\\n')\n"
+    )
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for flag in ("0", "1"):
+        env = dict(os.environ, GAME_METRICS=flag, GAME_SERVER_TIMING="0")
+        output = subprocess.run([sys.executable, "-c", script], cwd=here, env=env, capture_output=True,
+                                text=True, check=True).stdout.splitlines()
+        results[flag] = float(output[0])
+        if flag == "1":
+            print("Calls recorded per phase:\n  " + "\n  ".join(output[1:]))
+    print(f"us per game_tick: metrics off {results['0']:.2f}, on {results['1']:.2f} "
+          f"({(results['1'] / results['0'] - 1) * 100:+.0f}%)")
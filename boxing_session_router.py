@@ -0,0 +1,442 @@
+"""
+Session router: pins every match to one worker process by consistent hashing of its game_id.
+
+Without it /game/start creates a match on whichever worker gets the request, and every later
+request may land on another worker that has to re-hydrate the match from storage (and, with
+GAME_TICK_SCHEDULER=1, can't tick it at all). The router sits in front of N app.py workers:
+
+    HashRing      game_id -> worker, with DEFAULT_VIRTUAL_NODES points per worker so matches
+                  spread evenly and adding/removing a worker moves only ~1/N of them
+    /game/start   the router picks the game_id (uuid4) first, so the match is created on its
+                  owner; every /game/<game_id>/... request is proxied to the same worker
+    handoff       set_workers() rebalances: requests are held while each current worker lists
+                  its hot matches (GET /internal/sessions), releases the ones the new ring gives
+                  to someone else (persist, stop ticking, drop from memory), and the new owners
+                  adopt them (load, start ticking). Then the new ring takes effect. A match
+                  its worker couldn't release (still dirty or in use there) stays pinned to that
+                  worker until a later set_workers() releases it, so it never has two writers
+
+Workers need GAME_STORE=sqlite (one file) or dynamodb, i.e. a store every worker reaches, and the
+shared SESSION_ROUTER_TOKEN for the internal routes. The router is one process; run one (or
+make its worker list come from one place) so every request sees the same ring. WebSocket
+pushes (/game/<id>/ws) aren't proxied: clients connect to the owner directly.
+
+Usage:
+    python boxing_session_router.py --workers 3 --port 8000   # 3 local workers + the router
+    python boxing_session_router.py --demo                    # multi-process routing/handoff check
+"""
+import hashlib
+import hmac
+import http.client
+import json
+import logging
+import os
+import secrets
+import select
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from bisect import bisect_right
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+from flask import Flask, Response, jsonify, request
+
+DEFAULT_VIRTUAL_NODES = 128
+ROUTER_TOKEN_HEADER = "X-Session-Router-Token" # Same names as in app.py
+ROUTER_GAME_ID_HEADER = "X-Game-Id"
+WORKER_ID_HEADER = "X-Game-Worker"
+# Request headers passed to workers, and response headers passed back to clients
+_FORWARDED_REQUEST_HEADERS = ("Content-Type", "Accept", "Authorization")
+_FORWARDED_RESPONSE_HEADERS = ("Content-Type", "Server-Timing", WORKER_ID_HEADER)
+# Safe to send twice: a request the worker may already have applied is only retried with these
+_IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+
+logger = logging.getLogger(__name__)
+
+
+def _hash64(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hash ring of worker ids; owner(key) is the first worker point at or after hash(key)."""
+
+    def __init__(self, nodes: Iterable[str] = (), virtual_nodes: int = DEFAULT_VIRTUAL_NODES):
+        self.virtual_nodes = virtual_nodes
+        self.nodes = frozenset(nodes)
+        points = sorted((_hash64(f"{node}#{i}"), node) for node in self.nodes for i in range(virtual_nodes))
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key: str) -> str:
+        if not self._points:
+            raise LookupError("Hash ring has no workers")
+        return self._owners[bisect_right(self._points, _hash64(key)) % len(self._points)]
+
+
+class _RoutingLock:
+    """Requests route concurrently (shared); a rebalance waits for them and holds new ones (exclusive)."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+
+    @contextmanager
+    def shared(self):
+        with self._condition:
+            while self._writer:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._condition:
+            while self._writer:
+                self._condition.wait()
+            self._writer = True
+            while self._readers:
+                self._condition.wait()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+class WorkerError(Exception):
+    """A worker didn't answer an internal (handoff) call."""
+
+
+class SessionRouter:
+    """
+    Routes match requests to their owning worker. `workers` maps worker id -> base URL
+    (e.g. {"w1": "http://127.0.0.1:8001"}); `token` is the workers' SESSION_ROUTER_TOKEN.
+    """
+
+    def __init__(self, workers: Dict[str, str], token: str, virtual_nodes: int = DEFAULT_VIRTUAL_NODES,
+                 timeout: float = 10.0):
+        self.workers = dict(workers)
+        self.ring = HashRing(self.workers, virtual_nodes)
+        self.token = token
+        self.timeout = timeout
+        self.handoffs = 0 # Matches moved between workers so far
+        self.pinned: Dict[str, str] = {} # game_id -> the worker that couldn't release it (its owner until it does)
+        self._routing = _RoutingLock()
+        self._rebalance_lock = threading.Lock()
+        self._connections = threading.local() # Keep-alive connection per (thread, worker URL)
+        self.app = self._create_app()
+
+    def owner(self, game_id: str) -> str:
+        return self.pinned.get(game_id) or self.ring.owner(game_id)
+
+    # --- Talking to workers ---
+
+    def _connection(self, base_url: str) -> http.client.HTTPConnection:
+        pool = self._connections.__dict__.setdefault("pool", {})
+        connection = pool.get(base_url)
+        if connection is not None and connection.sock is not None and select.select([connection.sock], [], [], 0)[0]:
+            connection.close() # An idle keep-alive connection is only readable once the worker closed it
+            connection = None
+        if connection is None:
+            parts = urlsplit(base_url)
+            connection = pool[base_url] = http.client.HTTPConnection(parts.hostname, parts.port, timeout=self.timeout)
+        return connection
+
+    def _request(self, base_url: str, method: str, path: str, body: bytes = None, headers: dict = None):
+        """
+        (status, headers, body). Retries once on a fresh connection (the kept-alive one may have
+        closed), but a non-idempotent request only if it failed before it was fully sent: once a
+        POST is out, the worker may have applied it (a punch) even though no response came back.
+        """
+        for attempt in (0, 1):
+            connection = self._connection(base_url)
+            sent = False
+            try:
+                connection.request(method, path, body=body, headers=headers or {})
+                sent = True
+                response = connection.getresponse()
+                return response.status, response.getheaders(), response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                self._connections.pool.pop(base_url, None)
+                if attempt or (sent and method not in _IDEMPOTENT_METHODS):
+                    raise
+
+    def _internal(self, worker_id: str, method: str, path: str, payload: dict = None) -> dict:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {ROUTER_TOKEN_HEADER: self.token, "Content-Type": "application/json"}
+        try:
+            status, _, data = self._request(self.workers[worker_id], method, path, body, headers)
+        except (http.client.HTTPException, OSError) as e:
+            raise WorkerError(f"{worker_id} {method} {path}: {e}") from e
+        if status != 200:
+            raise WorkerError(f"{worker_id} {method} {path}: HTTP {status} {data[:200]!r}")
+        return json.loads(data)
+
+    def forward(self, game_id: str, extra_headers: Optional[dict] = None) -> Response:
+        """Proxies the current Flask request to the game's owner."""
+        with self._routing.shared():
+            base_url = self.workers[self.owner(game_id)]
+            headers = {name: request.headers[name] for name in _FORWARDED_REQUEST_HEADERS if name in request.headers}
+            headers.update(extra_headers or {})
+            path = request.full_path if request.query_string else request.path
+            try:
+                status, response_headers, body = self._request(base_url, request.method, path,
+                                                               request.get_data(), headers)
+            except (http.client.HTTPException, OSError) as e:
+                logger.error(f"Worker {base_url} unreachable for game {game_id}: {e}")
+                return jsonify({"error": "Game server unavailable"}), 502
+        allowed = {name.lower() for name in _FORWARDED_RESPONSE_HEADERS}
+        return Response(body, status=status, headers=[(k, v) for k, v in response_headers if k.lower() in allowed])
+
+    # --- Handoff ---
+
+    def set_workers(self, workers: Dict[str, str]) -> dict:
+        """
+        Rebalances onto a new worker set. Returns {"moved": n, "released": {worker: n},
+        "adopted": {worker: n}, "failed": [...], "pinned": n}.
+
+        If a worker can't list its matches, nothing has moved yet and nothing changes (WorkerError).
+        A match its worker didn't release (still dirty or in use there, or the release call failed)
+        is in "failed" and stays pinned to that worker, which keeps serving it: the store doesn't
+        have its latest state yet. Calling set_workers again, with the same workers, retries the
+        releases. Workers leaving the set must stay reachable until this returns, and while they
+        hold pinned matches.
+        """
+        with self._rebalance_lock, self._routing.exclusive():
+            new_ring = HashRing(workers, self.ring.virtual_nodes)
+            holders = self.workers # The ring's workers and any holding pinned matches
+            hot_by = {worker_id: self._internal(worker_id, "GET", "/internal/sessions")["game_ids"]
+                      for worker_id in holders}
+            self.workers = {**holders, **workers} # New workers are reachable for adopt calls
+            moving, released_by, failed, pinned = {}, {}, [], {}
+            for worker_id, hot in hot_by.items():
+                leaving = [game_id for game_id in hot if new_ring.owner(game_id) != worker_id]
+                if not leaving:
+                    continue
+                try:
+                    result = self._internal(worker_id, "POST", "/internal/sessions/release", {"game_ids": leaving})
+                except WorkerError as e: # Any of them may still be live there
+                    logger.error(f"Release failed, {len(leaving)} matches stay on {worker_id}: {e}")
+                    result = {"released": [], "failed": leaving}
+                released_by[worker_id] = len(result["released"])
+                failed.extend(result["failed"])
+                pinned.update(dict.fromkeys(result["failed"], worker_id))
+                for game_id in result["released"]:
+                    moving.setdefault(new_ring.owner(game_id), []).append(game_id)
+            adopted_by = {}
+            for worker_id, game_ids in moving.items():
+                try:
+                    adopted_by[worker_id] = len(self._internal(worker_id, "POST", "/internal/sessions/adopt",
+                                                               {"game_ids": game_ids})["adopted"])
+                except WorkerError as e: # Released and stored: the new owner loads them on first request
+                    logger.warning(f"Adopt failed on {worker_id}: {e}")
+                    adopted_by[worker_id] = 0
+            self.ring, self.pinned = new_ring, pinned
+            self.workers = {**{worker_id: self.workers[worker_id] for worker_id in set(pinned.values())}, **workers}
+            moved = sum(released_by.values())
+            self.handoffs += moved
+            if failed:
+                logger.warning(f"{len(failed)} matches could not be released and stay pinned: {failed[:10]}")
+            return {"moved": moved, "released": released_by, "adopted": adopted_by, "failed": failed,
+                    "pinned": len(pinned)}
+
+    # --- Routes ---
+
+    def _create_app(self) -> Flask:
+        router_app = Flask(__name__)
+
+        @router_app.route('/game/start', methods=['POST'])
+        def start_game():
+            game_id = str(uuid.uuid4()) # Chosen here so the match is created on its owner
+            return self.forward(game_id, {ROUTER_GAME_ID_HEADER: game_id, ROUTER_TOKEN_HEADER: self.token})
+
+        @router_app.route('/game/<game_id>/<path:rest>', methods=['GET', 'POST'])
+        def game_request(game_id, rest):
+            return self.forward(game_id)
+
+        @router_app.route('/router/workers', methods=['GET', 'POST'])
+        def workers_api():
+            if request.method == 'GET':
+                return jsonify({"workers": self.workers, "virtual_nodes": self.ring.virtual_nodes,
+                                "handoffs": self.handoffs, "pinned": len(self.pinned)}), 200
+            token = request.headers.get(ROUTER_TOKEN_HEADER)
+            if token is None or not hmac.compare_digest(token, self.token):
+                return jsonify({"error": "Forbidden"}), 403
+            workers = (request.get_json(silent=True) or {}).get("workers")
+            if not workers:
+                return jsonify({"error": "Body must be {\"workers\": {\"<id>\": \"<base url>\"}}"}), 400
+            try:
+                return jsonify(self.set_workers(workers)), 200
+            except WorkerError as e:
+                return jsonify({"error": f"Rebalance failed: {e}"}), 502
+
+        return router_app
+
+
+# --- Local worker processes (development and the --demo check) ---
+
+WORKER_SCRIPT = r"""
+import sys
+import app
+from werkzeug.serving import run_simple
+run_simple("127.0.0.1", int(sys.argv[1]), app.app, threaded=True)
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LocalWorker:
+    """One app.py process on a local port (gunicorn with one worker if installed, else werkzeug)."""
+
+    def __init__(self, worker_id: str, token: str, env: Optional[dict] = None):
+        self.worker_id = worker_id
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        worker_env = dict(os.environ, WORKER_ID=worker_id, SESSION_ROUTER_TOKEN=token, **(env or {}))
+        repo_root = os.path.dirname(os.path.abspath(__file__))
+        try:
+            import gunicorn # noqa: F401 (only checking it's installed)
+            command = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{self.port}", "--workers", "1",
+                       "--threads", "8", "--log-level", "warning", "app:app"]
+        except ImportError:
+            command = [sys.executable, "-c", WORKER_SCRIPT, str(self.port)]
+        self.process = subprocess.Popen(command, cwd=repo_root, env=worker_env,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def wait_ready(self, timeout: float = 20.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Worker {self.worker_id} exited with {self.process.returncode}")
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=0.2):
+                    return
+            except OSError:
+                time.sleep(0.1)
+        raise TimeoutError(f"Worker {self.worker_id} didn't start listening on {self.port}")
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def start_local_workers(count: int, token: str, env: dict, first_index: int = 1) -> Dict[str, LocalWorker]:
+    workers = {f"w{i}": LocalWorker(f"w{i}", token, env) for i in range(first_index, first_index + count)}
+    for worker in workers.values():
+        worker.wait_ready()
+    return workers
+
+
+def _run_demo(store_path: str):
+    """Three workers, 60 matches, then scale to four and down to two: every request hits the owner."""
+    token = secrets.token_hex(16)
+    env = {"GAME_STORE": "sqlite", "GAME_STORE_SQLITE_PATH": store_path, "GAME_TICK_SCHEDULER": "1",
+           "USE_IN_MEMORY_TABLE": "0", "MATCH_JOURNAL": "1"}
+    processes = start_local_workers(3, token, env)
+    try:
+        router = SessionRouter({wid: w.url for wid, w in processes.items()}, token)
+        client = router.app.test_client()
+
+        def play(game_id, punches):
+            for _ in range(punches):
+                response = client.post(f"/game/{game_id}/action", json={"action": "jab"})
+                assert response.status_code in (200, 202), response.get_data(as_text=True)
+                assert response.headers[WORKER_ID_HEADER] == router.owner(game_id), "Routed to a non-owner"
+
+        def snapshot(game_id):
+            response = client.get(f"/game/{game_id}/state")
+            assert response.headers[WORKER_ID_HEADER] == router.owner(game_id)
+            return response.get_json()
+
+        games = []
+        for _ in range(60):
+            response = client.post("/game/start")
+            assert response.status_code == 200, response.get_data(as_text=True)
+            game_id = response.get_json()["game_id"]
+            assert response.headers[WORKER_ID_HEADER] == router.owner(game_id)
+            games.append(game_id)
+        for game_id in games:
+            play(game_id, 3)
+        time.sleep(0.3) # A few scheduler ticks
+        before = {game_id: snapshot(game_id) for game_id in games}
+        spread = {wid: sum(router.owner(g) == wid for g in games) for wid in processes}
+        print(f"3 workers, 60 matches, spread {spread}")
+
+        for step, (added, removed) in enumerate(((1, ()), (0, ("w1", "w4")))):
+            if added:
+                processes.update(start_local_workers(added, token, env, first_index=len(processes) + 1))
+            target = {wid: w.url for wid, w in processes.items() if wid not in removed}
+            owners_before = {game_id: router.owner(game_id) for game_id in games}
+            started = time.perf_counter()
+            result = router.set_workers(target)
+            pause_ms = (time.perf_counter() - started) * 1e3
+            expected_moves = sum(owners_before[g] != router.owner(g) for g in games)
+            assert result["moved"] == expected_moves and not result["failed"], result
+            for worker_id in removed:
+                processes.pop(worker_id).stop()
+            for game_id in games:
+                state = snapshot(game_id) # Served by the new owner, nothing lost in the move
+                thrown = state["player"]["stats"]["punches_thrown"]
+                assert thrown >= before[game_id]["player"]["stats"]["punches_thrown"], (game_id, state)
+                assert state["seq"] >= before[game_id]["seq"]
+                play(game_id, 1)
+            time.sleep(0.3)
+            before = {game_id: snapshot(game_id) for game_id in games}
+            for worker_id, worker in processes.items():
+                hot = router._internal(worker_id, "GET", "/internal/sessions")["game_ids"]
+                assert all(router.owner(g) == worker_id for g in hot), f"{worker_id} holds a match it doesn't own"
+            print(f"-> workers {sorted(target)}: moved {result['moved']} of 60 matches "
+                  f"(released {result['released']}, adopted {result['adopted']}), requests paused {pause_ms:.0f} ms")
+        print("Every request was served by the match's owner; no state lost across handoffs.")
+    finally:
+        for worker in processes.values():
+            worker.stop()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Consistent-hash session router in front of app.py workers.")
+    parser.add_argument("--workers", type=int, default=3, help="Local worker processes to start")
+    parser.add_argument("--port", type=int, default=8000, help="Router port")
+    parser.add_argument("--demo", action="store_true", help="Run the multi-process routing/handoff check")
+    args = parser.parse_args()
+
+    if args.demo:
+        with tempfile.TemporaryDirectory() as directory:
+            _run_demo(os.path.join(directory, "games.sqlite3"))
+        raise SystemExit
+
+    router_token = os.environ.get("SESSION_ROUTER_TOKEN") or secrets.token_hex(16)
+    worker_env = {"GAME_STORE": os.environ.get("GAME_STORE", "sqlite"), "GAME_TICK_SCHEDULER": "1"}
+    local_workers = start_local_workers(args.workers, router_token, worker_env)
+    session_router = SessionRouter({wid: w.url for wid, w in local_workers.items()}, router_token)
+    from werkzeug.serving import run_simple
+    try:
+        run_simple("127.0.0.1", args.port, session_router.app, threaded=True)
+    finally:
+        for local_worker in local_workers.values():
+            local_worker.stop()
@@ -0,0 +1,256 @@
+"""
+Headless match simulator for boxing_game_logic.
+
+Runs complete matches on a simulated clock with a seeded RNG, so a 3x90s match takes
+milliseconds instead of minutes and the same seed always produces the same fight.
+`run_monte_carlo` fans many matches out over a process pool and aggregates the
+win/KO/decision distributions we use to balance ACTION_DETAILS.
+
+With tick_seconds=None the clock jumps straight to each match's next scheduled event
+(bgl.next_event_time) instead of moving in fixed ticks; the simulated player then only gets a
+chance to act at those events.
+
+Usage:
+    python boxing_simulator.py --matches 10000 --processes 8
+    python boxing_simulator.py --matches 10000 --events   # event-driven stepping
+"""
+import argparse
+import json
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, Optional
+
+import boxing_game_logic as bgl
+
+DEFAULT_TICK_SECONDS = 0.1 # Same cadence as the old __main__ loop (time.sleep(0.1))
+DEFAULT_PLAYER_ACTION_CHANCE = 0.3 # Chance per tick that the simulated player queues an input
+EVENT_STEPS_PER_SECOND_MAX = 20 # Bounds event-driven matches: AI thinks every 0.25 s, a punch is 2 events in 0.5 s
+PUNCHES = [bgl.ActionType.JAB, bgl.ActionType.CROSS, bgl.ActionType.HOOK, bgl.ActionType.UPPERCUT]
+
+
+class SimulatedClock:
+    """A manually advanced clock. Call it like time.time(); move it with advance()."""
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@dataclass
+class MatchResult:
+    """Outcome of one simulated match."""
+    seed: int
+    winner: str # FighterName value or "draw"
+    method: str # "KO", "decision", "draw" or "unfinished"
+    rounds: int
+    ticks: int
+    player_hp: int
+    opponent_hp: int
+    player_damage_dealt: int
+    opponent_damage_dealt: int
+
+
+def default_player_policy(game_state: bgl.GameState, rng: random.Random) -> Optional[bgl.ActionType]:
+    """
+    Simulated player input: throws a random affordable punch on some ticks.
+    Returns the ActionType to queue, or None to send nothing this tick.
+    """
+    if rng.random() >= DEFAULT_PLAYER_ACTION_CHANCE:
+        return None
+    affordable = [p for p in PUNCHES if game_state.player.can_perform_action(p)]
+    if not affordable:
+        return None
+    return rng.choice(affordable)
+
+
+@contextmanager
+def action_details_overrides(overrides: Optional[Dict[str, Dict[str, float]]]):
+    """
+    Temporarily patches ACTION_DETAILS, e.g. {"JAB": {"damage": 6}}, restoring it on exit.
+    Used for balance sweeps; each pool worker applies the overrides in its own process.
+    """
+    if not overrides:
+        yield
+        return
+    saved = {}
+    try:
+        for action_name, fields in overrides.items():
+            action_type = bgl.ActionType[action_name]
+            saved[action_type] = dict(bgl.ACTION_DETAILS[action_type])
+            bgl.ACTION_DETAILS[action_type].update(fields)
+        bgl.reset_ai_policy_tables() # Stamina costs are baked into the AI's policy tables
+        yield
+    finally:
+        for action_type, details in saved.items():
+            bgl.ACTION_DETAILS[action_type].clear()
+            bgl.ACTION_DETAILS[action_type].update(details)
+        bgl.reset_ai_policy_tables()
+
+
+def _match_method(game_state: bgl.GameState) -> str:
+    if game_state.match_status != bgl.GameStatus.MATCH_OVER:
+        return "unfinished"
+    if game_state.knockdown_info["is_knockdown"]: # Counted out, or a third knockdown in the round
+        return "KO" if game_state.knockdown_info["count"] >= bgl.KNOCKDOWN_COUNT_MAX else "TKO"
+    if game_state.winner == "draw":
+        return "draw"
+    return "decision"
+
+
+def simulate_match(seed: int,
+                   tick_seconds: Optional[float] = DEFAULT_TICK_SECONDS,
+                   player_policy: Callable = default_player_policy,
+                   max_ticks: Optional[int] = None) -> MatchResult:
+    """
+    Plays one full match without wall-clock sleeps.
+    Everything random in the match (hit rolls, AI choices, simulated player inputs) is drawn
+    from a random.Random seeded with `seed`, so results are reproducible.
+    `tick_seconds=None` steps from event to event.
+    """
+    rng = random.Random(seed)
+    clock = SimulatedClock()
+    game_state = bgl.initialize_new_game(clock=clock, rng=rng)
+    bgl.start_new_round(game_state)
+
+    if max_ticks is None:
+        # Generous upper bound: all rounds, rests between them and a knockdown count, twice over.
+        match_seconds = bgl.MAX_ROUNDS * (bgl.ROUND_DURATION_SECONDS + 5) + bgl.KNOCKDOWN_COUNT_MAX
+        max_ticks = int(2 * match_seconds * (1 / tick_seconds if tick_seconds else EVENT_STEPS_PER_SECOND_MAX))
+
+    ticks = 0
+    while game_state.match_status != bgl.GameStatus.MATCH_OVER and ticks < max_ticks:
+        if tick_seconds is None:
+            due = bgl.next_event_time(game_state)
+            if due is None:
+                break
+            clock.now = max(clock.now, due)
+        else:
+            clock.advance(tick_seconds)
+        if game_state.is_round_active:
+            player_action = player_policy(game_state, rng)
+            if player_action is not None:
+                bgl.queue_player_action_for_tick(game_state, player_action)
+        bgl.game_tick(game_state)
+        ticks += 1
+
+    winner = game_state.winner
+    return MatchResult(
+        seed=seed,
+        winner=winner.value if isinstance(winner, bgl.FighterName) else (winner or "none"),
+        method=_match_method(game_state),
+        rounds=game_state.current_round,
+        ticks=ticks,
+        player_hp=game_state.player.hp,
+        opponent_hp=game_state.opponent.hp,
+        player_damage_dealt=game_state.player.stats["damage_dealt"],
+        opponent_damage_dealt=game_state.opponent.stats["damage_dealt"],
+    )
+
+
+def _simulate_chunk(seeds, tick_seconds, overrides) -> dict:
+    """Pool worker: simulates a chunk of seeds and returns partial aggregates."""
+    winners, methods, rounds = Counter(), Counter(), Counter()
+    total_ticks = 0
+    damage = {"player": 0, "opponent": 0}
+    with action_details_overrides(overrides):
+        for seed in seeds:
+            result = simulate_match(seed, tick_seconds=tick_seconds)
+            winners[result.winner] += 1
+            methods[result.method] += 1
+            rounds[result.rounds] += 1
+            total_ticks += result.ticks
+            damage["player"] += result.player_damage_dealt
+            damage["opponent"] += result.opponent_damage_dealt
+    return {"winners": winners, "methods": methods, "rounds": rounds,
+            "ticks": total_ticks, "damage": damage, "matches": len(seeds)}
+
+
+def run_monte_carlo(num_matches: int,
+                    base_seed: int = 0,
+                    processes: Optional[int] = None,
+                    tick_seconds: float = DEFAULT_TICK_SECONDS,
+                    overrides: Optional[Dict[str, Dict[str, float]]] = None,
+                    chunk_size: int = 250) -> dict:
+    """
+    Simulates `num_matches` matches (seeds base_seed .. base_seed + num_matches - 1) on a
+    process pool and returns aggregated win/method/round distributions.
+    `processes=1` runs inline, which is handy under a profiler.
+    """
+    seeds = list(range(base_seed, base_seed + num_matches))
+    chunks = [seeds[i:i + chunk_size] for i in range(0, len(seeds), chunk_size)]
+    started = time.perf_counter()
+
+    if processes == 1:
+        partials = [_simulate_chunk(chunk, tick_seconds, overrides) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as pool:
+            partials = list(pool.map(_simulate_chunk, chunks,
+                                     [tick_seconds] * len(chunks), [overrides] * len(chunks)))
+
+    winners, methods, rounds = Counter(), Counter(), Counter()
+    total_ticks = 0
+    damage = Counter()
+    for partial in partials:
+        winners.update(partial["winners"])
+        methods.update(partial["methods"])
+        rounds.update(partial["rounds"])
+        total_ticks += partial["ticks"]
+        damage.update(partial["damage"])
+
+    elapsed = time.perf_counter() - started
+    return {
+        "matches": num_matches,
+        "base_seed": base_seed,
+        "tick_seconds": tick_seconds,
+        "overrides": overrides or {},
+        "winners": dict(winners),
+        "win_rates": {k: round(v / num_matches, 4) for k, v in winners.items()} if num_matches else {},
+        "methods": dict(methods),
+        "rounds_played": {str(k): v for k, v in sorted(rounds.items())},
+        "avg_ticks_per_match": round(total_ticks / num_matches, 1) if num_matches else 0,
+        "avg_damage_dealt": {k: round(v / num_matches, 2) for k, v in damage.items()} if num_matches else {},
+        "elapsed_seconds": round(elapsed, 3),
+        "matches_per_second": round(num_matches / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run headless boxing matches and summarize outcomes.")
+    parser.add_argument("--matches", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="Base seed; match i uses seed + i")
+    parser.add_argument("--processes", type=int, default=None, help="Pool size (default: all cores)")
+    parser.add_argument("--tick", type=float, default=DEFAULT_TICK_SECONDS, help="Simulated seconds per tick")
+    parser.add_argument("--events", action="store_true", help="Step from event to event instead of fixed ticks")
+    parser.add_argument("--overrides", type=str, default=None,
+                        help='JSON ACTION_DETAILS overrides, e.g. \'{"JAB": {"damage": 6}}\'')
+    args = parser.parse_args()
+
+    tick_seconds = None if args.events else args.tick
+
+    # Same seed, same fight.
+    assert asdict(simulate_match(42, tick_seconds=tick_seconds)) == asdict(simulate_match(42, tick_seconds=tick_seconds))
+
+    # The match only changes at its scheduled events, so without player input the step size
+    # doesn't matter: small ticks, huge ticks and event-to-event stepping play the same fight.
+    idle_player = lambda game_state, rng: None
+    by_step = {step: asdict(simulate_match(7, tick_seconds=step, player_policy=idle_player))
+               for step in (0.1, 2.5, None)}
+    ticks_by_step = {step: result.pop("ticks") for step, result in by_step.items()}
+    assert by_step[0.1] == by_step[2.5] == by_step[None], by_step
+    print(f"Idle-player match, same result with ticks of 0.1 s / 2.5 s / event-driven: "
+          f"{ticks_by_step[0.1]} / {ticks_by_step[2.5]} / {ticks_by_step[None]} ticks")
+
+    summary = run_monte_carlo(args.matches, base_seed=args.seed, processes=args.processes,
+                              tick_seconds=tick_seconds,
+                              overrides=json.loads(args.overrides) if args.overrides else None)
+    print(json.dumps(summary, indent=2))
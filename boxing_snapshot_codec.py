@@ -0,0 +1,545 @@
+"""
+Binary snapshot codec for GameState.
+
+Stored games used to be the API dict: ~60 attributes of DynamoDB maps, strings and numbers that
+create_gamestate_from_dict walks field by field on every cache miss (with Decimals coming back
+for every number, and enum values it has to look up). The dict is also lossy: stamina and the
+timers are rounded for clients, and last_tick_time / action_start_time aren't in it at all.
+
+A snapshot is the whole match, minus the event log, struct-packed into one binary attribute:
+
+    header   b"BX", schema version (1 byte)
+    game     status, round, max rounds, timers, winner, last tick, knockdown info, game_id
+    fighter  x2: hp/stamina (+ max), knockdown counters, current action, action start,
+             the 12 FighterStats counters, round scores
+    profile  (v2) the opponent's AI profile name (length-prefixed)
+    rounds   (v3) x2: per-round stats counters, finished rounds then the one in progress
+    rng      (v4) seed and draw count when the match uses boxing_replay.CounterRandom
+    timeline (v5) the match's pending events and the anchor values they run from
+
+Numbers that may be int or float (hp, timers, ...) are packed as doubles with an "is int" bit,
+so a decoded match is equal to the encoded one, types included. Enums are packed as indexes
+into the frozen tuples below: their order is part of the schema. Anything that changes the
+layout (new fields, reordered enums, a different stats layout) gets a new SCHEMA_VERSION and a
+decoder for it next to the old ones in _DECODERS; old snapshots keep decoding.
+
+Event log lines stay a separate list attribute, so new lines can still be appended with
+list_append (see ItemUpdate in boxing_state_cache.py).
+
+A recorded match's journal grows 9 bytes per tick. The item only carries its unsealed tail;
+every JOURNAL_CHUNK_TICKS ticks are written once to their own chunk item in the journal store
+(boxing_game_store.create_journal_store: a table of its own, items expiring after
+JOURNAL_CHUNK_TTL_SECONDS), chained newest to oldest from the item's "journal_chunk" key
+(load_full_journal walks the chain back). Chunks are sealed by the cache's flusher, right
+before the write of the item that points at them; if that write loses a conflict they are
+deleted again.
+
+Items written before snapshots existed (dict form, no "snapshot" attribute) are read through
+upgrade_legacy_item and rewritten as snapshots on their next write.
+
+Usage:
+    data = encode_game_state(game_state)
+    game_state = decode_game_state(data, event_log=stored_lines)
+    game_state = load_game_state(item)   # snapshot or legacy dict item
+"""
+import logging
+import struct
+import time
+import uuid
+from typing import Callable, Optional
+
+import boxing_game_logic as bgl
+from boxing_metrics import timed
+from boxing_replay import CounterRandom, MatchJournal
+from boxing_state_delta import EVENT_LOG_KEY, VERSION_ITEM_KEY, plain_value
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ATTR = "snapshot"
+JOURNAL_ATTR = "journal" # boxing_replay.MatchJournal bytes (the unsealed ticks), when the match is recorded
+JOURNAL_CHUNK_ATTR = "journal_chunk" # Key of the newest sealed chunk item
+JOURNAL_CHUNK_TICKS = 64 # ~580 bytes per chunk item
+JOURNAL_CHUNK_TTL_SECONDS = 90 * 86400 # Chunk items' "expires_at": how long a match stays replayable
+JOURNAL_KEY_MARK = "#journal#" # In every chunk key, never in a game_id
+EXPIRES_ATTR = "expires_at"
+SCHEMA_VERSION = 5
+MAGIC = b"BX"
+
+# Frozen for schema v1. Append-only changes still need a new version: old decoders can't read them.
+_V1_STATUSES = (bgl.GameStatus.PENDING, bgl.GameStatus.ACTIVE, bgl.GameStatus.PAUSED, bgl.GameStatus.ROUND_OVER,
+                bgl.GameStatus.BETWEEN_ROUNDS, bgl.GameStatus.MATCH_OVER)
+_V1_ACTIONS = (bgl.ActionType.JAB, bgl.ActionType.CROSS, bgl.ActionType.HOOK, bgl.ActionType.UPPERCUT,
+               bgl.ActionType.BLOCK, bgl.ActionType.DODGE, bgl.ActionType.ADVANCE, bgl.ActionType.RETREAT,
+               bgl.ActionType.SIDESTEP_LEFT, bgl.ActionType.SIDESTEP_RIGHT, bgl.ActionType.IDLE)
+_V1_FIGHTERS = (None, bgl.FighterName.PLAYER, bgl.FighterName.OPPONENT, "draw") # winner / fighter_down codes
+_V1_STAT_SLOTS = 12 # FighterStats._counts layout: 4 totals, then (thrown, landed) per punch type
+
+_STATUS_CODES = {status: i for i, status in enumerate(_V1_STATUSES)}
+_ACTION_CODES = {action: i for i, action in enumerate(_V1_ACTIONS)}
+_FIGHTER_CODES = {fighter: i for i, fighter in enumerate(_V1_FIGHTERS)}
+
+_HEADER = struct.Struct("<2sB")
+# status, round, max rounds, round timer, round active, between-rounds timer, winner, last tick,
+# knockdown (is down, fighter, count), int flags, game_id length
+_V1_GAME = struct.Struct("<BBBd?dBd?BdBH")
+# hp, max hp, stamina, max stamina, knockdowns this round, total knockdowns, current action,
+# action start, int flags, stats counters, number of round scores
+_V1_FIGHTER = struct.Struct(f"<ddddHHBdB{_V1_STAT_SLOTS}qB")
+_V1_SCORE = struct.Struct("<h")
+_V2_PROFILE_LENGTH = struct.Struct("<B")
+_V3_ROUND_COUNT = struct.Struct("<B")
+_V4_RNG = struct.Struct("<?QQ") # has counter RNG, seed, draws
+_V3_ROUND = struct.Struct(f"<{_V1_STAT_SLOTS}I") # Per-round counts stay far below 2**32
+# has anchor, anchor time, anchor values (round timer, between-rounds timer, knockdown count,
+# player stamina, opponent stamina), int flags, has think, think at, next seq, number of events
+_V5_TIMELINE = struct.Struct("<?d5dB?dIH")
+_V5_EVENT = struct.Struct("<dIBbB") # due, seq, kind, arg, action code (_NO_ACTION if none)
+_NO_ACTION = 255
+
+
+def _int_flags(*values) -> int:
+    """Bit i set if values[i] is an int (decoded back as int rather than float)."""
+    flags = 0
+    for i, value in enumerate(values):
+        if isinstance(value, int):
+            flags |= 1 << i
+    return flags
+
+
+def _restore(value: float, flags: int, bit: int):
+    return int(value) if flags & (1 << bit) else value
+
+
+def _encode_fighter(fighter: bgl.Fighter, out: list):
+    counts = fighter.stats._counts
+    out.append(_V1_FIGHTER.pack(
+        fighter.hp, fighter.max_hp, fighter.stamina, fighter.max_stamina,
+        fighter.knockdowns_this_round, fighter.total_knockdowns, _ACTION_CODES[fighter.current_action],
+        fighter.action_start_time,
+        _int_flags(fighter.hp, fighter.max_hp, fighter.stamina, fighter.max_stamina, fighter.action_start_time),
+        *counts, len(fighter.round_scores)))
+    out.extend(_V1_SCORE.pack(score) for score in fighter.round_scores)
+
+
+@timed("snapshot_encode")
+def encode_game_state(game_state: bgl.GameState) -> bytes:
+    """The match (without its event log) as a schema-versioned binary snapshot."""
+    knockdown = game_state.knockdown_info
+    game_id = (game_state.game_id or "").encode("utf-8")
+    out = [_HEADER.pack(MAGIC, SCHEMA_VERSION), _V1_GAME.pack(
+        _STATUS_CODES[game_state.match_status], game_state.current_round, game_state.max_rounds,
+        game_state.round_timer, game_state.is_round_active, game_state.between_rounds_timer,
+        _FIGHTER_CODES[game_state.winner], game_state.last_tick_time,
+        knockdown.is_knockdown, _FIGHTER_CODES[knockdown.fighter_down], knockdown.count,
+        _int_flags(game_state.round_timer, game_state.between_rounds_timer, knockdown.count),
+        len(game_id)), game_id]
+    _encode_fighter(game_state.player, out)
+    _encode_fighter(game_state.opponent, out)
+    profile = game_state.ai_profile.encode("utf-8")
+    out.append(_V2_PROFILE_LENGTH.pack(len(profile)))
+    out.append(profile)
+    for fighter in (game_state.player, game_state.opponent):
+        round_counts = fighter.stats.round_counts()
+        out.append(_V3_ROUND_COUNT.pack(len(round_counts)))
+        out.extend(_V3_ROUND.pack(*counts) for counts in round_counts)
+    rng = game_state.rng
+    out.append(_V4_RNG.pack(True, rng.seed_value, rng.draws) if isinstance(rng, CounterRandom) else _V4_RNG.pack(False, 0, 0))
+    timeline = game_state.timeline
+    anchor = timeline.anchor or (0, 0, 0, 0, 0)
+    out.append(_V5_TIMELINE.pack(
+        timeline.anchor is not None, timeline.anchor_time, *anchor, _int_flags(*anchor, timeline.anchor_time),
+        timeline.think_at is not None, timeline.think_at or 0.0, timeline.seq, len(timeline.events)))
+    out.extend(_V5_EVENT.pack(due, seq, kind, arg, _NO_ACTION if action is None else _ACTION_CODES[action])
+               for due, seq, kind, arg, action in timeline.events)
+    return b"".join(out)
+
+
+def _decode_fighter_v1(data: bytes, offset: int, name: bgl.FighterName):
+    (hp, max_hp, stamina, max_stamina, knockdowns_this_round, total_knockdowns, action, action_start_time, flags,
+     *counts) = _V1_FIGHTER.unpack_from(data, offset)
+    score_count = counts.pop()
+    offset += _V1_FIGHTER.size
+    fighter = bgl.Fighter(name)
+    fighter.hp = _restore(hp, flags, 0)
+    fighter.max_hp = _restore(max_hp, flags, 1)
+    fighter.stamina = _restore(stamina, flags, 2)
+    fighter.max_stamina = _restore(max_stamina, flags, 3)
+    fighter.knockdowns_this_round = knockdowns_this_round
+    fighter.total_knockdowns = total_knockdowns
+    fighter.current_action = _V1_ACTIONS[action]
+    fighter.action_start_time = _restore(action_start_time, flags, 4)
+    fighter.stats._counts[:] = counts
+    fighter.round_scores = [_V1_SCORE.unpack_from(data, offset + i * _V1_SCORE.size)[0] for i in range(score_count)]
+    return fighter, offset + score_count * _V1_SCORE.size
+
+
+def _decode_v1(data: bytes, offset: int, game_state: bgl.GameState):
+    (status, current_round, max_rounds, round_timer, is_round_active, between_rounds_timer, winner, last_tick_time,
+     is_knockdown, fighter_down, knockdown_count, flags, id_length) = _V1_GAME.unpack_from(data, offset)
+    offset += _V1_GAME.size
+    game_state.game_id = data[offset:offset + id_length].decode("utf-8") or None
+    offset += id_length
+    game_state.match_status = _V1_STATUSES[status]
+    game_state.current_round = current_round
+    game_state.max_rounds = max_rounds
+    game_state.round_timer = _restore(round_timer, flags, 0)
+    game_state.is_round_active = is_round_active
+    game_state.between_rounds_timer = _restore(between_rounds_timer, flags, 1)
+    game_state.winner = _V1_FIGHTERS[winner]
+    game_state.last_tick_time = last_tick_time
+    game_state.knockdown_info.is_knockdown = is_knockdown
+    game_state.knockdown_info.fighter_down = _V1_FIGHTERS[fighter_down]
+    game_state.knockdown_info.count = _restore(knockdown_count, flags, 2)
+    game_state.player, offset = _decode_fighter_v1(data, offset, bgl.FighterName.PLAYER)
+    game_state.opponent, offset = _decode_fighter_v1(data, offset, bgl.FighterName.OPPONENT)
+    return offset
+
+
+def _decode_v2(data: bytes, offset: int, game_state: bgl.GameState):
+    """v1 plus the AI profile name (v1 snapshots keep the default profile)."""
+    offset = _decode_v1(data, offset, game_state)
+    (length,) = _V2_PROFILE_LENGTH.unpack_from(data, offset)
+    offset += _V2_PROFILE_LENGTH.size
+    game_state.ai_profile = data[offset:offset + length].decode("utf-8")
+    return offset + length
+
+
+def _decode_v3(data: bytes, offset: int, game_state: bgl.GameState):
+    """v2 plus per-round stats."""
+    offset = _decode_v2(data, offset, game_state)
+    for fighter in (game_state.player, game_state.opponent):
+        (count,) = _V3_ROUND_COUNT.unpack_from(data, offset)
+        offset += _V3_ROUND_COUNT.size
+        fighter.stats.restore_rounds([_V3_ROUND.unpack_from(data, offset + i * _V3_ROUND.size) for i in range(count)])
+        offset += count * _V3_ROUND.size
+    return offset
+
+
+def _decode_v4(data: bytes, offset: int, game_state: bgl.GameState):
+    """v3 plus the match's RNG position (other RNGs aren't stored; the match gets the default)."""
+    offset = _decode_v3(data, offset, game_state)
+    has_rng, seed, draws = _V4_RNG.unpack_from(data, offset)
+    if has_rng:
+        game_state.rng = CounterRandom(seed, draws)
+    return offset + _V4_RNG.size
+
+
+def _decode_v5(data: bytes, offset: int, game_state: bgl.GameState):
+    """v4 plus the match timeline (kept in heap order, so it is restored as is)."""
+    offset = _decode_v4(data, offset, game_state)
+    (has_anchor, anchor_time, *anchor, flags, has_think, think_at, seq,
+     event_count) = _V5_TIMELINE.unpack_from(data, offset)
+    offset += _V5_TIMELINE.size
+    timeline = game_state.timeline
+    timeline.anchor_time = _restore(anchor_time, flags, 5)
+    timeline.anchor = tuple(_restore(value, flags, i) for i, value in enumerate(anchor)) if has_anchor else None
+    timeline.think_at = think_at if has_think else None
+    timeline.seq = seq
+    events = []
+    for _ in range(event_count):
+        due, event_seq, kind, arg, action = _V5_EVENT.unpack_from(data, offset)
+        events.append((due, event_seq, kind, arg, None if action == _NO_ACTION else _V1_ACTIONS[action]))
+        offset += _V5_EVENT.size
+    timeline.events = events
+    return offset
+
+
+def _start_rounds_on_load(game_state: bgl.GameState):
+    """Pre-v3 snapshots have no per-round stats: a started round counts from when it is loaded."""
+    if game_state.current_round > 0:
+        for fighter in (game_state.player, game_state.opponent):
+            fighter.stats.restore_rounds([[0] * _V1_STAT_SLOTS])
+
+
+def _decode_pre_v3(decoder):
+    def decode(data: bytes, offset: int, game_state: bgl.GameState):
+        offset = decoder(data, offset, game_state)
+        _start_rounds_on_load(game_state)
+        return offset
+    return decode
+
+
+def _decode_pre_v5(decoder):
+    """Snapshots before v5 have no timeline: it is rebuilt from the decoded match."""
+    def decode(data: bytes, offset: int, game_state: bgl.GameState):
+        offset = decoder(data, offset, game_state)
+        bgl.rebuild_timeline(game_state)
+        return offset
+    return decode
+
+
+_DECODERS = {1: _decode_pre_v5(_decode_pre_v3(_decode_v1)), 2: _decode_pre_v5(_decode_pre_v3(_decode_v2)),
+             3: _decode_pre_v5(_decode_v3), 4: _decode_pre_v5(_decode_v4),
+             5: _decode_v5} # schema version -> decoder; keep old ones when adding versions
+
+
+@timed("snapshot_decode")
+def decode_game_state(data, event_log=(), clock: Optional[Callable[[], float]] = None) -> bgl.GameState:
+    """
+    Rebuilds the match from a snapshot of any known schema version. `event_log` are the stored
+    (formatted) log lines. Accepts bytes or boto3's Binary wrapper.
+    """
+    data = bytes(getattr(data, "value", data))
+    magic, version = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a game state snapshot")
+    decoder = _DECODERS.get(version)
+    if decoder is None:
+        raise ValueError(f"Snapshot schema version {version} is newer than this build reads (<= {SCHEMA_VERSION})")
+    game_state = bgl.GameState(clock=clock) if clock is not None else bgl.GameState()
+    decoder(data, _HEADER.size, game_state)
+    game_state.event_log.extend_text(event_log)
+    return game_state
+
+
+def _plain(value):
+    """plain_value, through maps as well."""
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    return plain_value(value)
+
+
+def _enum_name(enum_type, value):
+    """Dict items store enum values ("active", "Player"); create_gamestate_from_dict looks up names."""
+    try:
+        return enum_type(value).name
+    except ValueError:
+        return value
+
+
+def upgrade_legacy_item(item: dict) -> Optional[bgl.GameState]:
+    """
+    Hydrates a dict-form item (written before snapshots): Decimals become ints/floats and stored
+    enum values are mapped to the names create_gamestate_from_dict expects.
+    """
+    if not item:
+        return None
+    data = _plain(item)
+    if "match_status" in data:
+        data["match_status"] = _enum_name(bgl.GameStatus, data["match_status"])
+    if data.get("winner") not in (None, "draw"):
+        data["winner"] = _enum_name(bgl.FighterName, data["winner"])
+    knockdown = data.get("knockdown_info")
+    if knockdown and knockdown.get("fighter_down"):
+        knockdown["fighter_down"] = _enum_name(bgl.FighterName, knockdown["fighter_down"])
+    return bgl.create_gamestate_from_dict(data)
+
+
+def load_game_state(item: dict) -> Optional[bgl.GameState]:
+    """Hydrates a stored item in either form."""
+    if not item:
+        return None
+    if SNAPSHOT_ATTR in item:
+        game_state = decode_game_state(item[SNAPSHOT_ATTR], item.get(EVENT_LOG_KEY, []))
+        if JOURNAL_ATTR in item:
+            game_state.journal = journal = MatchJournal.from_bytes(item[JOURNAL_ATTR])
+            key = item.get(JOURNAL_CHUNK_ATTR)
+            if key:
+                journal.offset, journal.previous = _chunk_end(key), key
+        return game_state
+    return upgrade_legacy_item(item)
+
+
+def _chunk_key(game_id: str, end: int) -> str:
+    """Chunk keys are unique per write: a conflicting writer's chunks can't overwrite the winner's."""
+    return f"{game_id}{JOURNAL_KEY_MARK}{end}#{uuid.uuid4().hex[:12]}"
+
+
+def _chunk_end(key: str) -> int:
+    """Ticks sealed up to and including this chunk."""
+    return int(key.rsplit("#", 2)[1])
+
+
+def load_full_journal(journal_store, journal: MatchJournal) -> MatchJournal:
+    """A copy of the journal with its sealed chunks read back from the journal store, from tick 0."""
+    journal = journal.copy()
+    key = journal.previous
+    while key:
+        chunk = journal_store.get(key)
+        if chunk is None:
+            raise LookupError(f"Journal chunk {key} is missing")
+        journal.prepend_chunk(chunk[JOURNAL_CHUNK_ATTR])
+        key = chunk.get("previous")
+    journal.previous = None
+    return journal
+
+
+class SealedChunks:
+    """Chunks written for one item write: committed into the live journal if it lands, deleted if it conflicts."""
+    __slots__ = ("keys", "ticks", "offset", "previous")
+
+    def __init__(self, offset: int, previous: Optional[str]):
+        self.keys = []
+        self.ticks = 0
+        self.offset, self.previous = offset, previous # Where the journal stood before them
+
+
+class SnapshotStorage:
+    """
+    GameStateCache storage form: the table item is {game_id, snapshot, state_version, event_log[, journal,
+    journal_chunk]} while the cache keeps serving the API dict (`serialize` output) to callers.
+    With a `journal_store`, full journal chunks are sealed there as {game_id: chunk key,
+    journal_chunk, previous, expires_at} when the item is written; without one the whole journal
+    stays in the item.
+    """
+
+    def __init__(self, serialize: Callable[[bgl.GameState], dict], journal_store=None,
+                 chunk_ticks: int = JOURNAL_CHUNK_TICKS, chunk_ttl: float = JOURNAL_CHUNK_TTL_SECONDS,
+                 clock: Callable[[], float] = time.time):
+        self.serialize = serialize
+        self.journal_store = journal_store
+        self.chunk_ticks = chunk_ticks
+        self.chunk_ttl = chunk_ttl
+        self.clock = clock
+
+    def to_storage(self, item: dict, game_state: bgl.GameState) -> dict:
+        """The record to write: the snapshot, plus the journal's unsealed ticks (sealing happens in seal())."""
+        record = {"game_id": item["game_id"], SNAPSHOT_ATTR: encode_game_state(game_state),
+                  EVENT_LOG_KEY: item.get(EVENT_LOG_KEY, [])}
+        if VERSION_ITEM_KEY in item:
+            record[VERSION_ITEM_KEY] = item[VERSION_ITEM_KEY]
+        journal = game_state.journal
+        if journal is not None:
+            record[JOURNAL_ATTR] = journal.to_bytes()
+            if journal.previous:
+                record[JOURNAL_CHUNK_ATTR] = journal.previous
+        return record
+
+    def seal(self, game_id: str, record: dict):
+        """
+        (record to write, SealedChunks or None). Called by the cache right before it writes
+        `record`, outside the entry lock: writes the record's full chunks to the journal store
+        and returns the record without them. Store errors propagate (the chunks written so far
+        expire).
+        """
+        if self.journal_store is None or JOURNAL_ATTR not in record:
+            return record, None
+        journal = MatchJournal.from_bytes(record[JOURNAL_ATTR])
+        if len(journal.times) < self.chunk_ticks:
+            return record, None
+        journal.previous = record.get(JOURNAL_CHUNK_ATTR)
+        journal.offset = _chunk_end(journal.previous) if journal.previous else 0
+        sealed = SealedChunks(journal.offset, journal.previous)
+        expires_at = int(self.clock() + self.chunk_ttl)
+        while len(journal.times) >= self.chunk_ticks:
+            key = _chunk_key(game_id, journal.offset + self.chunk_ticks)
+            self.journal_store.put({"game_id": key, JOURNAL_CHUNK_ATTR: journal.chunk_bytes(self.chunk_ticks),
+                                    "previous": journal.previous, EXPIRES_ATTR: expires_at})
+            journal.seal(self.chunk_ticks, key)
+            sealed.keys.append(key)
+            sealed.ticks += self.chunk_ticks
+        return dict(record, **{JOURNAL_ATTR: journal.to_bytes(), JOURNAL_CHUNK_ATTR: journal.previous}), sealed
+
+    def committed(self, game_state: Optional[bgl.GameState], sealed: SealedChunks) -> bool:
+        """
+        The item pointing at `sealed` was written: drops those ticks from the live journal (entry
+        lock held). False if the journal isn't where it was when they were sealed.
+        """
+        journal = game_state.journal if game_state is not None else None
+        if journal is None or (journal.offset, journal.previous) != (sealed.offset, sealed.previous):
+            return False
+        journal.seal(sealed.ticks, sealed.keys[-1])
+        return True
+
+    def discard(self, sealed: SealedChunks):
+        """The write lost a conflict: nothing points at these chunks. Left to expire if deleting fails."""
+        for key in sealed.keys:
+            try:
+                self.journal_store.delete(key)
+            except Exception as e:
+                logger.warning(f"Could not delete orphaned journal chunk {key}: {e}")
+
+    def accepts(self, game_id: str) -> bool:
+        """Chunk keys aren't games (and a chunk left in the game table by older builds isn't served as one)."""
+        return JOURNAL_KEY_MARK not in game_id
+
+    def from_storage(self, stored: dict):
+        """
+        (API item, hydrated GameState). Legacy items are served as stored and replaced on the next
+        write. (None, None) for an item that isn't a game.
+        """
+        if SNAPSHOT_ATTR not in stored:
+            if JOURNAL_CHUNK_ATTR in stored or "match_status" not in stored:
+                return None, None
+            return stored, upgrade_legacy_item(stored)
+        game_state = load_game_state(stored)
+        item = self.serialize(game_state)
+        if VERSION_ITEM_KEY in stored:
+            item[VERSION_ITEM_KEY] = stored[VERSION_ITEM_KEY]
+        return item, game_state
+
+
+if __name__ == '__main__':
+    import random
+    from boxing_simulator import SimulatedClock
+
+    # Round trips from the first tick to past the final bell: every field comes back equal, types included.
+    def fields(game_state):
+        names = ("game_id", "match_status", "current_round", "max_rounds", "round_timer", "is_round_active",
+                 "between_rounds_timer", "winner", "last_tick_time", "ai_profile")
+        return {name: getattr(game_state, name) for name in names}
+
+    def fighter_fields(fighter):
+        return {name: getattr(fighter, name) for name in bgl.Fighter.__slots__ if name != "stats"}
+
+    finished = 0
+    for seed in range(50):
+        rng = random.Random(seed)
+        game = bgl.initialize_new_game(clock=SimulatedClock(), rng=rng,
+                                       ai_profile=sorted(bgl.AI_PROFILES)[seed % len(bgl.AI_PROFILES)])
+        game.game_id = f"game-{seed}"
+        bgl.start_new_round(game)
+        for _ in range(seed * 80):
+            if game.match_status == bgl.GameStatus.MATCH_OVER:
+                break
+            if rng.random() < 0.3:
+                bgl.queue_player_action_for_tick(game, rng.choice(bgl.PUNCH_TYPES))
+            game.clock.advance(0.1)
+            bgl.game_tick(game)
+        finished += game.match_status == bgl.GameStatus.MATCH_OVER
+        copy = decode_game_state(encode_game_state(game), game.event_log.tail(10))
+        for decoded, original in ((fields(copy), fields(game)), (fighter_fields(copy.player), fighter_fields(game.player)),
+                                  (fighter_fields(copy.opponent), fighter_fields(game.opponent)),
+                                  (copy.knockdown_info.to_dict(), game.knockdown_info.to_dict())):
+            assert decoded == original, (decoded, original)
+            assert all(type(decoded[k]) is type(v) for k, v in original.items()), (decoded, original)
+        assert copy.player.stats._counts == game.player.stats._counts
+        assert copy.opponent.stats._counts == game.opponent.stats._counts
+        assert copy.player.stats.round_counts() == game.player.stats.round_counts()
+        assert copy.opponent.stats.round_counts() == game.opponent.stats.round_counts()
+        assert copy.event_log.tail(10) == game.event_log.tail(10)
+        timeline, copy_timeline = game.timeline, copy.timeline
+        assert (copy_timeline.events, copy_timeline.seq, copy_timeline.think_at, copy_timeline.anchor_time,
+                copy_timeline.anchor) == (timeline.events, timeline.seq, timeline.think_at, timeline.anchor_time,
+                                          timeline.anchor)
+    print(f"50 round trips identical ({finished} finished matches); "
+          f"snapshot {len(encode_game_state(game))} bytes, schema v{SCHEMA_VERSION}")
+
+    # Journals in chunks: the item keeps fewer than JOURNAL_CHUNK_TICKS ticks, the journal store holds the rest.
+    from boxing_game_store import InMemoryGameStore
+    from boxing_replay import match_fingerprint, record_simulated_match, replay_match
+    journal_store = InMemoryGameStore()
+    storage = SnapshotStorage(lambda game_state: {"game_id": game_state.game_id}, journal_store=journal_store)
+    recorded = record_simulated_match(3)
+    full = recorded.journal.copy()
+    recorded.game_id = "game-3"
+    record = storage.to_storage({"game_id": "game-3"}, recorded)
+    assert not journal_store.items, "to_storage must not write chunks"
+    record, sealed = storage.seal("game-3", record)
+    assert storage.committed(recorded, sealed) and recorded.journal.previous == record[JOURNAL_CHUNK_ATTR]
+    loaded = load_game_state(record).journal
+    assert len(loaded.times) < JOURNAL_CHUNK_TICKS and len(loaded) == len(full)
+    rebuilt = load_full_journal(journal_store, loaded)
+    assert rebuilt.to_bytes() == full.to_bytes()
+    assert match_fingerprint(replay_match(rebuilt)) == match_fingerprint(recorded)
+    assert all(chunk[EXPIRES_ATTR] > 0 for chunk in journal_store.items.values())
+    assert not storage.accepts(sealed.keys[0]) and storage.from_storage(journal_store.get(sealed.keys[0])) == (None, None)
+    print(f"journal of {len(full)} ticks: {len(record[JOURNAL_ATTR])} bytes in the item, "
+          f"{len(journal_store.items)} chunk items")
+
+    # A write that lost its conflict takes its chunks with it.
+    again = storage.to_storage({"game_id": "game-3"}, record_simulated_match(4))
+    _, orphaned = storage.seal("game-3", again)
+    before = len(journal_store.items)
+    storage.discard(orphaned)
+    assert len(journal_store.items) == before - len(orphaned.keys)
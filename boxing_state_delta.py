@@ -0,0 +1,192 @@
+"""
+Versioned game state and delta encoding for the state API.
+
+Every observed change of a match's serialized state (serialize_game_state_for_api output) gets
+a new, monotonically increasing sequence number. StateVersion remembers, per field two levels
+deep ("round_timer", "player.hp", "player.stamina", "player.stats", "knockdown_info.count", ...),
+the seq at which it last changed, and the seq of each retained event log line. With that,
+`/game/<id>/state?since=<seq>` can answer with just the fields and log lines that changed after
+`seq` instead of the whole match: a stamina-only poll is a few dozen bytes.
+
+StateVersion is stored next to the state in the game's item ("state_version"), so it has to stay
+small: 37 field seqs (~0.9 KB), about half of one seq per leaf (56, "player.stats.JAB.thrown", ...
+~1.7 KB, more than the binary snapshot itself). Deeper maps (stats, round_stats) are sent whole
+when any of their entries changed. The delta is cut straight from the stored item, without
+rebuilding a GameState. Live matches held by the tick scheduler use a VersionTracker.
+
+If a delta can't be computed exactly (unknown/future seq, or log lines after `since` already
+trimmed from the 10-line tail), callers fall back to a full snapshot.
+"""
+from decimal import Decimal
+from typing import Optional
+
+EVENT_LOG_KEY = "event_log" # Shipped as "events" in deltas, not diffed as a field
+VERSION_ITEM_KEY = "state_version"
+_NOT_FIELDS = (EVENT_LOG_KEY, VERSION_ITEM_KEY, "seq")
+
+
+def plain_value(value):
+    """DynamoDB hands numbers back as Decimal; clients want ints/floats."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, list):
+        return [plain_value(v) for v in value]
+    return value
+
+
+def plain_state(value):
+    """plain_value applied through nested maps and lists (stored and fresh sections must compare equal)."""
+    if isinstance(value, dict):
+        return {k: plain_state(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [plain_state(v) for v in value]
+    return plain_value(value)
+
+
+def _fields(state: dict) -> dict:
+    """{"round_timer": 90, "player": {"hp": 90, ...}} -> {"round_timer": 90, "player.hp": 90, ...}: two levels, no deeper."""
+    fields = {}
+    for key, value in state.items():
+        if key in _NOT_FIELDS:
+            continue
+        if isinstance(value, dict):
+            for name, field_value in value.items():
+                fields[f"{key}.{name}"] = field_value
+        else:
+            fields[key] = value
+    return fields
+
+
+class StateVersion:
+    """
+    Sequence number plus the seq each field / retained log line last changed at. A top-level
+    path in field_seqs ("knockdown_info") stands for the whole section when that section is a
+    map: it was added, or became or stopped being one.
+    """
+    __slots__ = ("seq", "field_seqs", "event_seqs", "events_trimmed_through")
+
+    def __init__(self, seq: int = 0, field_seqs: Optional[dict] = None, event_seqs: Optional[list] = None,
+                 events_trimmed_through: int = 0):
+        self.seq = seq
+        self.field_seqs = field_seqs if field_seqs is not None else {}
+        self.event_seqs = event_seqs if event_seqs is not None else [] # Parallel to the stored log tail
+        self.events_trimmed_through = events_trimmed_through # Latest seq whose log lines were dropped
+
+    def to_item(self) -> dict:
+        return {"seq": self.seq, "field_seqs": self.field_seqs, "event_seqs": self.event_seqs,
+                "events_trimmed_through": self.events_trimmed_through}
+
+    @classmethod
+    def from_item(cls, data: Optional[dict]) -> "StateVersion":
+        """
+        Reads the stored form; items written before versioning start at seq 0. Older forms read
+        as this one: per-section seqs ("section_seqs") mark the whole section, and deeper leaf
+        paths ("player.stats.JAB.thrown") count for their two-level field.
+        """
+        if not data:
+            return cls()
+        field_seqs = {k: int(v) for k, v in data.get("section_seqs", {}).items()}
+        for path, seq in data.get("field_seqs", {}).items():
+            path = ".".join(path.split(".", 2)[:2])
+            field_seqs[path] = max(field_seqs.get(path, 0), int(seq))
+        return cls(seq=int(data.get("seq", 0)), field_seqs=field_seqs,
+                   event_seqs=[int(s) for s in data.get("event_seqs", [])],
+                   events_trimmed_through=int(data.get("events_trimmed_through", 0)))
+
+    def advance(self, previous_state: Optional[dict], state: dict, new_event_count: int) -> "StateVersion":
+        """
+        Records the change from `previous_state` to `state` (both serialized, with the log tail
+        under "event_log"; `new_event_count` of its lines are new). Returns self; seq only moves
+        if something changed.
+        """
+        previous_state = previous_state or {}
+        old = _fields(previous_state)
+        changed = [path for path, value in _fields(state).items()
+                   if path not in old or plain_state(old[path]) != plain_state(value)]
+        # A map section that is new, or a section switching between map and not: sent whole
+        changed += [key for key, value in state.items() if isinstance(value, dict) and key not in _NOT_FIELDS
+                    and not isinstance(previous_state.get(key), dict)]
+        changed += [key for key, value in state.items() if not isinstance(value, dict)
+                    and isinstance(previous_state.get(key), dict)]
+        if not changed and not new_event_count:
+            return self
+
+        self.seq += 1
+        for path in changed:
+            self.field_seqs[path] = self.seq
+
+        retained = len(state.get(EVENT_LOG_KEY, ()))
+        event_seqs = self.event_seqs + [self.seq] * new_event_count
+        dropped = len(event_seqs) - retained
+        if dropped > 0:
+            self.events_trimmed_through = max(self.events_trimmed_through, event_seqs[dropped - 1])
+            event_seqs = event_seqs[dropped:]
+        self.event_seqs = event_seqs
+        return self
+
+    def can_delta(self, since: int) -> bool:
+        return 0 <= since <= self.seq and since >= self.events_trimmed_through
+
+    def delta(self, state: dict, since: int) -> dict:
+        """Fields changed after `since` (nested like the full state) and the log lines added after it."""
+        changes = {}
+        for path, seq in self.field_seqs.items():
+            if seq <= since:
+                continue
+            key, _, name = path.partition(".")
+            if key not in state:
+                continue
+            if not name:
+                changes[key] = plain_state(state[key])
+            elif isinstance(state[key], dict) and name in state[key] and self.field_seqs.get(key, 0) <= since:
+                changes.setdefault(key, {})[name] = plain_state(state[key][name])
+        lines = state.get(EVENT_LOG_KEY, [])
+        offset = len(lines) - len(self.event_seqs) # Lines stored before versioning have no seq
+        events = [lines[offset + i] for i, seq in enumerate(self.event_seqs) if seq > since]
+        return {"seq": self.seq, "full": False, "changes": changes, "events": events}
+
+
+def snapshot_response(state: dict, version: StateVersion) -> dict:
+    return {"seq": version.seq, "full": True, "state": state}
+
+
+def state_response(state: dict, version: StateVersion, since: Optional[int]) -> dict:
+    """Delta if `since` can be served exactly, otherwise the full snapshot."""
+    if since is not None and version.can_delta(since):
+        return version.delta(state, since)
+    return snapshot_response(state, version)
+
+
+class VersionTracker:
+    """Keeps a StateVersion current for an in-memory match by diffing each observed state."""
+    __slots__ = ("version", "last_state", "last_event_total")
+
+    def __init__(self):
+        self.version = StateVersion()
+        self.last_state = None
+        self.last_event_total = 0
+
+    def observe(self, state: dict, event_total: int) -> StateVersion:
+        """`state` is the serialized match; `event_total` its EventLog.total."""
+        new_events = min(event_total - self.last_event_total, len(state.get(EVENT_LOG_KEY, ())))
+        self.version.advance(self.last_state, state, new_events)
+        self.last_state = state
+        self.last_event_total = event_total
+        return self.version
+
+
+if __name__ == '__main__':
+    import json
+
+    before = {"round_timer": 90, "player": {"hp": 100, "stamina": 100.0, "stats": {"JAB": {"thrown": 0}}},
+              "event_log": ["Round 1 starting!"]}
+    after = {"round_timer": 89.5, "player": {"hp": 100, "stamina": 95.0, "stats": {"JAB": {"thrown": 1}}},
+             "event_log": ["Round 1 starting!", "Player uses JAB (Stamina: 95)"]}
+
+    version = StateVersion().advance(None, before, 1)
+    version.advance(before, after, 1)
+    full, delta = state_response(after, version, None), state_response(after, version, 1)
+    print(json.dumps(delta))
+    print(f"full: {len(json.dumps(full))} bytes, delta: {len(json.dumps(delta))} bytes")
+    assert delta["changes"] == {"round_timer": 89.5, "player": {"stamina": 95.0, "stats": {"JAB": {"thrown": 1}}}}
+    assert StateVersion.from_item(version.to_item()).to_item() == version.to_item()
@@ -0,0 +1,275 @@
+"""
+Server-authoritative tick scheduler for live matches.
+
+Without it a match only advances when a client POSTs an action, so game_tick sees one large
+delta_time per request: the AI acts at most once per request and the round timer jumps.
+TickScheduler owns the live GameStates and ticks every one of them at a fixed rate on an
+asyncio loop (in a background thread, next to the Flask app). Player inputs are queued on the
+game and picked up by the next tick, so any number of requests between two ticks cost one tick.
+
+After each tick the scheduler pushes a diff of the serialized state (plus any new event log
+lines) to the game's subscribers, e.g. the WebSocket route in app.py, so clients don't have to
+poll /game/<game_id>/state.
+
+Usage:
+    scheduler = TickScheduler(serialize=serialize_game_state_for_api, tick_rate_hz=20)
+    scheduler.start_in_background()
+    scheduler.add_game(game_state)
+    subscription = scheduler.subscribe(game_state.game_id)   # queue.Queue of messages
+    scheduler.submit_action(game_state.game_id, bgl.ActionType.JAB)
+"""
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import boxing_game_logic as bgl
+
+DEFAULT_TICK_RATE_HZ = float(os.environ.get('GAME_TICK_RATE_HZ', 20))
+SUBSCRIBER_QUEUE_MAX = 64 # Messages buffered per subscriber before a slow client is dropped
+
+logger = logging.getLogger(__name__)
+
+
+def state_diff(old: Optional[dict], new: dict) -> dict:
+    """
+    Keys of `new` whose values differ from `old`. Nested dicts (fighters, stats, knockdown info)
+    are diffed recursively; anything else (numbers, strings, lists) is sent whole when it changes.
+    """
+    if old is None:
+        return new
+    changes = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = state_diff(previous, value)
+            if nested:
+                changes[key] = nested
+        elif key not in old or previous != value:
+            changes[key] = value
+    return changes
+
+
+class _LiveGame:
+    """A GameState the scheduler ticks, plus what was last pushed to its subscribers."""
+    __slots__ = ("game_state", "tick", "last_pushed", "last_event_total", "subscribers")
+
+    def __init__(self, game_state: bgl.GameState):
+        self.game_state = game_state
+        self.tick = 0
+        self.last_pushed = None
+        self.last_event_total = game_state.event_log.total
+        self.subscribers: List[queue.Queue] = []
+
+
+class TickScheduler:
+    """Ticks all registered matches at `tick_rate_hz` and pushes state diffs to subscribers."""
+
+    def __init__(self,
+                 serialize: Callable[[bgl.GameState], dict],
+                 tick_rate_hz: float = DEFAULT_TICK_RATE_HZ,
+                 on_match_over: Optional[Callable[[bgl.GameState], None]] = None):
+        """
+        `serialize` turns a GameState into the JSON-friendly dict clients see (its "event_log"
+        key is ignored; new events are pushed separately). `on_match_over` is called once, off
+        the loop, when a match finishes (e.g. to persist the final state).
+        """
+        self.serialize = serialize
+        self.tick_interval = 1.0 / tick_rate_hz
+        self.on_match_over = on_match_over
+        self._games: Dict[str, _LiveGame] = {}
+        self._lock = threading.Lock() # Guards _games and subscriber lists (Flask threads vs loop)
+        self._tick_lock = threading.Lock() # Held while tick_all runs; taken before _lock
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    # --- Called from request threads ---
+
+    def add_game(self, game_state: bgl.GameState):
+        with self._lock:
+            self._games[game_state.game_id] = _LiveGame(game_state)
+
+    def get_game(self, game_id: str) -> Optional[bgl.GameState]:
+        live = self._games.get(game_id)
+        return live.game_state if live else None
+
+    def remove_game(self, game_id: str) -> Optional[bgl.GameState]:
+        """
+        Stops ticking a match (e.g. it moves to another process) and ends its subscribers'
+        streams. Waits for a tick in progress, so the returned state is no longer changing.
+        """
+        with self._tick_lock, self._lock:
+            live = self._games.pop(game_id, None)
+        if live is None:
+            return None
+        for subscription in live.subscribers:
+            try:
+                subscription.put_nowait(None)
+            except queue.Full:
+                pass
+        return live.game_state
+
+    def game_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._games)
+
+    def submit_action(self, game_id: str, action: bgl.ActionType) -> bool:
+        """
+        Queues a player input for the next tick. Returns False if the game isn't live here.
+        Repeats of the input already waiting at the back of the queue are coalesced into it
+        (button mashing between two ticks is one input, not a backlog).
+        """
+        live = self._games.get(game_id)
+        if live is None:
+            return False
+        pending = live.game_state.action_queue
+        if pending and pending[-1] == action:
+            return True
+        bgl.queue_player_action_for_tick(live.game_state, action)
+        return True
+
+    def subscribe(self, game_id: str) -> Optional[queue.Queue]:
+        """
+        Returns a queue that receives {"type": "state"|"diff", ...} messages for the game, starting
+        with the full current state, and None once the match is over. None if the game isn't live.
+        """
+        with self._lock:
+            live = self._games.get(game_id)
+            if live is None:
+                return None
+            subscription = queue.Queue(maxsize=SUBSCRIBER_QUEUE_MAX)
+            state = self._serialize(live.game_state)
+            live.last_pushed = state # Diffs for everyone continue from this snapshot
+            live.last_event_total = live.game_state.event_log.total
+            snapshot = dict(state, event_log=live.game_state.event_log.tail(10))
+            subscription.put_nowait({"type": "state", "game_id": game_id, "tick": live.tick, "state": snapshot})
+            live.subscribers.append(subscription)
+            return subscription
+
+    def unsubscribe(self, game_id: str, subscription: queue.Queue):
+        with self._lock:
+            live = self._games.get(game_id)
+            if live is not None and subscription in live.subscribers:
+                live.subscribers.remove(subscription)
+
+    # --- Loop ---
+
+    def start_in_background(self):
+        """Runs the scheduler on its own event loop in a daemon thread."""
+        if self._thread is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_until_complete, args=(self.run(),),
+                                        name="tick-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    async def run(self):
+        """Fixed-rate loop. Sleeps until the next scheduled tick, so slow ticks don't accumulate drift."""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while not self._stopping:
+            self.tick_all()
+            next_tick += self.tick_interval
+            delay = next_tick - loop.time()
+            if delay < 0: # Fell behind (e.g. a long GC pause): skip the missed ticks
+                if -delay > self.tick_interval:
+                    logger.warning("Tick scheduler fell %.1f ms behind", -delay * 1000)
+                next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    def tick_all(self):
+        """One tick of every live match, then pushes. Public so tests/benchmarks can drive it."""
+        finished = []
+        with self._tick_lock:
+            with self._lock:
+                games = list(self._games.items())
+            for game_id, live in games:
+                game_state = live.game_state
+                bgl.game_tick(game_state)
+                live.tick += 1
+                if live.subscribers:
+                    self._push(live)
+                if game_state.match_status == bgl.GameStatus.MATCH_OVER:
+                    finished.append(game_id)
+        for game_id in finished:
+            self._finish(game_id)
+
+    def _serialize(self, game_state: bgl.GameState) -> dict:
+        state = self.serialize(game_state)
+        state.pop("event_log", None)
+        return state
+
+    def _push(self, live: _LiveGame):
+        state = self._serialize(live.game_state)
+        changes = state_diff(live.last_pushed, state)
+        event_log = live.game_state.event_log
+        new_events = event_log.tail(min(event_log.total - live.last_event_total, len(event_log)))
+        live.last_pushed = state
+        live.last_event_total = event_log.total
+        if not changes and not new_events:
+            return
+        message = {"type": "diff", "game_id": live.game_state.game_id, "tick": live.tick,
+                   "changes": changes, "events": new_events}
+        with self._lock:
+            for subscription in list(live.subscribers):
+                try:
+                    subscription.put_nowait(message)
+                except queue.Full: # Client isn't reading; drop it rather than stall the loop
+                    live.subscribers.remove(subscription)
+                    subscription.put(None)
+
+    def _finish(self, game_id: str):
+        with self._lock:
+            live = self._games.pop(game_id, None)
+        if live is None:
+            return
+        for subscription in live.subscribers:
+            try:
+                subscription.put_nowait(None) # End of stream
+            except queue.Full:
+                pass
+        if self.on_match_over is not None:
+            if self._loop is not None and self._loop.is_running():
+                self._loop.run_in_executor(None, self.on_match_over, live.game_state)
+            else:
+                self.on_match_over(live.game_state)
+
+    def __len__(self):
+        return len(self._games)
+
+
+if __name__ == '__main__':
+    import json
+    import random
+
+    def serialize(game_state):
+        return {"round_timer": round(game_state.round_timer, 1),
+                "player": {"hp": game_state.player.hp, "stamina": round(game_state.player.stamina, 1)},
+                "opponent": {"hp": game_state.opponent.hp, "stamina": round(game_state.opponent.stamina, 1)}}
+
+    scheduler = TickScheduler(serialize=serialize, tick_rate_hz=20)
+    game = bgl.initialize_new_game(rng=random.Random(1))
+    game.game_id = "demo"
+    bgl.start_new_round(game)
+    scheduler.add_game(game)
+    subscription = scheduler.subscribe("demo")
+    scheduler.start_in_background()
+
+    started = time.time()
+    while time.time() - started < 2:
+        scheduler.submit_action("demo", bgl.ActionType.JAB)
+        message = subscription.get(timeout=1)
+        print(json.dumps(message))
+        time.sleep(0.25)
+    scheduler.stop()
@@ -0,0 +1,264 @@
+"""GameStateCache over InMemoryGameStore: eviction, flushing, conflicts and retries."""
+import random
+
+import pytest
+
+import boxing_game_logic as bgl
+from boxing_game_store import InMemoryGameStore
+from boxing_state_cache import VERSION_ATTR, GameStateCache, WriteConflict, retry_on_conflict
+
+NEVER = 3600 # A durability window the background flusher won't reach during a test
+
+
+def serialize(game_state):
+    return {"game_id": game_state.game_id, "hp": game_state.opponent.hp, "event_log": game_state.event_log.tail(10)}
+
+
+def deserialize(item):
+    game_state = bgl.initialize_new_game(rng=random.Random(0))
+    game_state.game_id = item["game_id"]
+    game_state.opponent.hp = int(item["hp"])
+    return game_state
+
+
+def new_game(game_id):
+    game_state = bgl.initialize_new_game(rng=random.Random(0))
+    game_state.game_id = game_id
+    return game_state
+
+
+def make_cache(store, **kwargs):
+    kwargs.setdefault("durability_window", NEVER)
+    return GameStateCache(store, deserialize=deserialize, **kwargs)
+
+
+def add_game(cache, game_id, hp=100):
+    game_state = new_game(game_id)
+    game_state.opponent.hp = hp
+    cache.insert(game_state, serialize(game_state))
+
+
+def hit(cache, game_id, damage=1):
+    with cache.locked(game_id) as entry:
+        entry.game_state.opponent.hp -= damage
+        cache.mark_dirty(entry, serialize(entry.game_state))
+
+
+@pytest.fixture
+def store():
+    return InMemoryGameStore()
+
+
+# --- Eviction ---
+
+def test_evicts_least_recently_used_clean_entries(store):
+    cache = make_cache(store, capacity=2)
+    for game_id in ("a", "b", "c"):
+        add_game(cache, game_id)
+    assert len(cache) == 3 # All dirty: nothing can be evicted before it is written
+    cache.flush()
+    with cache.locked("a"):
+        pass # "a" becomes the most recently used; leaving the block evicts down to capacity
+    assert cache.game_ids() == ["c", "a"]
+
+
+def test_dirty_and_pinned_entries_are_not_evicted(store):
+    cache = make_cache(store, capacity=1)
+    add_game(cache, "a")
+    cache.flush()
+    with cache.locked("a"):
+        add_game(cache, "b") # Over capacity, but "a" is pinned and "b" is dirty
+        assert sorted(cache.game_ids()) == ["a", "b"]
+    assert cache.game_ids() == ["b"]
+
+
+def test_evicted_game_is_read_back_from_the_store(store):
+    cache = make_cache(store, capacity=1)
+    add_game(cache, "a", hp=70)
+    add_game(cache, "b")
+    cache.flush()
+    with cache.locked("b"):
+        pass
+    assert cache.game_ids() == ["b"]
+    with cache.locked("a") as entry:
+        assert entry.game_state.opponent.hp == 70
+    assert cache.misses == 1
+
+
+# --- Flushing ---
+
+def test_write_behind_coalesces_changes_into_one_write_per_game(store):
+    cache = make_cache(store)
+    add_game(cache, "a")
+    add_game(cache, "b")
+    for _ in range(10):
+        hit(cache, "a")
+        hit(cache, "b", damage=2)
+    assert store.put_count == 0 and cache.dirty_count() == 2
+    cache.flush()
+    assert store.put_count == 2
+    assert cache.dirty_count() == 0
+    assert (store.items["a"]["hp"], store.items["b"]["hp"]) == (90, 80)
+
+
+def test_flush_of_one_game_leaves_the_others_dirty(store):
+    cache = make_cache(store)
+    add_game(cache, "a")
+    add_game(cache, "b")
+    cache.flush("a")
+    assert list(store.items) == ["a"]
+    assert cache.dirty_count() == 1
+
+
+def test_stored_games_are_written_with_partial_updates(store):
+    cache = make_cache(store)
+    add_game(cache, "a")
+    cache.flush()
+    hit(cache, "a", damage=5)
+    cache.flush()
+    assert store.items["a"]["hp"] == 95
+    assert store.items["a"][VERSION_ATTR] == 2 # put at version 1, then one conditional update
+
+
+def test_write_through_writes_when_the_block_exits(store):
+    cache = make_cache(store, durability_window=0)
+    add_game(cache, "a")
+    assert store.items["a"]["hp"] == 100
+    hit(cache, "a")
+    assert store.items["a"]["hp"] == 99
+    assert cache.dirty_count() == 0
+
+
+def test_release_writes_and_drops_the_game(store):
+    cache = make_cache(store)
+    add_game(cache, "a")
+    hit(cache, "a")
+    assert cache.release("a")
+    assert cache.game_ids() == []
+    assert store.items["a"]["hp"] == 99
+
+
+# --- Conflicts and retries ---
+
+def test_stale_write_through_conflicts_and_retry_reapplies(store):
+    first, second = make_cache(store, durability_window=0), make_cache(store, durability_window=0)
+    add_game(first, "a")
+    with first.locked("a"):
+        pass # `first` now holds version 1
+    hit(second, "a", damage=10) # ...and `second` writes version 2 behind its back
+
+    with pytest.raises(WriteConflict):
+        hit(first, "a")
+    assert store.items["a"]["hp"] == 90 # The stale write didn't land
+    assert first.game_ids() == ["a"] and first.metrics.conflicts == 1
+
+    retry_on_conflict(lambda: hit(first, "a"), first.metrics, sleep=lambda _: None)
+    assert store.items["a"]["hp"] == 89 # Re-read version 2, then applied
+    assert first.metrics.snapshot()["writes"] == 3 # The put, the conflicting update, the retried one
+
+
+def test_retry_on_conflict_backs_off_then_succeeds():
+    attempts, delays = [], []
+
+    def operation():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise WriteConflict("a")
+        return "done"
+
+    cache = make_cache(InMemoryGameStore())
+    assert retry_on_conflict(operation, cache.metrics, sleep=delays.append) == "done"
+    assert len(attempts) == 3 and len(delays) == 2
+    assert delays[1] > delays[0] * 0.5 # Exponential growth, jitter within [0.5, 1.0]
+    assert cache.metrics.retries == 2 and cache.metrics.exhausted == 0
+
+
+def test_retry_on_conflict_gives_up_after_the_last_attempt():
+    cache = make_cache(InMemoryGameStore())
+
+    def operation():
+        raise WriteConflict("a")
+
+    with pytest.raises(WriteConflict):
+        retry_on_conflict(operation, cache.metrics, attempts=3, sleep=lambda _: None)
+    assert cache.metrics.retries == 2 and cache.metrics.exhausted == 1
+
+
+def test_new_game_conflicts_with_an_existing_item(store):
+    first, second = make_cache(store, durability_window=0), make_cache(store, durability_window=0)
+    add_game(first, "a")
+    with pytest.raises(WriteConflict):
+        add_game(second, "a") # Put with must_not_exist: the id is taken
+    assert store.items["a"][VERSION_ATTR] == 1
+
+
+def hit_with_replay(cache, game_id, damage=1):
+    def apply(entry):
+        entry.game_state.opponent.hp -= damage
+        cache.mark_dirty(entry, serialize(entry.game_state), replay=apply)
+    with cache.locked(game_id) as entry:
+        apply(entry)
+
+
+def test_write_behind_conflict_replays_acknowledged_changes(store):
+    first, second = make_cache(store), make_cache(store)
+    add_game(first, "a")
+    first.flush()
+    for _ in range(3):
+        hit_with_replay(first, "a") # Acknowledged, only in `first`'s memory so far
+    hit_with_replay(second, "a", damage=10)
+    second.flush()
+
+    first.flush() # Conflicts: re-reads the item `second` wrote and re-applies its three hits
+    assert first.metrics.conflicts == 1 and first.metrics.replays == 1
+    assert first.dirty_count() == 1
+    first.flush()
+    assert store.items["a"]["hp"] == 87 # 100 - 10 - 3: nothing lost
+    assert first.dirty_count() == 0
+    with first.locked("a") as entry:
+        assert entry.pending == []
+
+
+def test_write_behind_replays_only_changes_not_yet_written(store):
+    first, second = make_cache(store), make_cache(store)
+    add_game(first, "a")
+    hit_with_replay(first, "a")
+    first.flush() # Writes the insert and the first hit
+    hit_with_replay(first, "a", damage=2)
+    hit_with_replay(second, "a", damage=10)
+    second.flush()
+    first.flush()
+    first.flush()
+    assert store.items["a"]["hp"] == 87 # 100 - 1 - 10 - 2: the written hit isn't applied twice
+
+
+def test_write_behind_change_without_replay_overwrites_on_conflict(store):
+    first, second = make_cache(store), make_cache(store)
+    add_game(first, "a")
+    first.flush()
+    hit(first, "a", damage=5) # No replay: this state wins over whatever is stored
+    hit(second, "a", damage=10)
+    second.flush()
+    first.flush()
+    first.flush()
+    assert store.items["a"]["hp"] == 95
+
+
+def test_write_behind_conflict_with_failing_store_keeps_changes_pending(store, monkeypatch):
+    first, second = make_cache(store), make_cache(store)
+    add_game(first, "a")
+    first.flush()
+    hit_with_replay(first, "a")
+    hit_with_replay(second, "a", damage=10)
+    second.flush()
+
+    def unavailable(game_id):
+        raise OSError("store unavailable")
+    with monkeypatch.context() as patch:
+        patch.setattr(store, "get", unavailable)
+        with pytest.raises(OSError):
+            first.flush() # Conflict, and the re-read fails
+    assert first.dirty_count() == 1
+    first.flush() # Conflicts again, re-reads, replays
+    first.flush()
+    assert store.items["a"]["hp"] == 89